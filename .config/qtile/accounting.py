@@ -0,0 +1,315 @@
+#  ================================== Imports ============================== {{{
+
+import collections
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import libqtile
+from libqtile import hook
+from libqtile.log_utils import logger
+from libqtile.widget import base
+
+import eventloop
+from processes import descendants
+
+# }}}
+
+# ================================ Processes =============================== {{{
+
+CLK_TCK   = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+class Process:
+    # The last reading of one process, the rate is the CPU it used between
+    # its last two readings
+
+    __slots__ = ("pid", "name", "cpu", "read_at", "rate", "rss")
+
+    def __init__(self, pid: int):
+        self.pid                    = pid
+        self.name                   = ""
+        self.cpu: Optional[float]   = None
+        self.read_at                = 0.0
+        self.rate                   = 0.0
+        self.rss                    = 0
+
+    def read(self, proc: str = "/proc") -> bool:
+        """False once the process is gone"""
+        try:
+            with open("{}/{}/stat".format(proc, self.pid), "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        # The name may contain spaces and parentheses, it ends at the last ")".
+        # stat carries the resident set size as well, there is no need to
+        # read statm too.
+        head, _, tail = data.rpartition(b")")
+        fields = tail.split()
+        now    = time.monotonic()
+        cpu    = (int(fields[11]) + int(fields[12])) / CLK_TCK
+        if self.cpu is not None and now > self.read_at:
+            self.rate = max(0.0, cpu - self.cpu) / (now - self.read_at)
+        self.name    = head.partition(b"(")[2].decode(errors="replace")
+        self.cpu     = cpu
+        self.read_at = now
+        self.rss     = int(fields[21]) * PAGE_SIZE
+        return True
+
+# }}}
+
+# ================================== Usage ================================= {{{
+
+class GroupUsage(NamedTuple):
+    group: str
+    # Percent of one CPU, like top
+    cpu: float
+    # Bytes, shared pages are counted once for every process mapping them
+    rss: int
+    processes: int
+    top: Optional[Process]
+
+UsageListener = Callable[[], None]
+
+class GroupAccounting:
+    # CPU and memory used by the processes behind the windows of every
+    # group. The window's _NET_WM_PID and every process below it belong to
+    # the group of the window; a process with windows on several groups is
+    # counted in the first of them.
+    #
+    # The process trees are walked when windows are created or killed, and
+    # again every `rescan` seconds for the children applications fork on
+    # their own (browser tabs). A tick reads the stat file of at most
+    # `budget` processes, taking turns, so hundreds of processes cost the
+    # same per tick as `budget` of them; the rest keep their last reading.
+
+    def __init__(self, frequency: float = 2.0, budget: int = 128, rescan: float = 60.0, proc: str = "/proc"):
+        self.frequency = frequency
+        self.budget    = budget
+        self.rescan    = rescan
+        self.proc      = proc
+
+        self.usage: Dict[str, GroupUsage]      = {}
+        self.read_ms                           = 0.0
+        self.processes: Dict[int, Process]     = {}
+        # Root pid -> the pids of its tree, walked once per window process
+        self._trees: Dict[int, List[int]]      = {}
+        self._groups: Dict[int, str]           = {}
+        self._queue                            = collections.deque()
+        self._stale                            = True
+        self._scanned                          = 0.0
+        self._handle                           = None
+        self._suspended                        = False
+        self._listeners: List[UsageListener]   = []
+        self.qtile                             = None
+
+    def attach(self, qtile=None) -> None:
+        self.qtile = qtile or libqtile.qtile
+        hook.subscribe.client_new(self._window_changed)
+        hook.subscribe.client_killed(self._window_changed)
+        # Moving a window between groups doesn't change any tree
+        hook.subscribe.group_window_add(self._window_moved)
+
+    def _window_changed(self, window) -> None:
+        try:
+            pid = window.get_pid()
+        except Exception:
+            pid = None
+        # A new window of a known process may come with new children
+        self._trees.pop(pid, None)
+        self._stale = True
+
+    def _window_moved(self, group, window) -> None:
+        self._stale = True
+
+    # ------------------------------- Trees ------------------------------- {{{{
+
+    def _roots(self) -> Dict[int, str]:
+        roots: Dict[int, str] = {}
+        for group in self.qtile.groups:
+            for window in group.windows:
+                try:
+                    pid = window.get_pid()
+                except Exception:
+                    continue
+                if pid and pid not in roots:
+                    roots[pid] = group.name
+        return roots
+
+    def _regroup(self) -> None:
+        if time.monotonic() - self._scanned >= self.rescan:
+            self._trees.clear()
+            self._scanned = time.monotonic()
+
+        roots  = self._roots()
+        groups = {}
+        for root, group in roots.items():
+            tree = self._trees.get(root)
+            if tree is None:
+                tree = self._trees[root] = descendants(root)
+            for pid in tree:
+                groups.setdefault(pid, group)
+        for root in [root for root in self._trees if root not in roots]:
+            del self._trees[root]
+
+        self._groups = groups
+        for pid in [pid for pid in self.processes if pid not in groups]:
+            del self.processes[pid]
+        for pid in groups:
+            if pid not in self.processes:
+                self.processes[pid] = Process(pid)
+        # Processes that were never read go first
+        self._queue = collections.deque(sorted(groups, key=lambda pid: self.processes[pid].read_at))
+        self._stale = False
+
+    # }}}}
+
+    # ------------------------------ Sampling ----------------------------- {{{{
+
+    def sample(self, budget: Optional[int] = None) -> None:
+        if self.qtile is None:
+            return
+        start = time.perf_counter()
+        if self._stale or time.monotonic() - self._scanned >= self.rescan:
+            self._regroup()
+
+        budget = self.budget if budget is None else budget
+        gone   = []
+        for _ in range(min(budget, len(self._queue))):
+            pid = self._queue.popleft()
+            if self.processes[pid].read(self.proc):
+                self._queue.append(pid)
+            else:
+                gone.append(pid)
+        for pid in gone:
+            del self.processes[pid]
+            self._groups.pop(pid, None)
+
+        totals: Dict[str, List] = {}
+        for pid, group in self._groups.items():
+            process = self.processes[pid]
+            if process.cpu is None:
+                continue
+            total = totals.setdefault(group, [0.0, 0, 0, None])
+            total[0] += process.rate
+            total[1] += process.rss
+            total[2] += 1
+            if total[3] is None or process.rate > total[3].rate:
+                total[3] = process
+        self.usage = {
+            group: GroupUsage(group, cpu * 100.0, rss, count, top)
+            for group, (cpu, rss, count, top) in totals.items()
+        }
+        self.read_ms = (time.perf_counter() - start) * 1000
+
+    def _tick(self) -> None:
+        self._handle = eventloop.call_aligned(self.frequency, self._tick)
+        try:
+            self.sample()
+        except Exception:
+            logger.exception("accounting: sampling failed")
+        for listener in list(self._listeners):
+            listener()
+
+    def start(self) -> None:
+        if self._handle is None and not self._suspended:
+            self._handle = eventloop.call_aligned(self.frequency, self._tick)
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def suspend(self) -> None:
+        self._suspended = True
+        self.stop()
+
+    def resume(self) -> None:
+        if not self._suspended:
+            return
+        self._suspended = False
+        if self._listeners:
+            self.start()
+
+    def subscribe(self, listener: UsageListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        self.start()
+
+    def unsubscribe(self, listener: UsageListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+        if not self._listeners:
+            self.stop()
+
+    # }}}}
+
+    # ------------------------------ Reporting ---------------------------- {{{{
+
+    def ranked(self) -> List[GroupUsage]:
+        return sorted(self.usage.values(), key=lambda usage: usage.cpu, reverse=True)
+
+    def report(self) -> str:
+        """Every group, the busiest first, read in full rather than within
+        the budget. A rate needs two readings, processes that are read for the
+        first time show no CPU yet."""
+        if self._stale:
+            self._regroup()
+        self.sample(budget=len(self._queue))
+        lines = []
+        for usage in self.ranked():
+            top = usage.top
+            lines.append("{} {:5.1f}% {:>6} {:3}p{}".format(
+                usage.group, usage.cpu, human_bytes(usage.rss), usage.processes,
+                "  {} {:.0f}%".format(top.name, top.rate * 100) if top is not None and top.rate > 0 else "",
+            ))
+        if not lines:
+            return "top: no windows with a pid"
+        lines.append("read {} processes in {:.1f}ms".format(len(self.processes), self.read_ms))
+        return "\n".join(lines)
+
+    # }}}}
+
+def human_bytes(count: float) -> str:
+    for unit in ("K", "M"):
+        count /= 1024
+        if count < 1024:
+            return "{:.0f}{}".format(count, unit)
+    return "{:.1f}G".format(count / 1024)
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class GroupUsageBox(base._TextBox):
+    """The groups that use the most CPU, e.g. " 23%  4%" """
+
+    defaults = [
+        ("count",     2,                 "How many groups are shown"),
+        ("threshold", 1.0,               "CPU percent a group needs to be shown"),
+        ("format",    "{group} {cpu:.0f}%", "Format of one group, also gets rss"),
+        ("separator", " ",               "Text between the groups"),
+    ]
+
+    def __init__(self, accounting: GroupAccounting, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(GroupUsageBox.defaults)
+        self.accounting = accounting
+
+    def timer_setup(self):
+        self.accounting.subscribe(self._sampled)
+
+    def _sampled(self) -> None:
+        if not self.configured:
+            return
+        shown = [usage for usage in self.accounting.ranked() if usage.cpu >= self.threshold][:self.count]
+        # Only draws when the text changed
+        self.update(self.separator.join(
+            self.format.format(group=usage.group, cpu=usage.cpu, rss=human_bytes(usage.rss)) for usage in shown
+        ))
+
+    def finalize(self):
+        self.accounting.unsubscribe(self._sampled)
+        base._TextBox.finalize(self)
+
+# }}}
@@ -0,0 +1,209 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import os
+import shlex
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+
+import eventloop
+import processes
+
+# }}}
+
+# ================================== Entries =============================== {{{
+
+class Program(NamedTuple):
+    name: str
+    # A command line, or a function that is run in-process
+    command: Union[str, List[str], Callable]
+    # Names of programs that have to be ready before this one is started
+    after: Sequence[str] = ()
+    # Run to completion before dependents start (dualscreen, xmodmap, ...)
+    oneshot: bool = False
+    # Process name (as in /proc/<pid>/comm) used to detect an already running
+    # instance. Defaults to the executable name for daemons.
+    process: Optional[str] = None
+    # The program counts as ready once a window of this class is mapped
+    ready_class: Optional[str] = None
+    # Skip the program when this returns False
+    condition: Optional[Callable[[], bool]] = None
+    # Leave the program alone when a process of the same name already runs
+    unique: bool = True
+
+    @property
+    def argv(self) -> List[str]:
+        if isinstance(self.command, str):
+            return shlex.split(self.command)
+        return list(self.command)
+
+    @property
+    def process_name(self) -> Optional[str]:
+        if self.oneshot or not self.unique or callable(self.command):
+            return None
+        name = self.process or os.path.basename(self.argv[0])
+        # comm is truncated to 15 characters by the kernel
+        return name[:15]
+
+class Record:
+    # Times are seconds since `start`, the start of the run the program is part of
+
+    def __init__(self, program: Program, start: float):
+        self.program                          = program
+        self.start                            = start
+        self.status                           = "pending"
+        self.spawned: Optional[float]         = None
+        self.ready: Optional[float]           = None
+        self.returncode: Optional[int]        = None
+        self.child: Optional[processes.Child] = None
+
+# }}}
+
+# ================================= Supervisor ============================= {{{
+
+class Autostart:
+    # Starts programs concurrently on qtile's event loop. A program waits only
+    # for the programs listed in its `after`, daemons that are already running
+    # (e.g. after a qtile restart) are left alone, and every run records when
+    # each program was spawned and became ready. Daemons are handed to the
+    # helper supervisor when there is one, so key bindings can signal them.
+
+    def __init__(self, ready_timeout: float = 30.0, report_path: Optional[str] = None, helpers: Optional[processes.Supervisor] = None):
+        self.ready_timeout = ready_timeout
+        self.report_path   = report_path or os.path.join(get_cache_dir(), "autostart-report.txt")
+        self.helpers       = helpers
+
+        self.records: Dict[str, Record]               = {}
+        self._ready: Dict[str, asyncio.Event]         = {}
+        self._windows: Dict[str, List[asyncio.Event]] = {}
+
+    def start(self, programs: List[Program]) -> asyncio.Task:
+        return eventloop.get_loop().create_task(self.run(programs))
+
+    async def run(self, programs: List[Program]) -> None:
+        # Runs overlap, startup_once and startup both start one
+        start = time.monotonic()
+        names = {program.name for program in programs}
+
+        for program in programs:
+            missing = [dep for dep in program.after if dep not in names and dep not in self.records]
+            if missing:
+                logger.warning("autostart: %s depends on unknown %s", program.name, missing)
+            self.records[program.name] = Record(program, start)
+            self._ready[program.name]  = asyncio.Event()
+
+        # Tracked helpers are known to run without looking through /proc
+        untracked = [program for program in programs if program.process_name is not None and not self._tracked(program)]
+        running   = processes.running_process_names() if untracked else set()
+        await asyncio.gather(*(self._run_one(program, running) for program in programs))
+        self.write_report()
+
+    async def _run_one(self, program: Program, running: set) -> None:
+        record = self.records[program.name]
+        try:
+            for dep in program.after:
+                if dep in self._ready:
+                    await self._ready[dep].wait()
+
+            if program.condition is not None and not program.condition():
+                record.status = "skipped"
+                return
+
+            if self._tracked(program) or program.process_name is not None and program.process_name in running:
+                record.status = "running"
+                return
+
+            if callable(program.command):
+                record.spawned = time.monotonic() - record.start
+                result = program.command()
+                if asyncio.iscoroutine(result):
+                    await result
+                record.status = "done"
+                record.ready  = time.monotonic() - record.start
+                return
+
+            try:
+                if self.helpers is not None and program.process_name is not None:
+                    record.child = self.helpers.start(program.name, program.argv)
+                else:
+                    record.child = processes.spawn(program.argv)
+            except OSError as e:
+                logger.error("autostart: unable to start %s: %s", program.name, e)
+                record.status = "failed"
+                return
+            record.spawned = time.monotonic() - record.start
+            record.status  = "started"
+
+            if program.oneshot:
+                record.returncode = await record.child.exited
+                record.status     = "done" if record.returncode == 0 else "failed"
+            elif program.ready_class is not None:
+                await self._wait_for_window(program.ready_class, record)
+            else:
+                record.child.exited.add_done_callback(lambda f: self._exited(record))
+
+            if record.status in ("started", "done"):
+                record.ready = time.monotonic() - record.start
+        except Exception:
+            logger.exception("autostart: %s failed", program.name)
+            record.status = "failed"
+        finally:
+            # Dependents still run when a dependency failed, the same way the
+            # shell script would carry on
+            self._ready[program.name].set()
+
+    def _tracked(self, program: Program) -> bool:
+        return self.helpers is not None and program.process_name is not None and self.helpers.running(program.name)
+
+    async def _wait_for_window(self, wm_class: str, record: Record) -> None:
+        event = asyncio.Event()
+        self._windows.setdefault(wm_class.lower(), []).append(event)
+        waiter = asyncio.ensure_future(event.wait())
+        done, _ = await asyncio.wait([waiter, record.child.exited], timeout=self.ready_timeout, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if not done:
+            record.status = "timeout"
+        elif record.child.exited in done:
+            self._exited(record)
+
+    def _exited(self, record: Record) -> None:
+        # Daemons that die right after being started are worth knowing about
+        record.returncode = record.child.returncode
+        record.status     = "exited"
+        logger.warning("autostart: %s exited with %s", record.program.name, record.returncode)
+
+    def window_mapped(self, wm_classes: List[str]) -> None:
+        """Called from the client_new hook with the window's WM_CLASS"""
+        for wm_class in wm_classes or []:
+            for event in self._windows.pop(wm_class.lower(), []):
+                event.set()
+
+    def report(self) -> str:
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else "{:.3f}".format(value)
+
+        lines = ["{:<16} {:<8} {:>8} {:>8} {:>5}".format("program", "status", "spawn", "ready", "rc")]
+        records = sorted(self.records.values(), key=lambda r: (r.ready is None, r.ready or 0))
+        for record in records:
+            lines.append("{:<16} {:<8} {:>8} {:>8} {:>5}".format(
+                record.program.name,
+                record.status,
+                seconds(record.spawned),
+                seconds(record.ready),
+                "-" if record.returncode is None else record.returncode,
+            ))
+        return "\n".join(lines)
+
+    def write_report(self) -> None:
+        report = self.report()
+        logger.info("autostart report:\n%s", report)
+        try:
+            with open(self.report_path, "w") as f:
+                f.write(report + "\n")
+        except OSError:
+            logger.exception("Unable to write %s", self.report_path)
+
+# }}}
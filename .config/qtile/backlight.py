@@ -0,0 +1,210 @@
+#  ================================== Imports ============================== {{{
+
+import os
+import subprocess
+import time
+from typing import Optional
+
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ================================== Devices =============================== {{{
+
+# Preferred interfaces first, see Documentation/ABI/stable/sysfs-class-backlight
+BACKLIGHT_TYPES = ["firmware", "platform", "raw"]
+
+def find_backlight(root: str = "/sys/class/backlight") -> Optional[str]:
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+
+    def priority(name: str) -> int:
+        try:
+            with open(os.path.join(root, name, "type")) as f:
+                return BACKLIGHT_TYPES.index(f.read().strip())
+        except (OSError, ValueError):
+            return len(BACKLIGHT_TYPES)
+
+    names = [name for name in names if os.path.exists(os.path.join(root, name, "brightness"))]
+    if not names:
+        return None
+    return os.path.join(root, min(names, key=priority))
+
+# }}}
+
+# =================================== Engine =============================== {{{
+
+class Backlight:
+    # Finds the sysfs device once and keeps its brightness file open. Brightness
+    # changes are written straight to the file; events queued within one frame
+    # are merged into one write, and with ramp set the change is spread over
+    # several frames instead of jumping.
+
+    def __init__(self, root: str = "/sys/class/backlight", device: Optional[str] = None, frame: float = 1 / 60, ramp: float = 0.0):
+        self.frame  = frame
+        self.ramp   = ramp
+        self.device = device if device is not None else find_backlight(root)
+
+        self.max_brightness = 0
+        self.brightness     = 0
+        self.target         = 0
+
+        self._fd: Optional[int]                = None
+        self._pending_delta                    = 0.0
+        self._pending_percent: Optional[float] = None
+        self._flush_handle                     = None
+        self._ramp_handle                      = None
+        self._ramp_from                        = 0
+        self._ramp_start                       = 0.0
+
+        self._open()
+
+    # ------------------------------- Device ------------------------------ {{{{
+
+    def _open(self) -> None:
+        if self.device is None:
+            logger.warning("No backlight device found, falling back to the backlight command")
+            return
+
+        try:
+            with open(os.path.join(self.device, "max_brightness")) as f:
+                self.max_brightness = int(f.read())
+            self._fd = os.open(os.path.join(self.device, "brightness"), os.O_RDWR | os.O_CLOEXEC)
+        except (OSError, ValueError):
+            logger.exception("Unable to open backlight %s, falling back to the backlight command", self.device)
+            self._fd = None
+            return
+
+        self.brightness = self._read()
+        self.target     = self.brightness
+
+    def _read(self) -> int:
+        return int(os.pread(self._fd, 32, 0))
+
+    def _read_actual(self) -> int:
+        # What the panel shows, which differs from brightness when the
+        # driver refused or adjusted a write
+        try:
+            with open(os.path.join(self.device, "actual_brightness")) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            pass
+        try:
+            return self._read()
+        except (OSError, ValueError):
+            return self.brightness
+
+    def _write(self, value: int) -> bool:
+        if value == self.brightness:
+            return True
+        try:
+            os.pwrite(self._fd, str(value).encode(), 0)
+        except OSError:
+            logger.exception("Unable to set backlight %s to %d", self.device, value)
+            self.brightness = self._read_actual()
+            self.target     = self.brightness
+            return False
+        self.brightness = value
+        return True
+
+    def close(self) -> None:
+        for handle in (self._flush_handle, self._ramp_handle):
+            if handle is not None:
+                handle.cancel()
+        self._flush_handle = None
+        self._ramp_handle  = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def refresh(self, event=None) -> None:
+        """Reads the brightness back after something else changed it, e.g.
+        the firmware on a brightness key"""
+        if self._fd is None or self._flush_handle is not None or self._ramp_handle is not None:
+            # Our own change is still being written
+            return
+        try:
+            self.brightness = self._read()
+        except (OSError, ValueError):
+            return
+        self.target = self.brightness
+
+    @property
+    def percent(self) -> float:
+        if not self.max_brightness:
+            return 0.0
+        return 100 * self.brightness / self.max_brightness
+
+    # }}}}
+
+    # ------------------------------- Events ------------------------------ {{{{
+
+    def _queue(self) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = eventloop.call_later(self.frame, self.flush)
+
+    def step(self, percent: float) -> None:
+        self._pending_delta += percent
+        self._queue()
+
+    def set(self, percent: float) -> None:
+        self._pending_percent = percent
+        self._pending_delta   = 0.0
+        self._queue()
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        delta, percent        = self._pending_delta, self._pending_percent
+        self._pending_delta   = 0.0
+        self._pending_percent = None
+
+        if self._fd is None:
+            self._spawn(delta, percent)
+            return
+
+        # Steps are relative to where a running ramp is heading, not to where
+        # it currently is, so repeated presses during a ramp do not get lost
+        if percent is None:
+            percent = 100 * self.target / self.max_brightness
+        percent = max(0.0, min(100.0, percent + delta))
+
+        # Never switch the panel off completely
+        self.target = max(1, round(self.max_brightness * percent / 100))
+
+        if self.ramp <= 0:
+            self._write(self.target)
+            return
+
+        self._ramp_from  = self.brightness
+        self._ramp_start = time.monotonic()
+        if self._ramp_handle is None:
+            self._ramp_step()
+
+    def _ramp_step(self) -> None:
+        self._ramp_handle = None
+        progress = min(1.0, (time.monotonic() - self._ramp_start) / self.ramp)
+        written = self._write(round(self._ramp_from + (self.target - self._ramp_from) * progress))
+        if written and progress < 1.0:
+            self._ramp_handle = eventloop.call_later(self.frame, self._ramp_step)
+
+    def _spawn(self, delta: float, percent: Optional[float]) -> None:
+        if percent is not None:
+            command = ["backlight", "set", str(round(max(0.0, min(100.0, percent + delta))))]
+        elif delta > 0:
+            command = ["backlight", "inc", str(round(delta))]
+        elif delta < 0:
+            command = ["backlight", "dec", str(round(-delta))]
+        else:
+            return
+        subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,1005 @@
+#!/bin/env python3
+
+# Benchmarks for the in-process subsystems of this config. Run them outside of
+# qtile, e.g.
+#
+#     python ~/.config/qtile/bench.py volume --iterations 50
+#
+# Every benchmark prints a small latency table in milliseconds. The layouts
+# benchmark runs the whole config in qtile under Xvfb, or on wlroots' headless
+# backend with --backend wayland, and saves its results so runs on two commits
+# can be compared:
+#
+#     python ~/.config/qtile/bench.py layouts --compare ~/.cache/qtile/bench/layouts-x11-<revision>.json
+
+#  ================================== Imports ============================== {{{
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# }}}
+
+# ================================== Helpers =============================== {{{
+
+def p95(samples: List[float]) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def report(name: str, samples: List[float]) -> None:
+    samples = sorted(samples)
+    if not samples:
+        print("{:<32} no samples".format(name))
+        return
+    print("{:<32} n={:<6} mean={:8.3f} median={:8.3f} p95={:8.3f} max={:8.3f}".format(
+        name,
+        len(samples),
+        statistics.mean(samples) * 1000,
+        statistics.median(samples) * 1000,
+        p95(samples) * 1000,
+        samples[-1] * 1000,
+    ))
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 2.0, interval: float = 0.0005) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+# }}}
+
+# =================================== Volume =============================== {{{
+
+def bench_volume(args: argparse.Namespace) -> None:
+    import alsaaudio
+    from volume import VolumeController
+
+    def level() -> int:
+        # A fresh handle so that we never look at a cached value
+        mixer = alsaaudio.Mixer(args.control)
+        try:
+            return mixer.getvolume()[0]
+        finally:
+            mixer.close()
+
+    original = level()
+    start    = 40
+
+    # Keypress -> volume change through `lazy.spawn("amixer ...")`
+    spawn_samples = []
+    for i in range(args.iterations):
+        subprocess.run(["amixer", "-q", "set", args.control, "{}%".format(start)], check=True)
+        before = level()
+        t0 = time.monotonic()
+        subprocess.Popen(["amixer", "-q", "set", args.control, "1%+"])
+        if wait_until(lambda: level() != before):
+            spawn_samples.append(time.monotonic() - t0)
+
+    # Keypress -> volume change through the in-process controller
+    controller = VolumeController(args.control)
+    loop       = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def press(steps: int) -> float:
+        controller.set(start)
+        controller.flush()
+        t0 = time.monotonic()
+        for _ in range(steps):
+            controller.step(1)
+        while controller._flush_handle is not None:
+            await asyncio.sleep(0)
+        return time.monotonic() - t0
+
+    controller_samples = [loop.run_until_complete(press(1)) for _ in range(args.iterations)]
+    burst_samples      = [loop.run_until_complete(press(args.burst)) for _ in range(args.iterations)]
+    apply_samples      = []
+    for _ in range(args.iterations):
+        loop.run_until_complete(press(1))
+        apply_samples.append(controller.last_latency)
+
+    report("spawn amixer", spawn_samples)
+    report("controller (1 step)", controller_samples)
+    report("controller ({} step burst)".format(args.burst), burst_samples)
+    report("controller queue->write", apply_samples)
+
+    controller.set(original)
+    controller.flush()
+    controller.close()
+    loop.close()
+
+# }}}
+
+# ================================== Monitors ============================== {{{
+
+def bench_monitors(args: argparse.Namespace) -> None:
+    import xcffib
+    from definitions import monitor_profiles
+    from monitors import Monitors
+
+    conn = xcffib.connect()
+    root = conn.get_setup().roots[conn.pref_screen].root
+
+    monitors = Monitors(monitor_profiles, {})
+    monitors.attach(conn, root)
+
+    def sync() -> None:
+        conn.core.GetInputFocus().reply()
+
+    cold = []
+    for _ in range(args.iterations):
+        monitors.invalidate()
+        t0 = time.monotonic()
+        monitors.connected()
+        cold.append(time.monotonic() - t0)
+    report("load resources (cold)", cold)
+
+    # Profiles are applied round robin, re-applying the active profile is a
+    # no-op and would not measure anything
+    randr  = {name: [] for name in args.profiles}
+    xrandr = {name: [] for name in args.profiles}
+    for _ in range(args.iterations):
+        for name in args.profiles:
+            t0 = time.monotonic()
+            if monitors.apply(name):
+                sync()
+                randr[name].append(time.monotonic() - t0)
+
+    for _ in range(args.iterations):
+        for name in args.profiles:
+            script = os.path.expanduser("~/bin/dualscreen_{}".format(name))
+            if os.path.exists(script):
+                t0 = time.monotonic()
+                subprocess.run([script], check=True)
+                xrandr[name].append(time.monotonic() - t0)
+
+    for name in args.profiles:
+        report("randr {}".format(name), randr[name])
+        if xrandr[name]:
+            report("xrandr {}".format(name), xrandr[name])
+
+    conn.disconnect()
+
+# }}}
+
+# ================================ Screenshots ============================= {{{
+
+def start_xvfb(size: str) -> subprocess.Popen:
+    # Pick the first display nobody is using
+    display = 90
+    while os.path.exists("/tmp/.X11-unix/X{}".format(display)):
+        display += 1
+    xvfb = subprocess.Popen(["Xvfb", ":{}".format(display), "-screen", "0", size + "x24", "-nolisten", "tcp"])
+    if not wait_until(lambda: os.path.exists("/tmp/.X11-unix/X{}".format(display)), timeout=10):
+        xvfb.kill()
+        raise RuntimeError("Xvfb did not start")
+    os.environ["DISPLAY"] = ":{}".format(display)
+    return xvfb
+
+def bench_screenshot(args: argparse.Namespace) -> None:
+    xvfb = start_xvfb(args.size) if args.xvfb else None
+    try:
+        from capture import Screenshots, encode_png
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        screenshots = Screenshots()
+
+        capture = []
+        for _ in range(args.iterations):
+            t0 = time.monotonic()
+            image = screenshots.take_full()
+            capture.append(time.monotonic() - t0)
+
+        # The PNG encode only happens when something pastes the image
+        encode = []
+        for _ in range(args.iterations):
+            t0 = time.monotonic()
+            encode_png(image.width, image.height, image.data)
+            encode.append(time.monotonic() - t0)
+
+        script = []
+        path   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screenshot")
+        for _ in range(args.iterations):
+            t0 = time.monotonic()
+            if subprocess.run([path, "full"]).returncode != 0:
+                break
+            script.append(time.monotonic() - t0)
+
+        report("in-process capture", capture)
+        report("png encode", encode)
+        report("screenshot script", script)
+
+        screenshots.close()
+        loop.close()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+# }}}
+
+# =============================== Notifications ============================ {{{
+
+def bench_notifications(args: argparse.Namespace) -> None:
+    from notifications import NotificationQueue, Urgency
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    queue = NotificationQueue()
+
+    renders = []
+    def listener(notification, suppressed) -> None:
+        renders.append(notification)
+
+    # Time every callback the queue puts on the event loop
+    loop_samples = []
+    def timed(func):
+        def wrapper():
+            t0 = time.monotonic()
+            func()
+            loop_samples.append(time.monotonic() - t0)
+        return wrapper
+    queue._render = timed(queue._render)
+    queue._next   = timed(queue._next)
+    queue.subscribe(listener)
+
+    urgencies = [Urgency.INFO, Urgency.WARN, Urgency.ERROR]
+    push_samples = []
+
+    async def flood() -> None:
+        for i in range(args.messages):
+            # A few distinct messages repeated, like a misbehaving callback
+            msg = "message {}".format(i % args.distinct)
+            t0 = time.monotonic()
+            queue.push(msg, urgencies[i % len(urgencies)], timeout=args.timeout)
+            push_samples.append(time.monotonic() - t0)
+            if i % args.batch == 0:
+                await asyncio.sleep(0)
+        while queue.current is not None:
+            await asyncio.sleep(args.timeout)
+
+    t0 = time.monotonic()
+    loop.run_until_complete(flood())
+    total = time.monotonic() - t0
+
+    report("push", push_samples)
+    report("loop callbacks", loop_samples)
+    print("loop time  {:8.3f}ms of {:8.3f}ms".format(sum(loop_samples) * 1000, total * 1000))
+    print("push time  {:8.3f}ms".format(sum(push_samples) * 1000))
+    print("renders    {}".format(len(renders)))
+    print(", ".join("{} {}".format(k, v) for k, v in queue.stats.items()))
+
+    queue.close()
+    loop.close()
+
+# }}}
+
+# ================================= Completion ============================= {{{
+
+# Per keypress, at the 95th percentile
+COMPLETION_LIMIT = 0.001
+
+def bench_completion(args: argparse.Namespace) -> None:
+    import random
+    from completion import CompletionIndex
+
+    vocabulary = [
+        "next", "prev", "layout", "screen", "group", "window", "to", "switch", "toggle", "floating",
+        "fullscreen", "focus", "move", "kill", "spawn", "section", "add", "del", "web", "code",
+        "chat", "bind", "unbind", "all", "list", "help", "restart", "reload", "config", "shutdown",
+    ]
+    random.seed(args.seed)
+    words = set()
+    while len(words) < args.candidates:
+        words.add("_".join(random.sample(vocabulary, random.randint(1, 3))) + str(random.randint(0, 9)))
+
+    build = []
+    for _ in range(3):
+        t0 = time.monotonic()
+        index = CompletionIndex(words)
+        build.append(time.monotonic() - t0)
+
+    # Every query is typed one character at a time, the way the prompt sees
+    # it. A keypress takes the best of --runs, each run after searching what
+    # was typed before it again, so the scheduler of a busy machine doesn't
+    # decide the p95.
+    def best(query: str, typed: str) -> float:
+        runs = []
+        for _ in range(args.runs):
+            index.search(typed)
+            t0 = time.perf_counter()
+            index.search(query)
+            runs.append(time.perf_counter() - t0)
+        return min(runs)
+
+    queries  = [random.choice(sorted(words)).replace("_", "")[:args.length] for _ in range(args.iterations)]
+    keypress = [best(query[:end], query[:end - 1]) for query in queries for end in range(1, len(query) + 1)]
+    fresh    = [best(query[::-1][:3], "") for query in queries]
+
+    report("build ({} words)".format(len(words)), build)
+    report("search per keypress", keypress)
+    report("search from scratch", fresh)
+    if p95(keypress) >= COMPLETION_LIMIT:
+        sys.exit("search per keypress: p95 {:.3f}ms, the limit is {:.0f}ms".format(p95(keypress) * 1000, COMPLETION_LIMIT * 1000))
+
+# }}}
+
+# ==================================== Rules =============================== {{{
+
+class SyntheticWindow:
+    # Stands in for a newly mapped X11 window, every getter counts as one
+    # round trip to the server
+    round_trips = 0
+
+    def __init__(self, wid: int, name: str, wm_class: List[str], wm_type: str):
+        self.wid       = wid
+        self._name     = name
+        self._wm_class = wm_class
+        self._wm_type  = wm_type
+
+    @property
+    def name(self) -> str:
+        SyntheticWindow.round_trips += 1
+        return self._name
+
+    def get_wm_class(self) -> List[str]:
+        SyntheticWindow.round_trips += 1
+        return self._wm_class
+
+    def get_wm_type(self) -> str:
+        SyntheticWindow.round_trips += 1
+        return self._wm_type
+
+    def get_wm_role(self) -> str:
+        SyntheticWindow.round_trips += 1
+        return ""
+
+    def get_pid(self) -> int:
+        SyntheticWindow.round_trips += 1
+        return self.wid
+
+    def has_fixed_size(self) -> bool:
+        SyntheticWindow.round_trips += 1
+        return False
+
+    def match(self, match) -> bool:
+        return match.compare(self)
+
+def synthetic_windows(count: int, seed: int) -> List[SyntheticWindow]:
+    import random
+    random.seed(seed)
+    classes = ["kitty", "firefox", "code", "TelegramDesktop", "Signal", "thunderbird", "gimp", "confirmreset", "ssh-askpass", "mpv"]
+    titles  = ["zsh", "Mozilla Firefox", "Spotify", "waterbird", "pinentry", "branchdialog", "untitled"]
+    types   = ["normal"] * 8 + ["dialog", "utility", "splash"]
+    windows = []
+    for wid in range(count):
+        wm_class = random.choice(classes)
+        windows.append(SyntheticWindow(0x400000 + wid, random.choice(titles), [wm_class.lower(), wm_class], random.choice(types)))
+    return windows
+
+def bench_rules(args: argparse.Namespace) -> None:
+    import rules
+    import definitions
+
+    # The same engines config.py builds, named after what the groups hold
+    # rather than their icons
+    group_rules     = rules.RuleEngine([("chat", definitions.chat_matches), ("media", definitions.media_matches)])
+    floating_layout = rules.CompiledFloating(float_rules=definitions.float_rules)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    windows      = synthetic_windows(args.windows, args.seed)
+    group_lists  = group_rules.rules
+    float_rules  = floating_layout.float_rules
+    float_engine = floating_layout.engine
+
+    def match_lists(window) -> Tuple[Optional[str], bool]:
+        # What qtile does per map request: every group's Rule, then the float rules
+        group = None
+        for target, matches in group_lists:
+            if any(window.match(m) for m in matches) and group is None:
+                group = target
+        return group, any(window.match(rule) for rule in float_rules)
+
+    def match_compiled(window) -> Tuple[Optional[str], bool]:
+        group = None
+        for target, _ in group_lists:
+            if group_rules.target(window) == target and group is None:
+                group = target
+        result = group, float_engine.explain(window) is not None
+        # The event loop would clear the shared properties after the request
+        rules._clear()
+        return result
+
+    results = {}
+    for name, func in (("Match lists", match_lists), ("compiled", match_compiled)):
+        SyntheticWindow.round_trips = 0
+        samples = []
+        results[name] = []
+        for window in windows:
+            t0 = time.monotonic()
+            results[name].append(func(window))
+            samples.append(time.monotonic() - t0)
+        report(name, samples)
+        print("{:<32} {:.1f} property reads per window".format("", SyntheticWindow.round_trips / len(windows)))
+
+    if results["Match lists"] != results["compiled"]:
+        print("compiled rules disagree with the Match lists")
+    loop.close()
+
+# }}}
+
+# ==================================== Spawn =============================== {{{
+
+def proc_status(pid: int, field: str) -> int:
+    with open("/proc/{}/status".format(pid)) as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+def fork_spawn(argv: List[str]) -> int:
+    # What qtile's spawn command does: a double fork of the whole process,
+    # the grandchild's pid comes back through a pipe
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        pid2 = os.fork()
+        if pid2 == 0:
+            os.close(w)
+            try:
+                os.execvp(argv[0], argv)
+            finally:
+                os._exit(1)
+        os.write(w, str(pid2).encode())
+        os._exit(0)
+    os.close(w)
+    with os.fdopen(r) as f:
+        pid2 = int(f.read())
+    os.waitpid(pid, 0)
+    return pid2
+
+def bench_spawn(args: argparse.Namespace) -> None:
+    from spawner import SpawnServer
+
+    # Grow this process the way qtile grows over a session
+    ballast = bytearray(args.rss * 1024 * 1024)
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1
+    argv = ["true"]
+
+    direct_samples = []
+    for _ in range(args.iterations):
+        t0 = time.monotonic()
+        fork_spawn(argv)
+        direct_samples.append(time.monotonic() - t0)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = SpawnServer()
+    server.start()
+
+    server_samples = []
+    async def run() -> None:
+        for _ in range(args.iterations):
+            t0 = time.monotonic()
+            await server.spawn(argv)
+            server_samples.append(time.monotonic() - t0)
+    loop.run_until_complete(run())
+
+    own_pte    = proc_status(os.getpid(), "VmPTE")
+    server_pte = proc_status(server.child.pid, "VmPTE")
+    server_rss = proc_status(server.child.pid, "VmRSS")
+
+    report("fork (qtile spawn)", direct_samples)
+    report("spawn server", server_samples)
+    print("rss        {:>8} kB this process, {:>8} kB spawn server".format(proc_status(os.getpid(), "VmRSS"), server_rss))
+    # Every fork copies the parent's page tables, qtile forks twice per
+    # spawn. posix_spawn shares the server's memory until exec.
+    print("page tables  {:>8} kB copied by each fork, {} forks".format(own_pte, 2 * args.iterations))
+    print("             {:>8} kB in the spawn server, no copies".format(server_pte))
+
+    server.close()
+    loop.close()
+    del ballast
+
+# }}}
+
+# ================================== Layouts =============================== {{{
+
+# Runs the whole config in a qtile of its own, under a private Xvfb or on
+# wlroots' headless backend, and measures layout runs and key bindings from
+# inside that qtile. The functions in the first part are called in the qtile
+# process through `eval`: qtile has the config directory on sys.path, so it
+# imports this file as the bench module.
+
+# ------------------------------ Inside qtile ----------------------------- {{{{
+
+def _sync(qtile) -> None:
+    # A round trip, so the X server has handled every configure request. The
+    # wayland core is the server, flushing sends the configures to the clients
+    qtile.core.flush()
+    if qtile.core.name == "x11":
+        qtile.core.conn.conn.core.GetInputFocus().reply()
+
+def resize_outputs(qtile, width: int, height: int) -> str:
+    # wlroots' headless outputs start at 1280x720, side by side
+    x = 0
+    for output in qtile.core.outputs:
+        output.wlr_output.set_custom_mode(width, height, 0)
+        output.wlr_output.commit()
+        qtile.core.output_layout.move(output.wlr_output, x, 0)
+        x += width
+    return str([(screen.width, screen.height) for screen in qtile.screens])
+
+def measure_layout(qtile, repeat: int) -> str:
+    import json
+    group   = qtile.current_group
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        group.layout_all()
+        _sync(qtile)
+        samples.append(time.perf_counter() - t0)
+    return json.dumps(samples)
+
+def measure_keys(qtile, presses: List[Tuple[List[str], str]], repeat: int) -> str:
+    # Every repetition presses the whole sequence, e.g. a KeyChord and the key
+    # pressed in its mode
+    import json
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for modifiers, key in presses:
+            qtile.cmd_simulate_keypress(modifiers, key)
+        _sync(qtile)
+        samples.append(time.perf_counter() - t0)
+    return json.dumps(samples)
+
+def spread_sections(qtile, sections: int) -> str:
+    # Adds sections to the TreeTab of the current group and moves the windows
+    # round robin into them, returns the tabs each section ended up with
+    import json
+    group  = qtile.current_group
+    layout = group.layout
+    layout.apply([("add", "Section {}".format(i)) for i in range(sections)])
+    count = len(layout.section_titles())
+    for index, window in enumerate(list(group.windows)):
+        group.focus(window)
+        for _ in range(index % count):
+            layout.cmd_section_down()
+    return json.dumps(layout.section_tabs())
+
+def measure_sections(qtile, repeat: int) -> str:
+    # Every section of the current group's TreeTab collapsed in one apply()
+    # and expanded again in a second one
+    import json
+    layout   = qtile.current_group.layout
+    titles   = layout.section_titles()
+    samples  = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        layout.apply([("collapse", title) for title in titles])
+        layout.apply([("expand", title) for title in titles])
+        _sync(qtile)
+        samples.append(time.perf_counter() - t0)
+    return json.dumps(samples)
+
+# }}}}
+
+# -------------------------------- Scenarios ----------------------------- {{{{
+
+MOD = "mod4"
+
+class Scenario(NamedTuple):
+    name: str
+    # Index into config.groups, the group is shown with its own key binding
+    group: int
+    layout: str
+    windows: int
+    actions: Dict[str, List[Tuple[List[str], str]]]
+    # Extra TreeTab sections the windows are spread over
+    sections: int = 0
+
+ACTIONS = {
+    "focus left":    [([MOD], "h")],
+    "focus right":   [([MOD], "l")],
+    "focus down":    [([MOD], "j")],
+    "focus up":      [([MOD], "k")],
+    "focus next":    [([MOD], "s")],
+    "shuffle left":  [([MOD, "shift"], "h")],
+    "shuffle right": [([MOD, "shift"], "l")],
+    "shuffle down":  [([MOD, "shift"], "j")],
+    "shuffle up":    [([MOD, "shift"], "k")],
+    # Escape leaves the resize mode again
+    "resize grow":       [([MOD], "r"), ([], "g"), ([], "Escape")],
+    "resize shrink":     [([MOD], "r"), ([], "s"), ([], "Escape")],
+    "resize grow left":  [([MOD], "r"), ([], "h"), ([], "Escape")],
+    "resize grow right": [([MOD], "r"), ([], "l"), ([], "Escape")],
+    "resize normalize":  [([MOD], "r"), ([], "n"), ([], "Escape")],
+    "section down":  [([MOD, "control"], "j")],
+    "section up":    [([MOD, "control"], "k")],
+    # There and back
+    "next layout":   [([MOD], "Tab"), ([MOD], "Tab")],
+}
+
+def actions(*names: str) -> Dict[str, List[Tuple[List[str], str]]]:
+    return {name: ACTIONS[name] for name in names}
+
+def scenarios(windows: int, tabs: int) -> List[Scenario]:
+    # Every layout gets the keys it has commands for
+    return [
+        Scenario("columns", 0, "columns", windows, actions(
+            "focus left", "focus right", "focus down", "focus up", "focus next",
+            "shuffle left", "shuffle right", "shuffle down", "shuffle up",
+            "resize grow", "resize shrink", "resize grow left", "resize grow right", "resize normalize",
+        )),
+        Scenario("max",     0, "max",     windows, actions("focus down", "focus up", "next layout")),
+        Scenario("treetab", 2, "treetab", tabs,    actions("focus down", "focus up", "section down", "section up"), sections=8),
+        Scenario("tile",    3, "tile",    windows, actions("focus down", "focus up", "shuffle down", "shuffle up", "resize grow", "resize shrink")),
+    ]
+
+# }}}}
+
+# --------------------------------- Driver ------------------------------- {{{{
+
+class XWindows:
+    # Bare X windows for qtile to manage, created from this process
+
+    def __init__(self, display: str):
+        import xcffib
+        import xcffib.xproto
+        self.xproto = xcffib.xproto
+        self.conn   = xcffib.connect(display=display)
+        self.screen = self.conn.get_setup().roots[0]
+        self.wids: List[int] = []
+
+    def create(self, count: int) -> None:
+        xproto   = self.xproto
+        wm_class = b"bench\0Bench\0"
+        for _ in range(count):
+            wid   = self.conn.generate_id()
+            title = "bench {}".format(len(self.wids)).encode()
+            self.conn.core.CreateWindow(
+                self.screen.root_depth, wid, self.screen.root, 0, 0, 200, 100, 0,
+                xproto.WindowClass.InputOutput, self.screen.root_visual,
+                xproto.CW.BackPixel, [self.screen.white_pixel],
+            )
+            self.conn.core.ChangeProperty(xproto.PropMode.Replace, wid, xproto.Atom.WM_NAME,  xproto.Atom.STRING, 8, len(title),    title)
+            self.conn.core.ChangeProperty(xproto.PropMode.Replace, wid, xproto.Atom.WM_CLASS, xproto.Atom.STRING, 8, len(wm_class), wm_class)
+            self.conn.core.MapWindow(wid)
+            self.wids.append(wid)
+        self.conn.flush()
+
+    def destroy(self) -> None:
+        for wid in self.wids:
+            self.conn.core.DestroyWindow(wid)
+        self.wids.clear()
+        self.conn.flush()
+
+    def close(self) -> None:
+        self.conn.disconnect()
+
+def _wayland_client(display: str, count: int, stop) -> None:
+    # Runs in a process of its own: the windows have to answer qtile's
+    # configures while the benchmark waits on qtile, or the compositor
+    # disconnects the client once its buffer is full
+    import select
+    from pywayland.client import Display
+    from pywayland.protocol.wayland import WlCompositor, WlShm
+    from pywayland.protocol.xdg_shell import XdgWmBase
+
+    connection = Display(display)
+    connection.connect()
+    found    = {}
+    registry = connection.get_registry()
+
+    def on_global(registry, name, interface, version):
+        found.setdefault(interface, name)
+
+    registry.dispatcher["global"] = on_global
+    connection.roundtrip()
+    compositor = registry.bind(found["wl_compositor"], WlCompositor, 4)
+    shm        = registry.bind(found["wl_shm"], WlShm, 1)
+    wm_base    = registry.bind(found["xdg_wm_base"], XdgWmBase, 1)
+
+    def ping(wm_base, serial):
+        wm_base.pong(serial)
+
+    wm_base.dispatcher["ping"] = ping
+
+    # One small buffer for every window, qtile sizes them anyway
+    size = 64
+    fd   = os.memfd_create("bench")
+    os.ftruncate(fd, size * size * 4)
+    pool   = shm.create_pool(fd, size * size * 4)
+    buffer = pool.create_buffer(0, size, size, size * 4, WlShm.format.argb8888.value)
+
+    windows = []
+    for index in range(count):
+        surface  = compositor.create_surface()
+        xdg      = wm_base.get_xdg_surface(surface)
+        toplevel = xdg.get_toplevel()
+        toplevel.set_title("bench {}".format(index))
+        toplevel.set_app_id("bench")
+
+        def configure(xdg, serial, surface=surface):
+            xdg.ack_configure(serial)
+            surface.attach(buffer, 0, 0)
+            surface.commit()
+
+        xdg.dispatcher["configure"] = configure
+        surface.commit()
+        windows.append((surface, xdg, toplevel))
+
+    while not stop.is_set():
+        connection.flush()
+        if select.select([connection.get_fd()], [], [], 0.05)[0]:
+            connection.dispatch(block=True)
+    # Disconnecting destroys the windows
+    connection.disconnect()
+
+class WaylandWindows:
+    # xdg-shell toplevels for qtile to manage, every batch made by a client
+    # process of its own
+
+    def __init__(self, display: str):
+        self.display = display
+        self.clients: List[Tuple[multiprocessing.Process, Any]] = []
+
+    def create(self, count: int) -> None:
+        stop    = multiprocessing.Event()
+        process = multiprocessing.Process(target=_wayland_client, args=(self.display, count, stop), daemon=True)
+        process.start()
+        self.clients.append((process, stop))
+
+    def destroy(self) -> None:
+        for process, stop in self.clients:
+            stop.set()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+        self.clients.clear()
+
+    def close(self) -> None:
+        self.destroy()
+
+class HeadlessQtile:
+    # qtile running this config on the display of a private Xvfb, or as a
+    # wayland compositor on wlroots' headless backend. The cache and data
+    # directories are temporary ones, so the session's helper pids, launcher
+    # index, update counts and log are neither used nor overwritten.
+
+    def __init__(self, config: str, backend: str):
+        import tempfile
+        self.tmp    = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.tmp.name, "qtile.socket")
+        env = dict(os.environ, XDG_CACHE_HOME=self.tmp.name, XDG_DATA_HOME=self.tmp.name, QTILE_BENCHMARK="1")
+        if backend == "wayland":
+            # One output like the single Xvfb screen, rendered in software
+            env.update(
+                XDG_RUNTIME_DIR=self.tmp.name,
+                WLR_BACKENDS="headless",
+                WLR_HEADLESS_OUTPUTS="1",
+                WLR_LIBINPUT_NO_DEVICES="1",
+                WLR_RENDERER="pixman",
+                WLR_RENDERER_ALLOW_SOFTWARE="1",
+            )
+        self.wayland_display = os.path.join(self.tmp.name, "wayland-0")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "libqtile.scripts.main", "start", "-c", config, "-s", self.socket, "-b", backend],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        if not wait_until(lambda: os.path.exists(self.socket), timeout=30, interval=0.05):
+            self.close()
+            raise RuntimeError("qtile did not start")
+
+        from libqtile import ipc
+        from libqtile.command.client import InteractiveCommandClient
+        from libqtile.command.interface import IPCCommandInterface
+        self.client = InteractiveCommandClient(IPCCommandInterface(ipc.Client(self.socket)))
+
+    def eval(self, code: str) -> str:
+        ok, result = self.client.eval(code)
+        if not ok:
+            raise RuntimeError("{}: {}".format(code, result))
+        return result
+
+    def call(self, function: str, *args) -> str:
+        return self.eval("__import__('bench').{}(self, {})".format(function, ", ".join(repr(arg) for arg in args)))
+
+    def window_count(self) -> int:
+        return int(self.eval("len(self.current_group.windows)"))
+
+    def close(self) -> None:
+        try:
+            self.client.shutdown()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.tmp.cleanup()
+
+def git_revision() -> str:
+    directory = os.path.dirname(os.path.abspath(__file__))
+    result    = subprocess.run(["git", "-C", directory, "describe", "--always", "--dirty"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() or "unknown"
+
+def compare(previous: dict, results: dict) -> None:
+    print("\ncompared to {} on {} ({})".format(previous["revision"], previous["backend"], previous["date"]))
+    for scenario, measured in results["scenarios"].items():
+        before = previous["scenarios"].get(scenario)
+        if before is None:
+            continue
+        for name, samples in [("configure", measured["configure"])] + list(measured["actions"].items()):
+            old = before["configure"] if name == "configure" else before["actions"].get(name)
+            if not old or not samples:
+                continue
+            old_median, new_median = statistics.median(old), statistics.median(samples)
+            print("{:<32} {:8.3f} -> {:8.3f} ms  {:+6.1f}%".format(
+                "{} {}".format(scenario, name),
+                old_median * 1000,
+                new_median * 1000,
+                (new_median - old_median) / old_median * 100 if old_median else 0.0,
+            ))
+
+def bench_layouts(args: argparse.Namespace) -> None:
+    import json
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.py")
+    xvfb        = start_xvfb(args.size) if args.backend == "x11" else None
+    qtile, windows = None, None
+    try:
+        qtile = HeadlessQtile(config_path, args.backend)
+        if args.backend == "wayland":
+            width, height = args.size.split("x")
+            qtile.call("resize_outputs", int(width), int(height))
+            windows = WaylandWindows(qtile.wayland_display)
+        else:
+            windows = XWindows(os.environ["DISPLAY"])
+        group_count = int(qtile.eval("len(self.groups)"))
+        results     = {
+            "revision":  git_revision(),
+            "backend":   args.backend,
+            "date":      time.strftime("%Y-%m-%d %H:%M:%S"),
+            "scenarios": {},
+        }
+
+        for scenario in scenarios(args.windows, args.tabs):
+            if args.only and scenario.name not in args.only:
+                continue
+            measured = results["scenarios"][scenario.name] = {"windows": scenario.windows, "configure": [], "actions": {}}
+
+            # The group key binding is move_group_to_screen
+            switch = [([MOD], str(scenario.group + 1))]
+            measured["actions"]["switch group"] = json.loads(qtile.call("measure_keys", switch, 1))
+            qtile.client.group.setlayout(scenario.layout)
+            windows.create(scenario.windows)
+            if not wait_until(lambda: qtile.window_count() >= scenario.windows, timeout=60, interval=0.05):
+                print("{}: only {} of {} windows were managed".format(scenario.name, qtile.window_count(), scenario.windows))
+            if scenario.sections:
+                measured["sections"] = json.loads(qtile.call("spread_sections", scenario.sections))
+
+            measured["configure"] = json.loads(qtile.call("measure_layout", args.repeat))
+            for name, presses in scenario.actions.items():
+                measured["actions"][name] = json.loads(qtile.call("measure_keys", presses, args.repeat))
+            if scenario.sections:
+                measured["actions"]["collapse and expand"] = json.loads(qtile.call("measure_sections", args.repeat))
+
+            # Away and back: the group switch with all windows in place
+            away = [([MOD], str((scenario.group + 1) % group_count + 1))]
+            measured["actions"]["switch group"] += json.loads(qtile.call("measure_keys", away + switch, args.repeat))
+
+            print("{} ({} windows)".format(scenario.name, scenario.windows))
+            report("  configure", measured["configure"])
+            for name, samples in measured["actions"].items():
+                report("  " + name, samples)
+
+            windows.destroy()
+            wait_until(lambda: qtile.window_count() == 0, timeout=30, interval=0.05)
+
+        output = args.output or os.path.join(os.path.expanduser("~/.cache/qtile/bench"), "layouts-{}-{}.json".format(args.backend, results["revision"]))
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f)
+        print("\nsaved to {}".format(output))
+
+        if args.compare:
+            with open(args.compare) as f:
+                compare(json.load(f), results)
+    finally:
+        if windows is not None:
+            windows.close()
+        if qtile is not None:
+            qtile.close()
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+# }}}}
+
+# }}}
+
+# ==================================== Main ================================ {{{
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks for the qtile config")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    volume_parser = subparsers.add_parser("volume", help="keypress to volume change latency")
+    volume_parser.add_argument("--control",    default="Master")
+    volume_parser.add_argument("--iterations", type=int, default=50)
+    volume_parser.add_argument("--burst",      type=int, default=20, help="key repeats folded into one frame")
+    volume_parser.set_defaults(func=bench_volume)
+
+    monitors_parser = subparsers.add_parser("monitors", help="monitor profile switch time, randr vs xrandr scripts")
+    monitors_parser.add_argument("profiles",     nargs="+", help="e.g. left right above")
+    monitors_parser.add_argument("--iterations", type=int, default=5)
+    monitors_parser.set_defaults(func=bench_monitors)
+
+    screenshot_parser = subparsers.add_parser("screenshot", help="full screen capture latency, in-process vs the screenshot script")
+    screenshot_parser.add_argument("--iterations", type=int, default=20)
+    screenshot_parser.add_argument("--xvfb",       action="store_true", help="run against a private Xvfb server")
+    screenshot_parser.add_argument("--size",       default="1920x1080", help="Xvfb screen size")
+    screenshot_parser.set_defaults(func=bench_screenshot)
+
+    notifications_parser = subparsers.add_parser("notifications", help="event loop time spent on a notification flood")
+    notifications_parser.add_argument("--messages", type=int,   default=10000)
+    notifications_parser.add_argument("--distinct", type=int,   default=50,  help="distinct message texts")
+    notifications_parser.add_argument("--batch",    type=int,   default=100, help="messages posted per loop iteration")
+    notifications_parser.add_argument("--timeout",  type=float, default=0.01, help="display time of a notification")
+    notifications_parser.set_defaults(func=bench_notifications)
+
+    completion_parser = subparsers.add_parser("completion", help="prompt completion latency per keypress")
+    completion_parser.add_argument("--candidates", type=int, default=2000)
+    completion_parser.add_argument("--iterations", type=int, default=200)
+    completion_parser.add_argument("--length",     type=int, default=8, help="characters typed per query")
+    completion_parser.add_argument("--seed",       type=int, default=1)
+    completion_parser.add_argument("--runs",       type=int, default=5, help="runs per keypress, the best one counts")
+    completion_parser.set_defaults(func=bench_completion)
+
+    rules_parser = subparsers.add_parser("rules", help="window map latency, Match lists vs compiled rules")
+    rules_parser.add_argument("--windows", type=int, default=1000)
+    rules_parser.add_argument("--seed",    type=int, default=1)
+    rules_parser.set_defaults(func=bench_rules)
+
+    spawn_parser = subparsers.add_parser("spawn", help="key binding spawn latency, forking qtile vs the spawn server")
+    spawn_parser.add_argument("--iterations", type=int, default=200)
+    spawn_parser.add_argument("--rss",        type=int, default=300, help="MB this process grows to before spawning")
+    spawn_parser.set_defaults(func=bench_spawn)
+
+    layouts_parser = subparsers.add_parser("layouts", help="layout runs and key bindings of the whole config, in qtile under Xvfb or headless wlroots")
+    layouts_parser.add_argument("--windows", type=int, default=40,  help="windows in the columns, max and tile scenarios")
+    layouts_parser.add_argument("--tabs",    type=int, default=300, help="windows in the treetab scenario")
+    layouts_parser.add_argument("--repeat",  type=int, default=20,  help="runs of every measurement")
+    layouts_parser.add_argument("--backend", choices=["x11", "wayland"], default="x11", help="qtile backend to run on")
+    layouts_parser.add_argument("--size",    default="1920x1080",   help="screen size")
+    layouts_parser.add_argument("--only",    nargs="*",             help="scenarios to run: columns max treetab tile")
+    layouts_parser.add_argument("--output",  help="results file, by default ~/.cache/qtile/bench/layouts-<backend>-<revision>.json")
+    layouts_parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    layouts_parser.set_defaults(func=bench_layouts)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
+
+# }}}
@@ -0,0 +1,398 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import ctypes
+import io
+import struct
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+import xcffib
+import xcffib.shm
+import xcffib.xproto
+from xcffib.xproto import Atom, EventMask, ImageFormat, PropMode, WindowClass
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ============================== Shared Memory ============================= {{{
+
+IPC_PRIVATE = 0
+IPC_CREAT   = 0o1000
+IPC_RMID    = 0
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.shmat.restype  = ctypes.c_void_p
+_libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+_libc.shmdt.argtypes = [ctypes.c_void_p]
+
+class ShmSegment:
+    # A SysV shared memory segment attached to both this process and the X
+    # server. The server writes the image straight into it, the only copy made
+    # afterwards is the PNG encode, and only if somebody pastes.
+
+    def __init__(self, conn: xcffib.Connection, size: int):
+        self.conn = conn
+        self.size = size
+        self.shmid = _libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if self.shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        self.addr = _libc.shmat(self.shmid, None, 0)
+        if self.addr in (None, ctypes.c_void_p(-1).value):
+            _libc.shmctl(self.shmid, IPC_RMID, None)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+
+        self.seg = conn.generate_id()
+        try:
+            conn(xcffib.shm.key).Attach(self.seg, self.shmid, False, is_checked=True).check()
+        except Exception:
+            _libc.shmdt(self.addr)
+            raise
+        finally:
+            # The segment goes away as soon as both sides detached
+            _libc.shmctl(self.shmid, IPC_RMID, None)
+
+        self.data = memoryview((ctypes.c_char * size).from_address(self.addr)).cast("B")
+
+    def close(self) -> None:
+        if self.addr is None:
+            return
+        self.data.release()
+        try:
+            self.conn(xcffib.shm.key).Detach(self.seg)
+            self.conn.flush()
+        except xcffib.XcffibException:
+            # Closed after the connection, as when an encode outlived it, the
+            # server detached it when the connection went
+            pass
+        _libc.shmdt(self.addr)
+        self.addr = None
+
+# }}}
+
+# =================================== Images =============================== {{{
+
+def encode_png(width: int, height: int, bgrx: memoryview, level: int = 3) -> bytes:
+    rgb = bytearray(width * height * 3)
+    rgb[0::3] = bgrx[2::4]
+    rgb[1::3] = bgrx[1::4]
+    rgb[2::3] = bgrx[0::4]
+
+    # Every scanline starts with its filter type, 0 (none)
+    row  = width * 3
+    view = memoryview(rgb)
+    raw  = b"".join(b"\x00" + view[y * row:(y + 1) * row] for y in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        chunk(b"IDAT", zlib.compress(raw, level)),
+        chunk(b"IEND", b""),
+    ])
+
+class Image:
+    def __init__(self, width: int, height: int, data: memoryview, segment: Optional[ShmSegment] = None):
+        self.width    = width
+        self.height   = height
+        self.data     = data
+        self.segment  = segment
+        self._png: Optional[bytes] = None
+        self._encoding: Optional[asyncio.Future] = None
+
+    def png(self) -> bytes:
+        # Encoded on the first paste only, taking a screenshot never pays for it
+        if self._png is None:
+            self._png = encode_png(self.width, self.height, self.data)
+        return self._png
+
+    def encode(self) -> asyncio.Future:
+        """png() in a worker thread, one encode for all pastes waiting on it"""
+        if self._encoding is None:
+            self._encoding = eventloop.run_in_executor(self.png)
+        return self._encoding
+
+    def close(self) -> None:
+        if self._encoding is not None and not self._encoding.done():
+            # The worker still reads the segment, it goes once the encode is done
+            self._encoding.add_done_callback(lambda _: self.close())
+            return
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+# }}}
+
+# ================================= Screenshots ============================ {{{
+
+class Screenshots:
+    # Captures the screen over its own X connection and offers the image on
+    # the CLIPBOARD selection. A separate connection keeps the selection
+    # traffic out of qtile's event handlers.
+
+    def __init__(self, display: Optional[str] = None):
+        self.display = display
+
+        self.conn: Optional[xcffib.Connection] = None
+        self.image: Optional[Image]            = None
+        # Taken, waiting for the server time to own the CLIPBOARD with
+        self._pending: Optional[Image]         = None
+        self.last_capture                      = 0.0
+        self._atoms: Dict[str, int]            = {}
+        self._transfers: Dict[Tuple[int, int], Tuple[bytes, int]] = {}
+        self._shm                              = False
+        # Server time the CLIPBOARD was taken at, what TIMESTAMP answers
+        self._owned_at                         = xcffib.CurrentTime
+
+    # --------------------------- X connection ---------------------------- {{{{
+
+    def _connect(self) -> None:
+        if self.conn is not None:
+            return
+        self.conn   = xcffib.connect(display=self.display)
+        setup       = self.conn.get_setup()
+        self.root   = setup.roots[self.conn.pref_screen]
+        self.window = self.conn.generate_id()
+        self.conn.core.CreateWindow(
+            0, self.window, self.root.root, -1, -1, 1, 1, 0,
+            WindowClass.InputOnly, self.root.root_visual,
+            xcffib.xproto.CW.EventMask, [EventMask.PropertyChange],
+        )
+        try:
+            self._shm = self.conn(xcffib.shm.key).QueryVersion().reply() is not None
+        except xcffib.ExtensionException:
+            self._shm = False
+
+        # _handle looks for this one in every PropertyNotify
+        self._atom("_QTILE_SCREENSHOT_TIME")
+
+        # Chunks bigger than this are sent with the INCR protocol
+        self._max_chunk = min(self.conn.get_maximum_request_length() * 4 - 64, 1 << 20)
+
+        eventloop.add_reader(self.conn.get_file_descriptor(), self._poll)
+        self.conn.flush()
+
+    def _atom(self, name: str) -> int:
+        if name not in self._atoms:
+            self._atoms[name] = self.conn.core.InternAtom(False, len(name), name).reply().atom
+        return self._atoms[name]
+
+    def close(self) -> None:
+        self._release()
+        if self.conn is not None:
+            eventloop.remove_reader(self.conn.get_file_descriptor())
+            self.conn.disconnect()
+            self.conn = None
+
+    # }}}}
+
+    # ------------------------------ Capture ------------------------------ {{{{
+
+    def grab(self, x: int, y: int, width: int, height: int) -> Image:
+        self._connect()
+        # Clip to the root window, GetImage fails for areas outside of it
+        x, y   = max(0, x), max(0, y)
+        width  = max(1, min(width, self.root.width_in_pixels - x))
+        height = max(1, min(height, self.root.height_in_pixels - y))
+
+        if self._shm:
+            try:
+                segment = ShmSegment(self.conn, width * height * 4)
+            except (OSError, xcffib.XcffibException) as e:
+                # The server may not be able to reach our memory, from another
+                # host or container, even though it offers the extension
+                logger.warning("Unable to share memory with the X server, capturing without MIT-SHM: %s", e)
+                self._shm = False
+                return self.grab(x, y, width, height)
+            try:
+                self.conn(xcffib.shm.key).GetImage(
+                    self.root.root, x, y, width, height, 0xFFFFFFFF, ImageFormat.ZPixmap, segment.seg, 0
+                ).reply()
+            except Exception:
+                segment.close()
+                raise
+            return Image(width, height, segment.data, segment)
+
+        reply = self.conn.core.GetImage(ImageFormat.ZPixmap, self.root.root, x, y, width, height, 0xFFFFFFFF).reply()
+        return Image(width, height, memoryview(reply.data.raw))
+
+    def take(self, x: int, y: int, width: int, height: int) -> Image:
+        start = time.monotonic()
+        image = self.grab(x, y, width, height)
+        self._own(image)
+        self.last_capture = time.monotonic() - start
+        return image
+
+    def take_window(self, window) -> Optional[Image]:
+        if window is None:
+            return None
+        border = window.borderwidth
+        return self.take(window.x + border, window.y + border, window.width, window.height)
+
+    def take_full(self) -> Image:
+        self._connect()
+        return self.take(0, 0, self.root.width_in_pixels, self.root.height_in_pixels)
+
+    async def take_selection(self) -> Optional[Image]:
+        # Drawing the rubber band is left to slop, that is what maim uses too
+        proc = await asyncio.create_subprocess_exec(
+            "slop", "--format=%x %y %w %h", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        out, _ = await proc.communicate()
+        if proc.returncode != 0:
+            return None
+        x, y, width, height = (int(v) for v in out.split())
+        return self.take(x, y, width, height)
+
+    async def capture(self, mode: str, window=None) -> Optional[Image]:
+        try:
+            if mode == "active":
+                return self.take_window(window)
+            if mode == "section":
+                return await self.take_selection()
+            if mode == "full":
+                return self.take_full()
+            logger.error("Unknown screenshot mode '%s'", mode)
+        except Exception:
+            logger.exception("Unable to take a %s screenshot", mode)
+        return None
+
+    def capture_soon(self, mode: str, window=None) -> asyncio.Task:
+        return eventloop.get_loop().create_task(self.capture(mode, window))
+
+    # }}}}
+
+    # ----------------------------- Clipboard ----------------------------- {{{{
+
+    def _own(self, image: Image) -> None:
+        """Offers image on the CLIPBOARD. ICCCM doesn't allow CurrentTime for
+        taking a selection, the server's time comes with the PropertyNotify
+        a zero length append to our own window causes, and the selection is
+        taken when _handle sees it instead of waiting for it here."""
+        self._release()
+        self._pending = image
+        self.conn.core.ChangeProperty(PropMode.Append, self.window, self._atom("_QTILE_SCREENSHOT_TIME"), Atom.STRING, 8, 0, b"")
+        self.conn.flush()
+
+    def _owned(self, event) -> None:
+        if self._pending is None:
+            # The notify of a screenshot that was replaced before it got here
+            return
+        self.image, self._pending = self._pending, None
+        self._owned_at = event.time
+        # The time is the server's latest, so only a later owner can win over
+        # it, and that one sends us a SelectionClear
+        self.conn.core.SetSelectionOwner(self.window, self._atom("CLIPBOARD"), self._owned_at)
+
+    def _release(self) -> None:
+        self._transfers.clear()
+        for image in (self.image, self._pending):
+            if image is not None:
+                image.close()
+        self.image    = None
+        self._pending = None
+
+    def _change_property(self, window: int, prop: int, type: int, format: int, data: bytes) -> None:
+        # xcffib's ChangeProperty packs the data byte by byte, which takes
+        # seconds for a screenshot, so the request is built by hand
+        buf = io.BytesIO()
+        buf.write(struct.pack("=xB2xIIIB3xI", PropMode.Replace, window, prop, type, format, len(data) * 8 // format))
+        buf.write(data)
+        self.conn.core.send_request(18, buf)
+
+    def _poll(self) -> None:
+        while True:
+            event = self.conn.poll_for_event()
+            if event is None:
+                break
+            self._handle(event)
+        self.conn.flush()
+
+    def _handle(self, event) -> None:
+        if isinstance(event, xcffib.xproto.SelectionRequestEvent):
+            self._selection_request(event)
+        elif isinstance(event, xcffib.xproto.SelectionClearEvent):
+            self._release()
+        elif isinstance(event, xcffib.xproto.PropertyNotifyEvent):
+            if event.window == self.window and event.atom == self._atom("_QTILE_SCREENSHOT_TIME"):
+                self._owned(event)
+            else:
+                self._incr_next(event)
+
+    def _selection_request(self, event) -> None:
+        prop   = event.property or event.target
+        target = event.target
+        if self.image is None:
+            prop = Atom._None
+        elif event.time != xcffib.CurrentTime and event.time < self._owned_at:
+            # Asked about a selection from before we took it
+            prop = Atom._None
+        elif target == self._atom("TARGETS"):
+            targets = [self._atom("TARGETS"), self._atom("TIMESTAMP"), self._atom("image/png")]
+            self._change_property(event.requestor, prop, Atom.ATOM, 32, struct.pack("=%dI" % len(targets), *targets))
+        elif target == self._atom("TIMESTAMP"):
+            self._change_property(event.requestor, prop, Atom.INTEGER, 32, struct.pack("=I", self._owned_at))
+        elif target == self._atom("image/png"):
+            if self.image._png is None:
+                # Encoding takes a good part of a second for a large screen,
+                # the requestor gets its answer once the worker is done
+                self._answer_later(event, self.image)
+                return
+            self._send_png(event.requestor, prop, self.image._png)
+        else:
+            prop = Atom._None
+        self._notify(event, prop)
+
+    def _answer_later(self, event, image: Image) -> None:
+        prop = event.property or event.target
+
+        def encoded(future: asyncio.Future) -> None:
+            if self.conn is None:
+                return
+            if future.cancelled() or future.exception() is not None:
+                if not future.cancelled():
+                    logger.error("Unable to encode the screenshot", exc_info=future.exception())
+                self._notify(event, Atom._None)
+            elif image is not self.image:
+                # Replaced or cleared while encoding
+                self._notify(event, Atom._None)
+            else:
+                self._send_png(event.requestor, prop, future.result())
+                self._notify(event, prop)
+            self.conn.flush()
+
+        image.encode().add_done_callback(encoded)
+
+    def _send_png(self, requestor: int, prop: int, data: bytes) -> None:
+        if len(data) <= self._max_chunk:
+            self._change_property(requestor, prop, self._atom("image/png"), 8, data)
+        else:
+            self.conn.core.ChangeWindowAttributes(requestor, xcffib.xproto.CW.EventMask, [EventMask.PropertyChange])
+            self._change_property(requestor, prop, self._atom("INCR"), 32, struct.pack("=I", len(data)))
+            self._transfers[(requestor, prop)] = (data, 0)
+
+    def _notify(self, event, prop: int) -> None:
+        notify = xcffib.xproto.SelectionNotifyEvent.synthetic(event.time, event.requestor, event.selection, event.target, prop)
+        self.conn.core.SendEvent(False, event.requestor, EventMask.NoEvent, notify.pack())
+
+    def _incr_next(self, event) -> None:
+        key = (event.window, event.atom)
+        if event.state != xcffib.xproto.Property.Delete or key not in self._transfers:
+            return
+        data, offset = self._transfers[key]
+        chunk = data[offset:offset + self._max_chunk]
+        self._change_property(event.window, event.atom, self._atom("image/png"), 8, chunk)
+        if chunk:
+            self._transfers[key] = (data, offset + len(chunk))
+        else:
+            # The zero length chunk ends the transfer
+            del self._transfers[key]
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,223 @@
+#  ================================== Imports ============================== {{{
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import eventloop
+
+# }}}
+
+# ================================== Matching ============================== {{{
+
+BOUNDARIES = re.compile("[ _\\-./:]+")
+
+def initials(word: str) -> str:
+    # "next_screen" -> "ns"
+    return "".join(part[0] for part in BOUNDARIES.split(word) if part)
+
+def subsequence_pattern(query: str) -> "re.Pattern":
+    # [^a]*a[^b]*b... never backtracks, unlike .*?a.*?b
+    return re.compile("".join("[^{0}]*{0}".format(re.escape(c)) for c in query))
+
+class CompletionIndex:
+    # An immutable set of words kept in an array sorted by length, then
+    # alphabetically, with the ranked matches of every single character built
+    # along with it. A query only looks at the words containing its rarest
+    # character, or, when it extends the last query (the user typed another
+    # character), at the last matches if there are fewer of those.
+
+    def __init__(self, words: Iterable[str]):
+        self.words    = sorted(set(words), key=lambda w: (len(w.lower()), w.lower(), w))
+        self.folded   = [w.lower() for w in self.words]
+        self.sorted   = sorted(range(len(self.words)), key=lambda i: (self.folded[i], self.words[i]))
+        self.initials = [initials(w) for w in self.folded]
+        self.spaced   = [" " + BOUNDARIES.sub(" ", w) for w in self.folded]
+
+        # Posting lists: character -> the words containing it, ranked
+        postings: Dict[str, List[int]] = {}
+        for i, word in enumerate(self.folded):
+            for char in set(word):
+                postings.setdefault(char, []).append(i)
+        self.single: Dict[str, List[int]] = {char: self._search(char, found) for char, found in postings.items()}
+
+        self._query              = ""
+        self._found: List[int]   = self.sorted
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _single(self, char: str) -> List[int]:
+        return self.single.get(char, [])
+
+    def _tier(self, query: str, i: int) -> int:
+        # The first element of the ranking in _search, for a word known to match
+        word = self.folded[i]
+        return (
+            0 if word.startswith(query) else
+            1 if " " + BOUNDARIES.sub(" ", query) in self.spaced[i] else
+            2 if self.initials[i].startswith(query) else
+            3 if query in word else 4
+        )
+
+    def _search(self, query: str, pool: Iterable[int]) -> List[int]:
+        # Ranked by: prefix, substring at a word boundary, initials, substring
+        # anywhere, in order anywhere; then by length, which is the order of
+        # the words. Written as a single comprehension, a function call per
+        # word costs more than the match, and tier * count + word is one small
+        # int, which sorts several times faster than a tuple.
+        match    = subsequence_pattern(query).match
+        bounded  = " " + BOUNDARIES.sub(" ", query)
+        folded   = self.folded
+        spaced   = self.spaced
+        initials = self.initials
+        count    = len(folded)
+        ranked   = sorted(
+            (
+                0 if word.startswith(query) else
+                count if bounded in spaced[i] else
+                2 * count if initials[i].startswith(query) else
+                3 * count if query in word else 4 * count
+            ) + i
+            for i in pool if match(word := folded[i])
+        )
+        return [key % count for key in ranked]
+
+    def search(self, query: str, boost: Optional[Dict[str, float]] = None) -> List[str]:
+        """Ranked matches; words with a `boost` move ahead of the other words
+        of their rank, higher boosts first"""
+        query = query.lower()
+        if not query:
+            found = self.sorted
+        elif len(query) == 1:
+            found = self._single(query)
+        else:
+            pools = [self._single(c) for c in set(query)]
+            if self._query and query.startswith(self._query):
+                pools.append(self._found)
+            found = self._search(query, min(pools, key=len))
+
+        self._query = query
+        self._found = found
+        if boost:
+            words = self.words
+            if any(words[i] in boost for i in found):
+                found = sorted(
+                    found,
+                    key=lambda i: (self._tier(query, i) if query else 0, -boost.get(words[i], 0.0)),
+                )
+        return [self.words[i] for i in found]
+
+# }}}
+
+# ================================== Completer ============================= {{{
+
+Source = Callable[[object], Iterable[str]]
+Boost  = Callable[[], Dict[str, float]]
+
+class Completions:
+    # Completion engine for the custom command prompt. Every source is indexed
+    # the first time it is needed and then kept until it is invalidated, the
+    # first word of the line completes from `command_source`, arguments from
+    # the source registered for their command. With `whole_line` the entire
+    # line is matched against `command_source`, for words containing spaces.
+
+    def __init__(self, command_source: str = "commands", default_argument_source: Optional[str] = None, whole_line: bool = False):
+        self.command_source          = command_source
+        self.default_argument_source = default_argument_source
+        self.whole_line              = whole_line
+
+        self.sources: Dict[str, Source]          = {}
+        self.boosts: Dict[str, Boost]            = {}
+        self.arguments: Dict[str, str]           = {}
+        self._indexes: Dict[str, CompletionIndex] = {}
+        self._rebuilds: Dict[str, object]         = {}
+
+    def add_source(self, name: str, source: Source, boost: Optional[Boost] = None) -> None:
+        self.sources[name] = source
+        if boost is not None:
+            self.boosts[name] = boost
+        self._indexes.pop(name, None)
+
+    def add_arguments(self, command: str, source: str) -> None:
+        self.arguments[command] = source
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        if name is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(name, None)
+
+    def rebuild_later(self, name: str, delay: float = 1.0) -> None:
+        """Invalidates the source and indexes it again once it stopped
+        changing for `delay` seconds, for large sources that change while
+        nobody is typing"""
+        self.invalidate(name)
+        handle = self._rebuilds.pop(name, None)
+        if handle is not None:
+            handle.cancel()
+        self._rebuilds[name] = eventloop.call_later(delay, self._rebuild, name)
+
+    def _rebuild(self, name: str) -> None:
+        self._rebuilds.pop(name, None)
+        self.index(name)
+
+    def index(self, name: str, qtile=None) -> CompletionIndex:
+        index = self._indexes.get(name)
+        if index is None:
+            index = CompletionIndex(self.sources[name](qtile))
+            self._indexes[name] = index
+        return index
+
+    def complete(self, line: str, qtile=None) -> Tuple[str, List[str]]:
+        """Splits `line` into the part that is kept and the word being
+        completed, and returns the kept part with the ranked candidates"""
+        if self.whole_line:
+            head, word = "", line
+        else:
+            head, _, word = line.rpartition(" ")
+        words = head.split()
+        if not words:
+            source = self.command_source
+        else:
+            source = self.arguments.get(words[0], self.default_argument_source)
+        if source is None or source not in self.sources:
+            return line, []
+        prefix = head + " " if head else ""
+        boost  = self.boosts.get(source)
+        return prefix, self.index(source, qtile).search(word, boost() if boost else None)
+
+    def prompt_completer(self):
+        """A completer class for qtile's Prompt widget"""
+        engine = self
+
+        class PromptCompleter:
+            def __init__(self, qtile):
+                self.qtile = qtile
+                self.thisfinal: Optional[str]   = None
+                self.lookup: Optional[List[str]] = None
+                self.offset = -1
+
+            def actual(self) -> Optional[str]:
+                return self.thisfinal
+
+            def reset(self) -> None:
+                self.lookup = None
+                self.offset = -1
+
+            def complete(self, txt: str) -> str:
+                if self.lookup is None:
+                    prefix, matches = engine.complete(txt, self.qtile)
+                    self.lookup = [prefix + match for match in matches]
+                    # Cycling past the last match gives back what was typed
+                    self.lookup.append(txt)
+                    self.offset = -1
+
+                self.offset += 1
+                if self.offset >= len(self.lookup):
+                    self.offset = 0
+                self.thisfinal = self.lookup[self.offset]
+                return self.thisfinal
+
+        return PromptCompleter
+
+# }}}
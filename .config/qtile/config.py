@@ -18,6 +18,34 @@ from collections import deque
 # from notify import notification
 from typing import Dict
 
+from volume import VolumeController, MixerVolume
+from backlight import Backlight
+from keyboard import KeyboardLayouts, KeyboardLayout
+from autostart import Autostart, Program
+from monitors import Monitors
+from capture import Screenshots
+from metrics import Sampler, MetricGraph
+from updates import UpdateCheck, PackageUpdates
+from notifications import NotificationQueue, NotificationBox, Urgency
+from completion import Completions
+from registry import Registry
+from rules import CompiledFloating, compile_group_matches
+from processes import Supervisor, spawn
+from spawner import SpawnServer
+from launcher import Launcher
+from switcher import WindowSwitcher
+from treetab import TreeTab
+from throttle import Throttle, Policy
+from frames import FrameScheduler
+from session import Session
+from profiling import Profiler, LagMonitor
+from uevent import UeventListener, UeventBattery
+from accounting import GroupAccounting, GroupUsageBox
+from reload import Reloader, Store
+from definitions import monitor_profiles, monitor_auto_profiles, chat_matches, media_matches, float_rules
+import signal
+import time
+
 # }}}
 
 #  =========================== Environment Varialbes ======================= {{{
@@ -33,7 +61,7 @@ os.environ["XMODIFIERS"] = "@im=fcitx"
 
 auto_fullscreen            = True
 focus_on_window_activation = "smart"
-reconfigure_screens        = True
+reconfigure_screens        = False # handled by the monitors subsystem
 auto_minimize              = True
 dgroups_key_binder         = None
 dgroups_app_rules          = []
@@ -51,18 +79,153 @@ terminal             = "kitty"
 border_width         = 2
 margin               = 10
 config_dir           = os.path.expanduser("~/.config/qtile")
-notify_send_settings = {"timeout": 0, "app_name": "qtile"}
+unclutter_command    = ["unclutter", "-grab", "-idle", "1", "-root"]
+recordings_dir       = os.path.expanduser("~/Videos")
+
+# }}}
+
+# ================================= Subsystems ============================= {{{
+
+# Everything that holds a socket, a process or state is kept when the config
+# is reloaded with mod+shift+r, and only made anew when its arguments change
+reloader    = Reloader(report=lambda text: notify(text, Urgency.INFO, timeout=5))
+keep        = reloader.keep
+
+store       = keep("store",       Store)
+volume      = keep("volume",      VolumeController, "Master")
+backlight   = keep("backlight",   Backlight, ramp=0.15)
+keyboard    = keep("keyboard",    KeyboardLayouts, ["us", "latin", "chinese", "russian", "greek"])
+screenshots = keep("screenshots", Screenshots)
+metrics     = keep("metrics",     Sampler, frequency=1, samples=100)
+registry    = keep("registry",    Registry)
+helpers     = keep("helpers",     Supervisor)
+spawner     = keep("spawner",     SpawnServer)
+launcher    = keep("launcher",    Launcher, spawner.spawn, terminal=[terminal])
+pacman      = keep("pacman",      UpdateCheck, "pacman", "/sbin/checkupdates",     interval=60 * 5)
+aur         = keep("aur",         UpdateCheck, "aur",    "/sbin/checkupdates-aur", interval=60 * 5)
+uevents     = keep("uevents",     UeventListener)
+accounting  = keep("accounting",  GroupAccounting, frequency=2, budget=128)
+
+hook.subscribe.startup(registry.attach)
+hook.subscribe.startup(uevents.start)
+hook.subscribe.startup(accounting.attach)
+uevents.subscribe("backlight", backlight.refresh)
+uevents.subscribe("input",     keyboard.device_added)
+# Started before the bars have collected any history
+hook.subscribe.startup(spawner.start)
+hook.subscribe.startup(launcher.start)
+
+launcher_completions = Completions(command_source="apps", whole_line=True)
+launcher_completions.add_source("apps", launcher.labels, boost=launcher.scores)
+launcher.subscribe(lambda: launcher_completions.rebuild_later("apps"))
+
+# ---------------------------------- Locking ------------------------------ {{{{
+
+session = keep("session", Session, [["~/bin/secure"], ["i3lock-fancy-dualmonitor"]])
+
+# Suspended in this order before the lockers run, resumed in reverse. The bars
+# can't be seen behind the lock screen, nothing on them polls or draws.
+# unclutter grabs the pointer, which would keep i3lock from locking.
+session.add("unclutter", lambda: helpers.suspend("unclutter", stop=True), lambda: helpers.resume("unclutter", unclutter_command))
+session.add("redshift",  lambda: helpers.suspend("redshift"),             lambda: helpers.resume("redshift"))
+session.add("dunst",     lambda: spawn(["dunstctl", "set-paused", "true"]).exited, lambda: spawn(["dunstctl", "set-paused", "false"]))
+session.add("metrics",   metrics.suspend,                                 metrics.resume)
+session.add("usage",     accounting.suspend,                              accounting.resume)
+session.add("pacman",    pacman.suspend,                                  pacman.resume)
+session.add("aur",       aur.suspend,                                     aur.resume)
+session.add("bars",      lambda: frames.suspend("lock"),                  lambda: frames.resume("lock"))
+
+# }}}}
 
 # }}}
 
 # ================================ Key Bindings ============================ {{{
 
+@lazy.function
+def spawn_program(qtile, cmd, shell: bool = False):
+    spawner.spawn(cmd, shell=shell)
+
+@lazy.function
+def launch_application(qtile):
+    prompt.start_input("run", launcher.launch, "launcher_completer")
+
+@lazy.function
+def switch_window(qtile):
+    prompt.start_input("window", switcher.switch, "window_completer")
+
 @lazy.function
 def active_group_to_next_screen(qtile):
     current_group = qtile.current_group
     qtile.cmd_next_screen()
     current_group.cmd_toscreen()
 
+@lazy.function
+def volume_step(qtile, delta: int):
+    volume.step(delta)
+
+@lazy.function
+def volume_set(qtile, level: int):
+    volume.set(level)
+
+@lazy.function
+def volume_mute(qtile):
+    volume.mute()
+
+@lazy.function
+def volume_unmute(qtile):
+    volume.unmute()
+
+@lazy.function
+def volume_toggle_mute(qtile):
+    volume.toggle_mute()
+
+@lazy.function
+def backlight_step(qtile, delta: int):
+    backlight.step(delta)
+
+@lazy.function
+def backlight_set(qtile, percent: int):
+    backlight.set(percent)
+
+@lazy.function
+def keyboard_layout(qtile, layout: str):
+    keyboard.switch_soon(layout)
+
+@lazy.function
+def monitor_profile(qtile, profile: str):
+    monitors.apply(profile)
+
+@lazy.function
+def screenshot(qtile, mode: str):
+    screenshots.capture_soon(mode, qtile.current_window)
+
+@lazy.function
+def record(qtile, mode: str):
+    if helpers.running("recorder"):
+        notify("Already recording", Urgency.WARN)
+        return
+    os.makedirs(recordings_dir, exist_ok=True)
+    argv = ["recordmydesktop", "-o", os.path.join(recordings_dir, time.strftime("recording-%Y-%m-%d-%H%M%S.ogv"))]
+    if mode == "active" and qtile.current_window is not None:
+        argv += ["--windowid", str(qtile.current_window.wid)]
+    helpers.start("recorder", argv)
+
+@lazy.function
+def recorder_signal(qtile, sig: int):
+    if not helpers.send("recorder", sig):
+        notify("Not recording", Urgency.WARN)
+
+@lazy.function
+def hide_mouse(qtile, hide: bool):
+    if hide:
+        helpers.start("unclutter", unclutter_command)
+    else:
+        helpers.stop("unclutter")
+
+@lazy.function
+def lock(qtile):
+    session.lock_soon()
+
 keys = [
 
     # ---------------------------- Window management ---------------------- {{{{
@@ -111,9 +274,9 @@ keys = [
     # -------------------------------- Shutdown --------------------------- {{{{
 
     KeyChord([mod, "shift"], "e", [
-            Key([], "s", lazy.spawn("shutdown now"), desc="Shutdown"),
-            Key([], "r", lazy.spawn("reboot"),       desc="Reboot"),
-            Key([], "k", lazy.shutdown(),            desc="Shutdown Qtile"),
+            Key([], "s", spawn_program("shutdown now"), desc="Shutdown"),
+            Key([], "r", spawn_program("reboot"),       desc="Reboot"),
+            Key([], "k", lazy.shutdown(),               desc="Shutdown Qtile"),
         ],
         mode="[S]utdown [R]eboot [K]ill Qtile"
     ),
@@ -123,9 +286,9 @@ keys = [
     # ------------------------------- Screenshots ------------------------- {{{{
 
     KeyChord([mod, "shift"], "p", [
-            Key([], "a", lazy.spawn(config_dir + "/screenshot active"),  lazy.ungrab_all_chords(), desc="Take a screenshot of the active window"),
-            Key([], "s", lazy.spawn(config_dir + "/screenshot section"), lazy.ungrab_all_chords(), desc="Take a screenshot of a section of the screen"),
-            Key([], "f", lazy.spawn(config_dir + "/screenshot full"),    lazy.ungrab_all_chords(), desc="Take a screenshot of the entire desktop"),
+            Key([], "a", screenshot("active"),  lazy.ungrab_all_chords(), desc="Take a screenshot of the active window"),
+            Key([], "s", screenshot("section"), lazy.ungrab_all_chords(), desc="Take a screenshot of a section of the screen"),
+            Key([], "f", screenshot("full"),    lazy.ungrab_all_chords(), desc="Take a screenshot of the entire desktop"),
         ],
         mode="Screenshot [A]ctive [S]ection [F]ull"
     ),
@@ -136,16 +299,16 @@ keys = [
 
     KeyChord([mod, "shift"], "d", [
             # record
-            Key([], "a", lazy.spawn("record_active_window"), lazy.ungrab_all_chords(), desc="Record active window"),
-            Key([], "f", lazy.spawn("record_full_desktop"),  lazy.ungrab_all_chords(), desc="Record full desktop"),
+            Key([], "a", record("active"), lazy.ungrab_all_chords(), desc="Record active window"),
+            Key([], "f", record("full"),   lazy.ungrab_all_chords(), desc="Record full desktop"),
 
             # pause/resume
-            Key([], "p", lazy.spawn("killalll recordmydesktop --signal SIGUSR1"), lazy.ungrab_all_chords(), desc="Pause recording"),
-            Key([], "r", lazy.spawn("killalll recordmydesktop --signal SIGUSR1"), lazy.ungrab_all_chords(), desc="Resume recording"),
+            Key([], "p", recorder_signal(signal.SIGUSR1), lazy.ungrab_all_chords(), desc="Pause recording"),
+            Key([], "r", recorder_signal(signal.SIGUSR1), lazy.ungrab_all_chords(), desc="Resume recording"),
 
             # stop/abort
-            Key([], "c", lazy.spawn("killalll recordmydesktop --signal SIGABRT"), lazy.ungrab_all_chords(), desc="Abort recording"),
-            Key([], "s", lazy.spawn("killalll recordmydesktop --signal SIGTERM"), lazy.ungrab_all_chords(), desc="Finish recording"),
+            Key([], "c", recorder_signal(signal.SIGABRT), lazy.ungrab_all_chords(), desc="Abort recording"),
+            Key([], "s", recorder_signal(signal.SIGTERM), lazy.ungrab_all_chords(), desc="Finish recording"),
         ],
         mode="Record Desktop [A]active [F]ull [P]ause [R]esume [C]ancel [S]top"
     ),
@@ -155,82 +318,82 @@ keys = [
     # ---------------------------- Volume Management ---------------------- {{{{
 
     KeyChord([mod, "shift"], "v", [
-            Key([], "m",        lazy.spawn("amixer set Master mute"),   desc="Mute volume"),
-            Key(["shift"], "m", lazy.spawn("amixer set Master unmute"), desc="Unmute volume"),
-            Key([], "l",        lazy.spawn("amixer set Master 5%+"),    desc="Louder 5%"),
-            Key(["shift"], "l", lazy.spawn("amixer set Master 1%+"),    desc="Louder 1%"),
-            Key([], "s",        lazy.spawn("amixer set Master 5%-"),    desc="Softer 5%"),
-            Key(["shift"], "s", lazy.spawn("amixer set Master 1%-"),    desc="Softer 1%"),
-            Key([], "1",        lazy.spawn("amixer set Master 10%"),    desc="Volume 10%"),
-            Key([], "2",        lazy.spawn("amixer set Master 20%"),    desc="Volume 20%"),
-            Key([], "3",        lazy.spawn("amixer set Master 30%"),    desc="Volume 30%"),
-            Key([], "4",        lazy.spawn("amixer set Master 40%"),    desc="Volume 40%"),
-            Key([], "5",        lazy.spawn("amixer set Master 50%"),    desc="Volume 50%"),
-            Key([], "6",        lazy.spawn("amixer set Master 60%"),    desc="Volume 60%"),
-            Key([], "7",        lazy.spawn("amixer set Master 70%"),    desc="Volume 70%"),
-            Key([], "8",        lazy.spawn("amixer set Master 80%"),    desc="Volume 80%"),
-            Key([], "9",        lazy.spawn("amixer set Master 90%"),    desc="Volume 90%"),
-            Key([], "0",        lazy.spawn("amixer set Master 100%"),   desc="Volume 100%"),
+            Key([], "m",        volume_mute,        desc="Mute volume"),
+            Key(["shift"], "m", volume_unmute,      desc="Unmute volume"),
+            Key([], "l",        volume_step(5),     desc="Louder 5%"),
+            Key(["shift"], "l", volume_step(1),     desc="Louder 1%"),
+            Key([], "s",        volume_step(-5),    desc="Softer 5%"),
+            Key(["shift"], "s", volume_step(-1),    desc="Softer 1%"),
+            Key([], "1",        volume_set(10),     desc="Volume 10%"),
+            Key([], "2",        volume_set(20),     desc="Volume 20%"),
+            Key([], "3",        volume_set(30),     desc="Volume 30%"),
+            Key([], "4",        volume_set(40),     desc="Volume 40%"),
+            Key([], "5",        volume_set(50),     desc="Volume 50%"),
+            Key([], "6",        volume_set(60),     desc="Volume 60%"),
+            Key([], "7",        volume_set(70),     desc="Volume 70%"),
+            Key([], "8",        volume_set(80),     desc="Volume 80%"),
+            Key([], "9",        volume_set(90),     desc="Volume 90%"),
+            Key([], "0",        volume_set(100),    desc="Volume 100%"),
         ],
         mode="Volume [M]ute [L]ouder [S]ofter [1234567890]"
     ),
 
-    Key([],        "XF86AudioRaiseVolume", lazy.spawn("amixer set Master 5%+"),    desc="Louder 5%"),
-    Key([],        "XF86AudioLowerVolume", lazy.spawn("amixer set Master 5%-"),    desc="Softer 5%"),
-    Key(["shift"], "XF86AudioRaiseVolume", lazy.spawn("amixer set Master 1%+"),    desc="Louder 1%"),
-    Key(["shift"], "XF86AudioLowerVolume", lazy.spawn("amixer set Master 1%-"),    desc="Softer 1%"),
-    Key([],        "XF86AudioMute",        lazy.spawn("amixer set Master toggle"), desc="Toggle mute"),
+    Key([],        "XF86AudioRaiseVolume", volume_step(5),       desc="Louder 5%"),
+    Key([],        "XF86AudioLowerVolume", volume_step(-5),      desc="Softer 5%"),
+    Key(["shift"], "XF86AudioRaiseVolume", volume_step(1),       desc="Louder 1%"),
+    Key(["shift"], "XF86AudioLowerVolume", volume_step(-1),      desc="Softer 1%"),
+    Key([],        "XF86AudioMute",        volume_toggle_mute,   desc="Toggle mute"),
 
     # }}}}
 
     # ---------------------------- Launch Programmes ---------------------- {{{{
 
-    Key([mod], "d",             lazy.spawn("rofi -monitor -1 -combi-modi drun,run -show combi"), desc="Launch a programme"),
-    Key([mod], "t",             lazy.spawn("rofi -monitor -1 -show window"),                     desc="Jump to a window"),
-    Key([mod,  "control"], "f", lazy.spawn("kitty ranger"),                          desc="Open ranger"),
-    Key([mod], "m",             lazy.spawn("unclutter -grab -idle 1 -root &"),       desc="Hide the mouse"),
-    Key([mod, "shift"], "m",    lazy.spawn("killall unclutter"),                     desc="Show the mouse"),
-    Key([mod], "Return",        lazy.spawn(terminal),                                desc="Launch a terminal"),
-    Key([mod, "shift"], "x",    lazy.spawn(config_dir + "/lock_qtile"),              desc="Lock the screen"),
+    Key([mod], "d",             launch_application,                                        desc="Launch a programme"),
+    Key([mod], "t",             switch_window,                                             desc="Jump to a window"),
+    Key([mod,  "control"], "f", spawn_program("kitty ranger"),                             desc="Open ranger"),
+    Key([mod], "m",             hide_mouse(True),                                          desc="Hide the mouse"),
+    Key([mod, "shift"], "m",    hide_mouse(False),                                         desc="Show the mouse"),
+    Key([mod], "Return",        spawn_program(terminal),                                   desc="Launch a terminal"),
+    Key([mod, "shift"], "x",    lock,                                                      desc="Lock the screen"),
 
     # }}}}
 
     # ----------------------------- Keyboard Layout ----------------------- {{{{
 
     KeyChord([mod], "q", [
-            Key([], "l", lazy.spawn(f"{config_dir}/keyboard_layout latin"),   lazy.ungrab_all_chords(), desc="Switch to Latin keybord layout"),
-            Key([], "c", lazy.spawn(f"{config_dir}/keyboard_layout chinese"), lazy.ungrab_all_chords(), desc="Switch to Chinese keybord layout"),
-            Key([], "r", lazy.spawn(f"{config_dir}/keyboard_layout russian"), lazy.ungrab_all_chords(), desc="Switch to Russian keybord layout"),
-            Key([], "u", lazy.spawn(f"{config_dir}/keyboard_layout us"),      lazy.ungrab_all_chords(), desc="Switch to English keybord layout"),
-            Key([], "g", lazy.spawn(f"{config_dir}/keyboard_layout greek"),   lazy.ungrab_all_chords(), desc="Switch to Greek keybord layout"),
-            Key([], "k", lazy.spawn(f"{config_dir}/keyboard_layout korean"),  lazy.ungrab_all_chords(), desc="Switch to Korean keybord layout"),
+            Key([], "l", keyboard_layout("latin"),   lazy.ungrab_all_chords(), desc="Switch to Latin keybord layout"),
+            Key([], "c", keyboard_layout("chinese"), lazy.ungrab_all_chords(), desc="Switch to Chinese keybord layout"),
+            Key([], "r", keyboard_layout("russian"), lazy.ungrab_all_chords(), desc="Switch to Russian keybord layout"),
+            Key([], "u", keyboard_layout("us"),      lazy.ungrab_all_chords(), desc="Switch to English keybord layout"),
+            Key([], "g", keyboard_layout("greek"),   lazy.ungrab_all_chords(), desc="Switch to Greek keybord layout"),
+            Key([], "k", keyboard_layout("korean"),  lazy.ungrab_all_chords(), desc="Switch to Korean keybord layout"),
         ],
         mode="Keyboard Layout [U]s [L]atin [C]hinese [R]ussian [G]reek [K]orean"
     ),
     # Temporary emergency back to US layout until Qtile handles scancodes
     # properly
-    Key([mod], "0", lazy.spawn(f"{config_dir}/keyboard_layout us"),  desc="Move focus to left"),
+    Key([mod], "0", keyboard_layout("us"), desc="Move focus to left"),
 
     # }}}}
 
     # -------------------------------- Backlight -------------------------- {{{{
 
     KeyChord([mod, "shift"], "b", [
-            Key([], "d", lazy.spawn("backlight dec 3"),   desc="Dim backlight"),
-            Key([], "l", lazy.spawn("backlight inc 3"),   desc="Increase backlight"),
-            Key([], "1", lazy.spawn("backlight set 1"),   desc="Backlight 1%"),
-            Key([], "2", lazy.spawn("backlight set 20"),  desc="Backlight 10%"),
-            Key([], "3", lazy.spawn("backlight set 30"),  desc="Backlight 20%"),
-            Key([], "4", lazy.spawn("backlight set 40"),  desc="Backlight 30%"),
-            Key([], "5", lazy.spawn("backlight set 50"),  desc="Backlight 40%"),
-            Key([], "6", lazy.spawn("backlight set 60"),  desc="Backlight 60%"),
-            Key([], "7", lazy.spawn("backlight set 70"),  desc="Backlight 70%"),
-            Key([], "8", lazy.spawn("backlight set 80"),  desc="Backlight 80%"),
-            Key([], "9", lazy.spawn("backlight set 90"),  desc="Backlight 90%"),
-            Key([], "0", lazy.spawn("backlight set 100"), desc="Backlight 100%"),
-
-	        Key([], "XF86AudioRaiseVolume", lazy.spawn("backlight inc 10"), desc="Backlight increase 10%"),
-	        Key([], "XF86AudioLowerVolume", lazy.spawn("backlight dec 10"), desc="Backlight dim 10%"),
+            Key([], "d", backlight_step(-3),  desc="Dim backlight"),
+            Key([], "l", backlight_step(3),   desc="Increase backlight"),
+            Key([], "1", backlight_set(1),    desc="Backlight 1%"),
+            Key([], "2", backlight_set(20),   desc="Backlight 10%"),
+            Key([], "3", backlight_set(30),   desc="Backlight 20%"),
+            Key([], "4", backlight_set(40),   desc="Backlight 30%"),
+            Key([], "5", backlight_set(50),   desc="Backlight 40%"),
+            Key([], "6", backlight_set(60),   desc="Backlight 60%"),
+            Key([], "7", backlight_set(70),   desc="Backlight 70%"),
+            Key([], "8", backlight_set(80),   desc="Backlight 80%"),
+            Key([], "9", backlight_set(90),   desc="Backlight 90%"),
+            Key([], "0", backlight_set(100),  desc="Backlight 100%"),
+
+	        Key([], "XF86AudioRaiseVolume", backlight_step(10),  desc="Backlight increase 10%"),
+	        Key([], "XF86AudioLowerVolume", backlight_step(-10), desc="Backlight dim 10%"),
         ],
         mode="Backlight [D]arker [L]ighter [1234567890]"
     ),
@@ -240,12 +403,12 @@ keys = [
     # -------------------------- Multi Monitor Layout --------------------- {{{{
 
     KeyChord([mod, "shift"], "s", [
-            Key([], "m", lazy.spawn("mirrorscreen"),     lazy.ungrab_all_chords(), desc="Mirror monitors"),
-            Key([], "l", lazy.spawn("dualscreen_left"),  lazy.ungrab_all_chords(), desc="External monitor on left"),
-            Key([], "r", lazy.spawn("dualscreen_right"), lazy.ungrab_all_chords(), desc="External monitor on right"),
-            Key([], "a", lazy.spawn("dualscreen_above"), lazy.ungrab_all_chords(), desc="External monitor above primary monitor"),
-            Key([], "s", lazy.spawn("singlescreen"),     lazy.ungrab_all_chords(), desc="Only built-in monitor"),
-            Key([], "o", lazy.spawn("otherscreen"),      lazy.ungrab_all_chords(), desc="Only external monitor"),
+            Key([], "m", monitor_profile("mirror"), lazy.ungrab_all_chords(), desc="Mirror monitors"),
+            Key([], "l", monitor_profile("left"),   lazy.ungrab_all_chords(), desc="External monitor on left"),
+            Key([], "r", monitor_profile("right"),  lazy.ungrab_all_chords(), desc="External monitor on right"),
+            Key([], "a", monitor_profile("above"),  lazy.ungrab_all_chords(), desc="External monitor above primary monitor"),
+            Key([], "s", monitor_profile("single"), lazy.ungrab_all_chords(), desc="Only built-in monitor"),
+            Key([], "o", monitor_profile("other"),  lazy.ungrab_all_chords(), desc="Only external monitor"),
         ],
         mode="Multi Monitor [M]irror [L]eft [R]ight [A]bove [S]ingle [O]ther"
     ),
@@ -261,13 +424,13 @@ keys = [
 
     # ----------------------------- Qtile Commands ------------------------ {{{{
 
-    Key([mod, "shift"], "r", lazy.reload_config(), desc="Reload the config"),
+    Key([mod, "shift"], "r", lazy.function(lambda qtile: reloader.reload(qtile)), desc="Reload what changed in the config"),
 
     # }}}}
 
     # ---------------------------------- Dunst ---------------------------- {{{{
 
-    Key([mod], "n", lazy.spawn("dunstctl close"), desc="Close notification"),
+    Key([mod], "n", spawn_program("dunstctl close"), desc="Close notification"),
 
     # }}}}
 ]
@@ -275,15 +438,59 @@ keys = [
 
 # =========================== Auto Start Applications ====================== {{{
 
+autostart_programs = [
+    # Chats
+    Program("telegram",   "telegram-desktop", ready_class="TelegramDesktop"),
+    Program("teams",      "chromium --app=https://teams.microsoft.com", unique=False, ready_class="teams.microsoft.com"),
+
+    # Display
+    Program("dualscreen", lambda: monitors.apply_auto(), oneshot=True),
+    Program("wallpaper",  "~/bin/wallpaper.sh",      oneshot=True, after=["dualscreen"]),
+    Program("redshift",   "redshift -t 5500:2500 -l 50:14"),
+    Program("unclutter",  unclutter_command),
+    Program("dunst",      "dunst"),
+
+    # Tools
+    Program("udiskie",    "udiskie"),
+
+    # Music
+    Program("spotblock",  "spotblock"),
+    Program("spotify",    "spotify", after=["spotblock"], ready_class="spotify"),
+
+    # Keyboard bindings
+    Program("xmodmap",    "xmodmap ~/.Xmodmap", oneshot=True, condition=lambda: os.path.isfile(os.path.expanduser("~/.Xmodmap"))),
+]
+
+autostart_always_programs = [
+    Program("picom", [
+        "picom",
+        "--fading",
+        "--fade-delta=5",
+        "--inactive-opacity=1.0",
+        "--inactive-dim=0.05",
+        "--menu-opacity=1.0",
+        # "--opacity-rule", "90:'name *= \"qutebrowser\"'",
+    ]),
+    # Program("conky", "conky"),
+]
+
+autostart_supervisor = keep("autostart", Autostart, helpers=helpers)
+# bench.py runs this config in a qtile of its own
+autostart_enabled    = not os.environ.get("QTILE_BENCHMARK")
+
 @hook.subscribe.startup_once
 def autostart():
-    autostart_script = os.path.expanduser(config_dir + "/autostart.sh")
-    subprocess.run([autostart_script])
+    if autostart_enabled:
+        autostart_supervisor.start(autostart_programs)
 
 @hook.subscribe.startup
 def autostart_always():
-    autostart_script = os.path.expanduser(config_dir + "/autostart_always.sh")
-    subprocess.run([autostart_script])
+    if autostart_enabled:
+        autostart_supervisor.start(autostart_always_programs)
+
+@hook.subscribe.client_new
+def autostart_window_mapped(window):
+    autostart_supervisor.window_mapped(window.get_wm_class())
 
 # }}}
 
@@ -371,29 +578,15 @@ layouts = [
     layout.Max(),
 ]
 
-web_tree_layout = layout.TreeTab(sections=["General", "Code"], **theme)
+web_tree_layout = TreeTab(sections=["General", "Code"], **theme)
 chats_layout    = layout.Tile(**theme)
 
 # }}}
 
 # ================================= Workspaces ============================= {{{
 
-# ---------------------------------- Defaults ----------------------------- {{{{
-
-chat_matches = [
-    Match(wm_class=["TelegramDesktop"]),
-    Match(wm_class=["Signal"]),
-    Match(wm_class=["Microsoft Teams - Preview"]),
-    Match(wm_class=["teams.microsoft.com"]),
-    Match(wm_class=["thunderbird"]),
-]
-
-media_matches = [
-    Match(title=["Spotify"]), # TODO this should probably be done through a hook
-    Match(title=["waterbird"]),
-]
-
-# }}}}
+# chat_matches and media_matches are in definitions.py, the rules benchmark
+# uses them too
 
 general_group = Group("")
 code_group = Group("")
@@ -411,20 +604,47 @@ groups = [
     media_group,
 ]
 
+# All group matches are checked through one compiled rule engine
+group_rules = compile_group_matches(groups)
+
+# Background applications on groups that are not shown. Chats still have to
+# receive messages and music has to keep playing, those are only limited.
+throttle = keep("throttle", Throttle, {
+    game_group.name:  Policy("freeze"),
+    chat_group.name:  Policy("limit", share=0.1),
+    media_group.name: Policy("limit", share=0.25),
+})
+hook.subscribe.startup(throttle.attach)
+
 # If a group is bound to a screen the binding is reported here. If it is not
-# here, the group can be displayed on any screen
-group_to_screen_binds: Dict[str, int] = {}
+# here, the group can be displayed on any screen. Kept across restarts.
+group_to_screen_binds: Dict[str, int] = store.dict("group_to_screen_binds")
 
-@lazy.function
-def move_group_to_screen(qtile: Qtile, group: str):
+# ---------------------------------- Monitors ----------------------------- {{{{
+
+# The profiles are in definitions.py, the monitors benchmark uses them too
+monitors = keep("monitors", Monitors, monitor_profiles, group_to_screen_binds, auto=monitor_auto_profiles)
+hook.subscribe.startup(monitors.attach_qtile)
+# Connectors the X server doesn't tell us about
+uevents.subscribe("drm", monitors.hotplug)
+
+# }}}}
+
+def show_group(group: str):
     # TODO when calling cmd_toscreen, if the group is on another screen, then
     # the groups on those screens are swapped. This ignores the bind that was
     # set here. Adda  check for this case and find some resolution to this
     # problem
-    for idx in range(len(qtile.groups)):
-        if qtile.groups[idx].name == group:
-            qtile.groups[idx].cmd_toscreen(group_to_screen_binds.get(group))
-            return
+    target = registry.group(group)
+    if target is not None:
+        target.cmd_toscreen(group_to_screen_binds.get(group))
+
+@lazy.function
+def move_group_to_screen(qtile: Qtile, group: str):
+    show_group(group)
+
+switcher = keep("switcher", WindowSwitcher, registry, show_group)
+hook.subscribe.startup(switcher.attach)
 
 for i in range(len(groups)):
     key = str(i + 1)
@@ -436,6 +656,15 @@ for i in range(len(groups)):
 
 # }}}
 
+# ================================ Notifications =========================== {{{
+
+notifications = keep("notifications", NotificationQueue, backlog=32, rate=10, burst=20)
+
+def notify(msg: str, urgency: Urgency=Urgency.INFO, timeout = 2):
+    notifications.push(msg, urgency, timeout)
+
+# }}}
+
 # =================================== Widgets ============================== {{{
 
 widget_defaults = dict(
@@ -477,76 +706,37 @@ groupbox_settings = {
 }
 
 chord       = widget.Chord(background=ColorPallet.red)
-updates     = widget.CheckUpdates(custom_command="/sbin/checkupdates",     update_interval=60 * 5, foreground=ColorPallet.yellow, colour_have_updates=ColorPallet.text,   display_format="Updates: {updates}")
-updates_aur = widget.CheckUpdates(custom_command="/sbin/checkupdates-aur", update_interval=60 * 5, foreground=ColorPallet.yellow, colour_have_updates=ColorPallet.yellow, display_format="AUR: {updates}")
+updates     = PackageUpdates(pacman, foreground=ColorPallet.yellow, colour_have_updates=ColorPallet.text,   display_format="Updates: {updates}")
+updates_aur = PackageUpdates(aur,    foreground=ColorPallet.yellow, colour_have_updates=ColorPallet.yellow, display_format="AUR: {updates}")
 
 mem_label    = widget.TextBox(fmt = "mem:")
-memory_graph = widget.MemoryGraph(border_color=ColorPallet.background, graph_color=ColorPallet.yellow,     fill_color=ColorPallet.yellow)
+memory_graph = MetricGraph(metrics, "memory",   border_color=ColorPallet.background, graph_color=ColorPallet.yellow, fill_color=ColorPallet.yellow)
 cpu_label    = widget.TextBox(fmt = "cpu:")
-cpu_graph    = widget.CPUGraph(border_color=ColorPallet.background,    graph_color=ColorPallet.blue,       fill_color=ColorPallet.blue)
+cpu_graph    = MetricGraph(metrics, "cpu",      border_color=ColorPallet.background, graph_color=ColorPallet.blue,   fill_color=ColorPallet.blue)
 net_label    = widget.TextBox(fmt = "net:")
-net_graph    = widget.NetGraph(border_color=ColorPallet.background,    graph_color=ColorPallet.green,      fill_color=ColorPallet.green)
+net_graph    = MetricGraph(metrics, "net_down", border_color=ColorPallet.background, graph_color=ColorPallet.green,  fill_color=ColorPallet.green)
+group_usage  = GroupUsageBox(accounting, count=2, threshold=5.0,     foreground=ColorPallet.blue)
+volume_level = MixerVolume(volume,                                     foreground=ColorPallet.aqua2)
 clock        = widget.Clock(format='%Y-%m-%d %a %I:%M %p')
-battery      = widget.Battery(format="{percent:2.0%} {char}",          charge_char="",                    discharge_char="",                low_foreground=ColorPallet.red, foreground=ColorPallet.green)
+battery      = UeventBattery(uevents, format="{percent:2.0%} {char}",  charge_char="",                    discharge_char="",                low_foreground=ColorPallet.red, foreground=ColorPallet.green)
+layout_name  = KeyboardLayout(keyboard,                                foreground=ColorPallet.aqua2)
 prompt       = widget.Prompt(cursor=False,                             background=ColorPallet.yellow,      foreground=ColorPallet.background, prompt='{prompt} ')
-text_boxes   = [widget.TextBox() for i in range(2)]
+notification_box = NotificationBox(notifications, colours={
+    Urgency.INFO:  (ColorPallet.yellow, ColorPallet.background),
+    Urgency.ERROR: (ColorPallet.red,    ColorPallet.text),
+    Urgency.WARN:  (ColorPallet.orange, ColorPallet.text),
+})
 
-bar1 = bar.Bar([widget.GroupBox(**groupbox_settings, fontsize=14), widget.CurrentLayoutIcon(scale=0.7), prompt, widget.Spacer(), chord, text_boxes[0], updates, updates_aur, widget.Sep(foreground = ColorPallet.bg4), mem_label, memory_graph, cpu_label, cpu_graph, net_label, net_graph, clock, battery, ], 24, background=ColorPallet.background)
-bar2 = bar.Bar([widget.GroupBox(**groupbox_settings, fontsize=14), widget.CurrentLayoutIcon(scale=0.7), prompt, widget.Spacer(), chord, text_boxes[1], updates, updates_aur, widget.Sep(foreground = ColorPallet.bg4), mem_label, memory_graph, cpu_label, cpu_graph, net_label, net_graph, clock, battery, ], 24, background=ColorPallet.background)
+bar1 = bar.Bar([widget.GroupBox(**groupbox_settings, fontsize=14), widget.CurrentLayoutIcon(scale=0.7), prompt, widget.Spacer(), chord, notification_box, layout_name, updates, updates_aur, widget.Sep(foreground = ColorPallet.bg4), mem_label, memory_graph, cpu_label, cpu_graph, net_label, net_graph, group_usage, volume_level, clock, battery, ], 24, background=ColorPallet.background)
+bar2 = bar.Bar([widget.GroupBox(**groupbox_settings, fontsize=14), widget.CurrentLayoutIcon(scale=0.7), prompt, widget.Spacer(), chord, notification_box, layout_name, updates, updates_aur, widget.Sep(foreground = ColorPallet.bg4), mem_label, memory_graph, cpu_label, cpu_graph, net_label, net_graph, group_usage, volume_level, clock, battery, ], 24, background=ColorPallet.background)
 
 screens = [ Screen(bottom=bar1), Screen(bottom=bar2), ]
 
-# }}}
-
-# ================================ Notifications =========================== {{{
-
-class Urgency(Enum):
-    INFO  = 0
-    ERROR = 1
-    WARN  = 2
-
-class Notification:
-    def __init__(self, msg: str, urgency: Urgency, timeout: int):
-        self.msg     = msg
-        self.timeout = timeout
-        self.urgency = urgency
-
-notifications = deque()
-notifications_running = False
-
-def update_notifications():
-    pass
-    # global notifications_running
-    # if len(notifications) != 0:
-    #     notification = notifications.popleft()
-    #     for text_box in text_boxes:
-    #         text_box.cmd_update(notification.msg)
-
-    #         # TODO the background colours don't display on all bars
-    #         if notification.urgency == Urgency.INFO:
-    #             text_box.background = ColorPallet.yellow
-    #             text_box.foreground = ColorPallet.background
-    #         elif notification.urgency == Urgency.ERROR:
-    #             text_box.background = ColorPallet.red
-    #             text_box.foreground = ColorPallet.text
-    #         elif notification.urgency == Urgency.WARN:
-    #             text_box.background = ColorPallet.orange
-    #             text_box.foreground = ColorPallet.text
-
-    #         text_box.timeout_add(notification.timeout, update_notifications)
-    # else:
-    #     for text_box in text_boxes:
-    #         text_box.cmd_update("")
-    #     notifications_running = False
-
-def notify(msg: str, urgency: Urgency=Urgency.INFO, timeout = 2):
-    pass
-    # global notifications_running
-    # notification = Notification(msg, urgency, timeout)
-    # notifications.append(notification)
-    # if not notifications_running:
-    #     notifications_running = True
-    #     update_notifications()
+frames = keep("frames", FrameScheduler, fps=20)
+# Typing in the prompt shouldn't wait for a frame
+frames.unmanaged = [prompt]
+hook.subscribe.startup(frames.attach)
+reloader.subscribe(frames.manage)
 
 # }}}
 
@@ -557,58 +747,65 @@ class Callback(NamedTuple):
     doc: str
 
 def find_web_layout():
-    global QTILE_INSTANCE
-    for group in QTILE_INSTANCE.groups:
-        if group.name == web_group.name:
-            return group.layout
+    return registry.layout(web_group.name, "treetab")
 
-def add_web_section(args: list[str]):
+def apply_web_sections(operation: str, args: list[str]):
+    # One redraw of the web panel however many sections are named
     layout = find_web_layout()
-    for arg in args:
-        layout.cmd_add_section(arg)
+    errors = layout.apply([(operation, arg) for arg in args] or [(operation, None)])
+    for error in errors:
+        notify(error, Urgency.ERROR)
+    if operation in ("add", "del"):
+        command_completions.invalidate("sections")
+        store.set("web_sections", layout.section_titles())
+
+@hook.subscribe.startup
+def restore_web_sections():
+    # Sections added and removed at runtime, web_tree_layout only has the
+    # ones to start with
+    sections = store.get("web_sections")
+    layout   = find_web_layout()
+    if not sections or layout is None:
+        return
+    current = layout.section_titles()
+    layout.apply([("add", title) for title in sections if title not in current] + [("del", title) for title in current if title not in sections])
+
+def add_web_section(args: list[str]):
+    apply_web_sections("add", args)
 
 def remove_web_section(args: list[str]):
-    layout = find_web_layout()
-    for arg in args:
-        layout.cmd_del_section(arg)
+    apply_web_sections("del", args)
 
 def collapse_web_section(args: list[str]):
-    layout = find_web_layout()
-    layout.cmd_collapse_branch()
+    apply_web_sections("collapse", args)
 
 def expand_web_section(args: list[str]):
-    layout = find_web_layout()
-    layout.cmd_expand_branch()
+    apply_web_sections("expand", args)
 
 def hide_web_tabs(args: list[str]):
-    layout = find_web_layout()
-    layout.hide()
-    notify("Not fully implemented", Urgency.WARN)
+    find_web_layout().hide_panel()
 
 def show_web_tabs(args: list[str]):
-    layout = find_web_layout()
-    layout._panel.unhide()
-    notify("Not fully implemented", Urgency.WARN)
+    find_web_layout().show_panel()
 
 def bind_layout_to_screen(args: list[str]):
-    global QTILE_INSTANCE
+    qtile = registry.qtile
 
     try:
-        screen_idx = QTILE_INSTANCE.screens.index(QTILE_INSTANCE.current_screen)
+        screen_idx = qtile.screens.index(qtile.current_screen)
     except:
         # This should never happen
-        notification("Error tyring to find screen", **notify_send_settings)
+        notify("Error tyring to find screen", Urgency.ERROR)
         return
 
-    group_to_screen_binds[QTILE_INSTANCE.current_group.name] = screen_idx
+    group_to_screen_binds[qtile.current_group.name] = screen_idx
 
 def unbind_workspace(args: list[str]):
-    global QTILE_INSTANCE
-    group_to_screen_binds.pop(QTILE_INSTANCE.current_group.name, None)
+    group_to_screen_binds.pop(registry.current_group.name, None)
 
 def unbind_all(args: list[str]):
-    global group_to_screen_binds
-    group_to_screen_binds = {}
+    # Cleared in place, the monitors subsystem holds on to the same dict
+    group_to_screen_binds.clear()
 
 def bind_list(args: list[str]):
     global group_to_screen_binds
@@ -617,19 +814,85 @@ def bind_list(args: list[str]):
         msg = msg + "{}: {}".format(k, v) + "\n"
     if msg != "":
         msg = "Screen bindings:\n" + msg
-        notification(msg, **notify_send_settings)
+        notify(msg, Urgency.INFO, timeout=5)
+
+def explain_window_rules(args: list[str]):
+    window = registry.qtile.current_window
+    if window is None:
+        notify("No focused window", Urgency.WARN)
+        return
+    for name, engine in (("group", group_rules), ("float", registry.current_group.floating_layout.engine)):
+        hit = engine.explain(window)
+        if hit is None:
+            notify("{}: no rule".format(name), Urgency.INFO)
+        else:
+            notify("{}: rule {} {} -> {}".format(name, hit.index, hit.match, hit.target), Urgency.INFO)
+
+profiler    = keep("profiler",    Profiler)
+lag_monitor = keep("lag_monitor", LagMonitor)
+
+def profile(args: list[str]):
+    action = args[0] if args else "status"
+    if action == "start":
+        profiler.start()
+        notify("Profiling", Urgency.INFO)
+    elif action == "stop":
+        profiler.stop()
+        notify("Profiling stopped, 'prof dump' writes the results", Urgency.INFO)
+    elif action == "dump":
+        paths = profiler.dump()
+        notify("Wrote " + ", ".join(paths) if paths else "Nothing profiled yet", Urgency.INFO if paths else Urgency.WARN, timeout=5)
+    elif action == "status":
+        notify("Profiling" if profiler.running else "Not profiling", Urgency.INFO)
+    else:
+        notify("prof: expected start, stop or dump", Urgency.ERROR)
+
+def lag(args: list[str]):
+    action = args[0] if args else "report"
+    if action == "start":
+        lag_monitor.start()
+        notify("Measuring event loop lag", Urgency.INFO)
+    elif action == "stop":
+        lag_monitor.stop()
+        notify(lag_monitor.report(), Urgency.INFO, timeout=10)
+    elif action == "reset":
+        lag_monitor.reset()
+    elif action == "report":
+        notify(lag_monitor.report(), Urgency.INFO, timeout=10)
+    else:
+        notify("lag: expected start, stop or reset", Urgency.ERROR)
+
+def top(args: list[str]):
+    notify(accounting.report(), Urgency.INFO, timeout=10)
+
+def reload_config(args: list[str]):
+    if args and args[0] not in ("full",):
+        notify("reload: expected nothing or full", Urgency.ERROR)
+        return
+    reloader.reload(registry.qtile, full=bool(args))
+
+def frame_stats(args: list[str]):
+    stats = frames.stats()
+    notify("bars: {fps:.1f} frames/s, {draw_ms:.2f}ms/frame, {draws}/{marks} draws, {skipped} skipped".format(**stats), Urgency.INFO, timeout=5)
 
 command_map = {
     "add":       Callback(add_web_section,      "add sections to web layout"),
     "del":       Callback(remove_web_section,   "remove sections from web layout"),
-    "col":       Callback(collapse_web_section, "collapse section"),
-    "exp":       Callback(expand_web_section,   "expand section"),
+    "col":       Callback(collapse_web_section, "collapse sections, or the focused branch"),
+    "exp":       Callback(expand_web_section,   "expand sections, or the focused branch"),
     "hide":      Callback(hide_web_tabs,        "hides web tabs"),
     "show":      Callback(show_web_tabs,        "shows web tabs"),
     "bind":      Callback(bind_layout_to_screen,"binds current layout to current screen"),
     "unbind":    Callback(unbind_workspace,     "removes bindings on workspace"),
     "unbindall": Callback(unbind_all,           "removes bindings on all workspaces"),
     "bindlist":  Callback(bind_list,            "list all screen bindings in a notification"),
+    "rules":     Callback(explain_window_rules, "shows which group and float rules match the focused window"),
+    "top":       Callback(top,                  "CPU and memory used by the applications of every group"),
+    "frames":    Callback(frame_stats,          "shows how often the bars are drawn and how long it takes"),
+    "lock":      Callback(lambda args: session.lock_soon(), "locks the screen, pausing everything that polls"),
+    "reload":    Callback(reload_config,        "reload [full]: applies what changed in the config, or reloads all of it"),
+    "prof":      Callback(profile,              "prof start|stop|dump: cProfile and tracemalloc inside qtile"),
+    "lag":       Callback(lag,                  "lag [start|stop|reset]: event loop lag histogram and slow callbacks"),
 }
 
 def print_doc_string(args: list[str]):
@@ -652,52 +915,52 @@ def run_command(cmd_line: str):
     callback = command_map.get(cmd)
     if callback is not None:
         callback.callback(args)
-    else:
-        notify("Unknown command '" + cmd + "'", Urgency.ERROR)
-
-class CustomCommandCompleter:
-    def __init__(self, qtile):
-        self.thisfinal: Optional[str] = None
-        self.lookup: Optional[List[Tuple[str, str]]] = None
-        self.offset = -1
-
-    def actual(self) -> Optional[str]:
-        return self.thisfinal
-
-    def reset(self) -> None:
-        self.lookup = None
-        self.offset = -1
-
-    def complete(self, txt: str) -> str:
-        txt = txt.lower()
-        if not self.lookup:
-            self.lookup = []
-            for cmd in command_map.keys():
-                if cmd.lower().startswith(txt):
-                    self.lookup.append((cmd, cmd))
-
-            self.lookup.sort()
-            self.offset = -1
-            self.lookup.append((txt, txt))
-
-        self.offset += 1
-        if self.offset >= len(self.lookup):
-            self.offset = 0
-        ret = self.lookup[self.offset]
-        self.thisfinal = ret[1]
-        return ret[0]
+        return
 
-prompt.completers["custom_command_completer"] = CustomCommandCompleter
+    # Anything else the completer offers is a qtile command
+    qtile_command = registry.qtile.command(cmd)
+    if qtile_command is None:
+        notify("Unknown command '" + cmd + "'", Urgency.ERROR)
+        return
+    try:
+        qtile_command(*args)
+    except Exception as e:
+        notify("{}: {}".format(cmd, e), Urgency.ERROR)
+
+command_completions = Completions(default_argument_source="groups")
+command_completions.add_source("commands", lambda qtile: list(command_map) + qtile.commands())
+command_completions.add_source("custom",   lambda qtile: list(command_map))
+command_completions.add_source("groups",   lambda qtile: list(registry.groups))
+command_completions.add_source("sections", lambda qtile: find_web_layout().section_titles())
+command_completions.add_source("prof",     lambda qtile: ["start", "stop", "dump"])
+command_completions.add_source("lag",      lambda qtile: ["start", "stop", "reset"])
+command_completions.add_source("reload",   lambda qtile: ["full"])
+command_completions.add_arguments("help", "custom")
+command_completions.add_arguments("prof", "prof")
+command_completions.add_arguments("lag",  "lag")
+command_completions.add_arguments("reload", "reload")
+command_completions.add_arguments("add",  "sections")
+command_completions.add_arguments("del",  "sections")
+
+@hook.subscribe.addgroup
+def completions_group_added(group_name):
+    command_completions.invalidate("groups")
+
+@hook.subscribe.delgroup
+def completions_group_removed(group_name):
+    command_completions.invalidate("groups")
+
+prompt.completers["custom_command_completer"] = command_completions.prompt_completer()
+prompt.completers["launcher_completer"]       = launcher_completions.prompt_completer()
+prompt.completers["window_completer"]         = switcher.completions.prompt_completer()
 
 @lazy.function
 def run_custom_command(qtile: Qtile):
-    global QTILE_INSTANCE
-    QTILE_INSTANCE = qtile
     prompt.start_input(">", run_command, "custom_command_completer")
 
 keys.extend([
-    Key([mod,], "o",      lazy.function(expand_web_section),   desc="Expand a web branch"),
-    Key([mod,], "x",      lazy.function(collapse_web_section), desc="Collapse a web branch"),
+    Key([mod,], "o",      lazy.function(lambda qtile: expand_web_section([])),   desc="Expand a web branch"),
+    Key([mod,], "x",      lazy.function(lambda qtile: collapse_web_section([])), desc="Collapse a web branch"),
     Key([mod,   "shift"], "i",                                 run_custom_command, desc="Runs custom commands with prompted input")
 ])
 
@@ -711,14 +974,13 @@ mouse = [
     Click([mod], "Button2", lazy.window.bring_to_front())
 ]
 
-floating_layout = layout.Floating(float_rules=[
-    *layout.Floating.default_float_rules,
-    Match(wm_class='confirmreset'), # gitk
-    Match(wm_class='makebranch'),   # gitk
-    Match(wm_class='maketag'),      # gitk
-    Match(wm_class='ssh-askpass'),  # ssh-askpass
-    Match(title='branchdialog'),    # gitk
-    Match(title='pinentry'),        # GPG key password entry
-])
+floating_layout = CompiledFloating(float_rules=float_rules)
+
+# }}}
+
+# ================================== Reloading ============================= {{{
+
+# What the next reload compares with
+reloader.loaded(globals())
 
 # }}}
@@ -0,0 +1,62 @@
+#  ================================== Imports ============================== {{{
+
+# Plain data config.py builds on. Importing this module starts nothing and
+# subscribes to nothing, the benchmarks read the same definitions from here
+# without running config.py.
+
+from libqtile import layout
+from libqtile.config import Match
+
+from monitors import Profile, Output
+
+# }}}
+
+# ================================== Monitors ============================== {{{
+
+internal_monitor = "eDP-1"
+external_monitor = "HDMI-2"
+
+monitor_profiles = {
+    "left":   Profile({internal_monitor: Output(pos=(1920, 0)),    external_monitor: Output(pos=(0, 0))}),
+    "right":  Profile({internal_monitor: Output(pos=(0, 0)),       external_monitor: Output(pos=(1920, 0))}),
+    "above":  Profile({internal_monitor: Output(pos=(0, 1080), primary=True), external_monitor: Output(pos=(0, 0))}),
+    "mirror": Profile({internal_monitor: Output(pos=(0, 0)),       external_monitor: Output(pos=(0, 0))}),
+    "single": Profile({internal_monitor: Output()}, binds={}),
+    "other":  Profile({external_monitor: Output()}, binds={}),
+}
+
+# Profile picked when the set of connected outputs changes
+monitor_auto_profiles = [
+    (frozenset([internal_monitor, external_monitor]), "left"),
+    (frozenset([internal_monitor]),                   "single"),
+    (frozenset([external_monitor]),                   "other"),
+]
+
+# }}}
+
+# =================================== Rules ================================ {{{
+
+chat_matches = [
+    Match(wm_class=["TelegramDesktop"]),
+    Match(wm_class=["Signal"]),
+    Match(wm_class=["Microsoft Teams - Preview"]),
+    Match(wm_class=["teams.microsoft.com"]),
+    Match(wm_class=["thunderbird"]),
+]
+
+media_matches = [
+    Match(title=["Spotify"]), # TODO this should probably be done through a hook
+    Match(title=["waterbird"]),
+]
+
+float_rules = [
+    *layout.Floating.default_float_rules,
+    Match(wm_class='confirmreset'), # gitk
+    Match(wm_class='makebranch'),   # gitk
+    Match(wm_class='maketag'),      # gitk
+    Match(wm_class='ssh-askpass'),  # ssh-askpass
+    Match(title='branchdialog'),    # gitk
+    Match(title='pinentry'),        # GPG key password entry
+]
+
+# }}}
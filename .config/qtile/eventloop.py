@@ -0,0 +1,70 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import time
+from typing import Any, Callable
+
+import libqtile
+
+# }}}
+
+# ================================= Event Loop ============================= {{{
+
+# Thin wrappers around qtile's event loop helpers. When running inside qtile the
+# calls go through the Qtile object so the X connection is flushed after each
+# callback; outside of qtile (benchmarks, the python shell) they fall back to
+# the plain asyncio loop.
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    if libqtile.qtile is not None:
+        return libqtile.qtile._eventloop
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.get_event_loop()
+
+def call_soon(func: Callable, *args: Any) -> asyncio.Handle:
+    if libqtile.qtile is not None:
+        return libqtile.qtile.call_soon(func, *args)
+    return get_loop().call_soon(func, *args)
+
+def call_later(delay: float, func: Callable, *args: Any) -> asyncio.TimerHandle:
+    if libqtile.qtile is not None:
+        return libqtile.qtile.call_later(delay, func, *args)
+    return get_loop().call_later(delay, func, *args)
+
+# Timers that repeat every TICK seconds or more are moved onto whole multiples
+# of TICK of the wall clock, so the clock, the graphs and the rest of the bar
+# wake qtile up together instead of each at their own offset
+TICK = 1.0
+
+def aligned_delay(delay: float, grid: float = TICK) -> float:
+    """delay, moved to end on the multiple of grid nearest to it. Shorter
+    delays are returned unchanged."""
+    if delay < grid:
+        return delay
+    now = time.time()
+    return round((now + delay) / grid) * grid - now
+
+def call_aligned(delay: float, func: Callable, *args: Any) -> asyncio.TimerHandle:
+    return call_later(aligned_delay(delay), func, *args)
+
+def run_in_executor(func: Callable, *args: Any) -> asyncio.Future:
+    if libqtile.qtile is not None:
+        return libqtile.qtile.run_in_executor(func, *args)
+    return get_loop().run_in_executor(None, func, *args)
+
+def flush() -> None:
+    if libqtile.qtile is not None:
+        libqtile.qtile.core.flush()
+
+def add_reader(fd: int, func: Callable, *args: Any) -> None:
+    def reader():
+        func(*args)
+        flush()
+    get_loop().add_reader(fd, reader)
+
+def remove_reader(fd: int) -> None:
+    get_loop().remove_reader(fd)
+
+# }}}
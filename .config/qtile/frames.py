@@ -0,0 +1,248 @@
+#  ================================== Imports ============================== {{{
+
+import collections
+import itertools
+import time
+from typing import Dict, Iterable, Set
+
+import libqtile
+from libqtile import bar as _bar
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ================================ Scheduler =============================== {{{
+
+class FrameScheduler:
+    """Draws the bars in frames.
+
+    The draws widgets ask for are only recorded, the widgets (and bars) that
+    are dirty are drawn together in one callback at most fps times a second,
+    so the X connection is flushed once per frame instead of once per widget.
+    Widget timers are aligned to eventloop.TICK, which puts the clock, the
+    graphs, the battery and the update checks into the same frame. Nothing is
+    drawn while the screen is blanked by DPMS. While the scheduler is
+    suspended, nothing is drawn and the widget timers are parked, each runs
+    once when it is resumed.
+    """
+
+    def __init__(self, fps: float = 20, unmanaged: Iterable = (), dpms_interval: float = 2.0, window: float = 10.0):
+        self.fps           = fps
+        # Interactive widgets that should not wait for a frame, e.g. the prompt
+        self.unmanaged     = list(unmanaged)
+        # Seconds the DPMS state is trusted for
+        self.dpms_interval = dpms_interval
+        # Seconds the frame rate and draw time are averaged over
+        self.window        = window
+
+        self.frames                    = 0
+        self.skipped                   = 0
+        self.marks                     = 0
+        self.draws                     = 0
+        self._recent                   = collections.deque(maxlen=1024)
+        self._widgets: Dict[int, tuple] = {}
+        # Widget timers by widget: timer id -> (handle, method, args)
+        self._timers: Dict[int, Dict]  = {}
+        self._timer_ids                = itertools.count()
+        # (widget id, method) -> (widget, method, args) while suspended
+        self._parked: Dict[tuple, tuple] = {}
+        self._dirty_widgets: Dict      = {}
+        self._dirty_bars: Dict         = {}
+        self._suspended: Set[str]      = set()
+        self._handle                   = None
+        self._drawing                  = False
+        self._last_frame               = 0.0
+        self._blanked                  = False
+        self._dpms_checked             = 0.0
+        self.qtile                     = None
+
+    def attach(self, qtile=None) -> None:
+        self.qtile = qtile or libqtile.qtile
+        for screen in self.qtile.screens:
+            for gap in (screen.top, screen.bottom, screen.left, screen.right):
+                if isinstance(gap, _bar.Bar):
+                    self.manage(gap)
+
+    # ------------------------------ Managing ----------------------------- {{{{
+
+    def _is_unmanaged(self, widget) -> bool:
+        # Mirrors are drawn by the widget they reflect
+        widget = getattr(widget, "reflects", widget)
+        return any(widget is other for other in self.unmanaged)
+
+    def manage(self, bar) -> None:
+        if getattr(bar, "_frame_draw", None) is None:
+            bar._frame_draw = bar._actual_draw
+            bar.draw        = lambda: self._mark_bar(bar)
+        for widget in bar.widgets:
+            if id(widget) in self._widgets or self._is_unmanaged(widget):
+                continue
+            # The draw attribute of a mirrored widget already draws its mirrors
+            self._widgets[id(widget)] = (widget, widget.draw, widget.timeout_add, widget.finalize)
+            widget.draw        = lambda widget=widget: self._mark(widget)
+            widget.timeout_add = lambda seconds, method, method_args=(), widget=widget: self._timeout_add(widget, seconds, method, method_args)
+            widget.finalize    = lambda widget=widget: self._finalize(widget)
+
+    def _timeout_add(self, widget, seconds, method, method_args):
+        if self._suspended:
+            self._parked[(id(widget), method)] = (widget, method, method_args)
+            return None
+        timers = self._timers.setdefault(id(widget), {})
+        key    = next(self._timer_ids)
+
+        def fire(*args):
+            timers.pop(key, None)
+            method(*args)
+
+        handle      = self._widgets[id(widget)][2](eventloop.aligned_delay(seconds), fire, method_args)
+        timers[key] = (handle, method, method_args)
+        return handle
+
+    def _finalize(self, widget) -> None:
+        self._dirty_widgets.pop(id(widget), None)
+        self._timers.pop(id(widget), None)
+        for key in [key for key in self._parked if key[0] == id(widget)]:
+            del self._parked[key]
+        _, _, _, finalize = self._widgets.pop(id(widget))
+        finalize()
+
+    # }}}}
+
+    # ------------------------------ Marking ------------------------------ {{{{
+
+    def _mark(self, widget) -> None:
+        self.marks += 1
+        if self._drawing:
+            # Asked for while a frame is drawn, e.g. the mirrors of a widget
+            self._dirty_widgets.pop(id(widget), None)
+            self._draw_widget(widget)
+            return
+        self._dirty_widgets[id(widget)] = widget
+        self._schedule()
+
+    def _mark_bar(self, bar) -> None:
+        self._dirty_bars[id(bar)] = bar
+        if not self._drawing:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._handle is not None or self._suspended:
+            return
+        delay        = max(0.0, self._last_frame + 1.0 / self.fps - time.monotonic())
+        self._handle = eventloop.call_later(delay, self._frame)
+
+    # }}}}
+
+    # ------------------------------ Drawing ------------------------------ {{{{
+
+    def _draw_widget(self, widget) -> None:
+        self.draws += 1
+        try:
+            self._widgets[id(widget)][1]()
+        except Exception:
+            logger.exception("frames: drawing %s failed", widget.name)
+
+    def _frame(self) -> None:
+        self._handle = None
+        if self._suspended:
+            return
+        if self.blanked():
+            # Drawn once the screen is back, when the next timer asks for it
+            self.skipped += 1
+            return
+
+        start            = time.monotonic()
+        self._last_frame = start
+        self._drawing    = True
+        try:
+            # Drawing a bar draws all of its widgets
+            while self._dirty_bars:
+                _, bar = self._dirty_bars.popitem()
+                bar.queued_draws = 0
+                # Finalized by a reload since it was marked
+                if bar.window is None:
+                    continue
+                try:
+                    bar._frame_draw()
+                except Exception:
+                    logger.exception("frames: drawing a bar failed")
+            while self._dirty_widgets:
+                _, widget = self._dirty_widgets.popitem()
+                self._draw_widget(widget)
+        finally:
+            self._drawing = False
+        end = time.monotonic()
+        self.frames += 1
+        self._recent.append((end, end - start))
+
+    def blanked(self) -> bool:
+        """Whether DPMS turned the screens off, asked the X server at most
+        every dpms_interval seconds"""
+        now = time.monotonic()
+        if now - self._dpms_checked < self.dpms_interval:
+            return self._blanked
+        self._dpms_checked = now
+        try:
+            import xcffib.dpms
+            info = self.qtile.core.conn.conn(xcffib.dpms.key).Info().reply()
+            # Power level 0 is DPMSModeOn
+            self._blanked = bool(info.state) and info.power_level != 0
+        except Exception:
+            # Not running on X, or no DPMS extension
+            self._blanked = False
+        return self._blanked
+
+    # }}}}
+
+    # ----------------------------- Suspending ---------------------------- {{{{
+
+    def suspend(self, reason: str) -> None:
+        """Stops drawing and parks the widget timers until resume is called
+        with the same reason"""
+        self._suspended.add(reason)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for widget_id, timers in self._timers.items():
+            widget = self._widgets[widget_id][0]
+            for handle, method, method_args in timers.values():
+                if not handle.cancelled():
+                    handle.cancel()
+                    self._parked[(widget_id, method)] = (widget, method, method_args)
+            timers.clear()
+
+    def resume(self, reason: str) -> None:
+        self._suspended.discard(reason)
+        if self._suspended:
+            return
+        self._dpms_checked = 0.0
+        # One catch-up run of every parked timer, each schedules its next run
+        # and their draws end up in the same frame
+        parked, self._parked = self._parked, {}
+        for widget, method, method_args in parked.values():
+            self._widgets[id(widget)][2](0, method, method_args)
+        if self._dirty_bars or self._dirty_widgets:
+            self._schedule()
+
+    # }}}}
+
+    # ------------------------------ Counters ----------------------------- {{{{
+
+    def stats(self) -> Dict[str, float]:
+        now    = time.monotonic()
+        recent = [duration for end, duration in self._recent if now - end <= self.window]
+        return {
+            "fps":      len(recent) / self.window,
+            "draw_ms":  1000 * sum(recent) / len(recent) if recent else 0.0,
+            "frames":   self.frames,
+            "skipped":  self.skipped,
+            # Draws asked for and draws done, the difference was coalesced
+            "marks":    self.marks,
+            "draws":    self.draws,
+        }
+
+    # }}}}
+
+# }}}
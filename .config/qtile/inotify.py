@@ -0,0 +1,101 @@
+#  ================================== Imports ============================== {{{
+
+import ctypes
+import os
+import struct
+from typing import Callable, Dict, Optional
+
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ================================== Inotify =============================== {{{
+
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_NONBLOCK    = os.O_NONBLOCK
+IN_CLOEXEC     = os.O_CLOEXEC
+
+# Anything that adds, removes or changes a file in a directory
+IN_DIRECTORY_CHANGES = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+EVENT = struct.Struct("iIII")
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+# (directory, event mask, file name or "" for the directory itself)
+WatchCallback = Callable[[str, int, str], None]
+
+class Inotify:
+    # One inotify descriptor on qtile's event loop, watching directories
+    # (there is no python binding in the standard library)
+
+    def __init__(self, callback: WatchCallback):
+        self.callback = callback
+
+        self.fd: Optional[int]       = None
+        self.watches: Dict[int, str] = {}
+
+    def start(self) -> bool:
+        if self.fd is not None:
+            return True
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning("inotify unavailable: %s", os.strerror(ctypes.get_errno()))
+            return False
+        self.fd = fd
+        eventloop.add_reader(self.fd, self._read)
+        return True
+
+    def watch(self, path: str, mask: int = IN_DIRECTORY_CHANGES) -> bool:
+        if self.fd is None and not self.start():
+            return False
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), mask | IN_ONLYDIR)
+        if wd < 0:
+            # Directories that don't exist are common in $PATH and XDG_DATA_DIRS
+            return False
+        self.watches[wd] = path
+        return True
+
+    def _read(self) -> None:
+        while self.fd is not None:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name    = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+
+                path = self.watches.get(wd)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                if path is None:
+                    continue
+                try:
+                    self.callback(path, mask, name)
+                except Exception:
+                    logger.exception("inotify callback failed for %s/%s", path, name)
+
+    def close(self) -> None:
+        if self.fd is not None:
+            eventloop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+        self.watches.clear()
+
+# }}}
@@ -0,0 +1,382 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import libqtile
+from libqtile.backend.x11.xcbq import ModMasks
+from libqtile.backend.x11.xkeysyms import keysyms
+from libqtile.log_utils import logger
+from libqtile.utils import send_notification
+from libqtile.widget import base
+
+import eventloop
+
+try:
+    from dbus_next import Message, MessageType
+    from dbus_next.aio import MessageBus
+except ImportError:
+    MessageBus = None
+
+# }}}
+
+# ================================== Xmodmap =============================== {{{
+
+class XmodmapError(Exception):
+    pass
+
+def parse_keysym(name: str) -> int:
+    if name == "NoSymbol":
+        return 0
+    if name.lower().startswith("0x"):
+        return int(name, 16)
+    if name in keysyms:
+        return keysyms[name]
+    raise XmodmapError("Unknown keysym '{}'".format(name))
+
+class Xmodmap:
+    # In-process replacement for `xmodmap ~/.Xmodmap`. The file is only parsed
+    # again when its mtime changes; applying the compiled state compares it to
+    # the server's current mapping first and only sends the requests when
+    # something (usually fcitx5 resetting the XKB map) undid it.
+    #
+    # Supported expressions: keycode, keysym, clear, add and remove.
+
+    def __init__(self, path: str = "~/.Xmodmap"):
+        self.path = os.path.expanduser(path)
+
+        self._mtime: Optional[float]                      = None
+        self._keycodes: Dict[int, List[int]]              = {}
+        self._modifiers: List[Tuple[str, str, List[int]]] = []
+
+    def compile(self, conn) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            self._mtime     = None
+            self._keycodes  = {}
+            self._modifiers = []
+            return False
+
+        if mtime == self._mtime:
+            return True
+
+        keycodes: Dict[int, List[int]]              = {}
+        modifiers: List[Tuple[str, str, List[int]]] = []
+
+        def codes_for(keysym: int) -> List[int]:
+            codes = [code for code, syms in keycodes.items() if keysym in syms]
+            return codes or [code for code in conn.keysym_to_keycode(keysym) if code]
+
+        with open(self.path) as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("!"):
+                    continue
+                try:
+                    lhs, _, rhs = line.partition("=")
+                    words = lhs.split()
+                    syms  = [parse_keysym(s) for s in rhs.split()]
+                    op    = words[0].lower()
+                    if op == "keycode":
+                        keycodes[int(words[1], 0)] = syms
+                    elif op == "keysym":
+                        for code in codes_for(parse_keysym(words[1])):
+                            keycodes[code] = syms
+                    elif op in ("clear", "add", "remove"):
+                        modifier = words[1].lower()
+                        if modifier not in ModMasks:
+                            raise XmodmapError("Unknown modifier '{}'".format(words[1]))
+                        codes = [code for sym in syms for code in codes_for(sym)]
+                        modifiers.append((op, modifier, codes))
+                    else:
+                        raise XmodmapError("Unsupported expression '{}'".format(words[0]))
+                except (IndexError, ValueError, XmodmapError) as e:
+                    logger.warning("%s:%d: %s", self.path, lineno, e)
+
+        self._mtime     = mtime
+        self._keycodes  = keycodes
+        self._modifiers = modifiers
+        return True
+
+    def apply(self, conn) -> bool:
+        """Applies the file to the X server, returns True if anything changed"""
+        if not self.compile(conn):
+            return False
+        changed = self._apply_keycodes(conn)
+        changed = self._apply_modifiers(conn) or changed
+        if changed:
+            conn.refresh_keymap()
+            conn.refresh_modmap()
+        return changed
+
+    def _apply_keycodes(self, conn) -> bool:
+        if not self._keycodes:
+            return False
+
+        first = min(self._keycodes)
+        count = max(self._keycodes) - first + 1
+        reply = conn.conn.core.GetKeyboardMapping(first, count).reply()
+        width = reply.keysyms_per_keycode
+
+        changed = False
+        for code, syms in self._keycodes.items():
+            offset  = (code - first) * width
+            current = list(reply.keysyms[offset:offset + width])
+            wanted  = (syms + [0] * width)[:width]
+            if current != wanted:
+                conn.conn.core.ChangeKeyboardMapping(1, code, width, wanted)
+                changed = True
+        return changed
+
+    def _apply_modifiers(self, conn) -> bool:
+        if not self._modifiers:
+            return False
+
+        reply   = conn.conn.core.GetModifierMapping().reply()
+        width   = reply.keycodes_per_modifier
+        current = {
+            name: [code for code in reply.keycodes[i * width:(i + 1) * width] if code]
+            for i, name in enumerate(ModMasks)
+        }
+        wanted = {name: list(codes) for name, codes in current.items()}
+
+        for op, modifier, codes in self._modifiers:
+            if op == "clear":
+                wanted[modifier] = []
+            elif op == "add":
+                wanted[modifier].extend(code for code in codes if code not in wanted[modifier])
+            elif op == "remove":
+                wanted[modifier] = [code for code in wanted[modifier] if code not in codes]
+
+        if wanted == current:
+            return False
+
+        width    = max(len(codes) for codes in wanted.values())
+        keycodes = []
+        for name in ModMasks:
+            keycodes.extend((wanted[name] + [0] * width)[:width])
+        conn.conn.core.SetModifierMapping(width, keycodes).reply()
+        return True
+
+# }}}
+
+# ================================== Layouts =============================== {{{
+
+LayoutListener = Callable[[str], None]
+
+FCITX_SERVICE   = "org.fcitx.Fcitx5"
+FCITX_PATH      = "/controller"
+FCITX_INTERFACE = "org.fcitx.Fcitx.Controller1"
+# Emitted when the current group or the list of groups changes
+FCITX_CHANGED   = "InputMethodGroupsChanged"
+
+# fcitx5 resets the XKB map after a group change, ~/.Xmodmap is applied
+# again once it stopped doing so
+XMODMAP_SETTLE = 0.3
+
+class KeyboardLayouts:
+    # Switches fcitx5 input method groups over one long-lived D-Bus connection
+    # instead of spawning fcitx5-remote and xmodmap for every switch.
+    #
+    # Switches made elsewhere (fcitx5's own hotkey, its tray menu) arrive as
+    # the controller's change signal. bus_address makes it possible to point
+    # the service at a private session bus, e.g. one started with
+    # `dbus-daemon --session --print-address`. Without dbus_next every switch
+    # runs the keyboard_layout script instead.
+
+    def __init__(self, layouts: List[str], xmodmap: str = "~/.Xmodmap", bus_address: Optional[str] = None,
+                 script: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keyboard_layout")):
+        self.layouts     = layouts
+        self.xmodmap     = Xmodmap(xmodmap)
+        self.bus_address = bus_address
+        self.script      = script
+        self.current: Optional[str] = None
+
+        if MessageBus is None:
+            logger.warning("dbus_next is not installed, falling back to %s", self.script)
+
+        self._bus: Optional["MessageBus"]          = None
+        self._connecting: Optional[asyncio.Future] = None
+        self._listeners: List[LayoutListener]      = []
+        self._xmodmap_handle                       = None
+
+    async def _connect(self) -> "MessageBus":
+        if self._bus is not None and self._bus.connected:
+            return self._bus
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._subscribe(MessageBus(bus_address=self.bus_address)))
+        try:
+            self._bus = await self._connecting
+        finally:
+            self._connecting = None
+        return self._bus
+
+    async def _subscribe(self, bus: "MessageBus") -> "MessageBus":
+        await bus.connect()
+        bus.add_message_handler(self._message)
+        reply = await bus.call(Message(
+            destination="org.freedesktop.DBus",
+            path="/org/freedesktop/DBus",
+            interface="org.freedesktop.DBus",
+            member="AddMatch",
+            signature="s",
+            body=["type='signal',path='{}',interface='{}',member='{}'".format(FCITX_PATH, FCITX_INTERFACE, FCITX_CHANGED)],
+        ))
+        if reply.message_type == MessageType.ERROR:
+            logger.warning("Unable to watch fcitx5 group changes: %s", reply.body)
+        return bus
+
+    def _message(self, message: "Message") -> None:
+        if (message.message_type == MessageType.SIGNAL and message.interface == FCITX_INTERFACE
+                and message.member == FCITX_CHANGED):
+            # The signal doesn't say which group is current now
+            asyncio.ensure_future(self.refresh(), loop=eventloop.get_loop())
+            self._apply_xmodmap_later(XMODMAP_SETTLE)
+
+    async def _call(self, member: str, signature: str = "", body: Optional[list] = None) -> "Message":
+        bus   = await self._connect()
+        reply = await bus.call(Message(
+            destination=FCITX_SERVICE,
+            path=FCITX_PATH,
+            interface=FCITX_INTERFACE,
+            member=member,
+            signature=signature,
+            body=body or [],
+        ))
+        if reply.message_type == MessageType.ERROR:
+            raise RuntimeError("{}: {}".format(reply.error_name, reply.body))
+        return reply
+
+    async def refresh(self) -> Optional[str]:
+        if MessageBus is None:
+            # The script can't tell, only switches made from here are known
+            return self.current
+        try:
+            reply = await self._call("CurrentInputMethodGroup")
+        except Exception:
+            logger.exception("Unable to query the current fcitx5 group")
+            return self.current
+        self._set_current(reply.body[0])
+        return self.current
+
+    async def switch(self, layout: str) -> bool:
+        if layout not in self.layouts:
+            send_notification("qtile", "Keyboard layout '{}' is not implemented".format(layout), urgent=True)
+            return False
+
+        if MessageBus is None:
+            return await self._switch_script(layout)
+
+        try:
+            await self._call("SwitchInputMethodGroup", "s", [layout])
+        except Exception:
+            logger.exception("Unable to switch fcitx5 group to '%s'", layout)
+            return False
+
+        # Moved on by the change signal when fcitx5 sends one
+        self._apply_xmodmap_later(XMODMAP_SETTLE)
+        self._set_current(layout)
+        return True
+
+    async def _switch_script(self, layout: str) -> bool:
+        # The script applies ~/.Xmodmap itself
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.script, layout,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            returncode = await process.wait()
+        except OSError:
+            logger.exception("Unable to run %s", self.script)
+            return False
+        if returncode != 0:
+            logger.warning("%s %s exited with %d", self.script, layout, returncode)
+            return False
+        self._set_current(layout)
+        return True
+
+    def switch_soon(self, layout: str) -> None:
+        asyncio.ensure_future(self.switch(layout), loop=eventloop.get_loop())
+
+    def device_added(self, event=None) -> None:
+        """A keyboard that is plugged in gets the default keymap, apply
+        ~/.Xmodmap again once the X server has picked the device up"""
+        # One event for the device and more for its event and mouse nodes
+        if event is not None and (event.action != "add" or not os.path.basename(event.devpath).startswith("input")):
+            return
+        self._apply_xmodmap_later(1.0)
+
+    def _apply_xmodmap_later(self, delay: float) -> None:
+        if self._xmodmap_handle is not None:
+            self._xmodmap_handle.cancel()
+        self._xmodmap_handle = eventloop.call_later(delay, self._apply_xmodmap)
+
+    def _apply_xmodmap(self) -> None:
+        self._xmodmap_handle = None
+        if libqtile.qtile is None:
+            return
+        try:
+            self.xmodmap.apply(libqtile.qtile.core.conn)
+        except Exception:
+            logger.exception("Unable to apply %s", self.xmodmap.path)
+
+    def _set_current(self, layout: str) -> None:
+        if layout == self.current:
+            return
+        self.current = layout
+        for listener in self._listeners:
+            listener(layout)
+
+    def subscribe(self, listener: LayoutListener) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: LayoutListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def close(self) -> None:
+        if self._xmodmap_handle is not None:
+            self._xmodmap_handle.cancel()
+            self._xmodmap_handle = None
+        if self._bus is not None:
+            self._bus.remove_message_handler(self._message)
+            self._bus.disconnect()
+            self._bus = None
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class KeyboardLayout(base._TextBox):
+    """Shows the current fcitx5 group, updated when the layout service switches"""
+
+    defaults = [
+        ("format", "{layout}", "Format of the text"),
+        ("names",  {},         "Display names of groups, e.g. {'us': 'EN'}"),
+    ]
+
+    def __init__(self, service: KeyboardLayouts, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(KeyboardLayout.defaults)
+        self.service = service
+
+    def timer_setup(self):
+        self.service.subscribe(self._changed)
+
+    async def _config_async(self):
+        await self.service.refresh()
+        self._changed(self.service.current)
+
+    def _changed(self, layout: Optional[str]) -> None:
+        if layout is None or not self.configured:
+            return
+        self.update(self.format.format(layout=self.names.get(layout, layout)))
+
+    def finalize(self):
+        self.service.unsubscribe(self._changed)
+        base._TextBox.finalize(self)
+
+# }}}
@@ -0,0 +1,311 @@
+#  ================================== Imports ============================== {{{
+
+import json
+import os
+import shlex
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+
+import eventloop
+import inotify
+
+# }}}
+
+# ================================== Entries =============================== {{{
+
+class Entry(NamedTuple):
+    # What the launcher shows: the Name of a desktop entry or the file name of
+    # an executable
+    label: str
+    argv: List[str]
+    terminal: bool = False
+
+# Field codes of the Exec key that stand for files, URLs and the like, the
+# launcher starts applications without any
+FIELD_CODES = {"%f", "%F", "%u", "%U", "%d", "%D", "%n", "%N", "%v", "%m", "%k", "%i", "%c"}
+
+def parse_desktop(path: str) -> Optional[Entry]:
+    """The application a .desktop file describes, None for hidden entries and
+    anything that is not an application"""
+    values: Dict[str, str] = {}
+    group = None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    if group == "Desktop Entry":
+                        break
+                    group = line[1:-1]
+                elif group == "Desktop Entry" and "=" in line:
+                    key, _, value = line.partition("=")
+                    values.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+
+    if values.get("Type") != "Application" or "Exec" not in values or "Name" not in values:
+        return None
+    if values.get("NoDisplay") == "true" or values.get("Hidden") == "true":
+        return None
+    try:
+        argv = [arg.replace("%%", "%") for arg in shlex.split(values["Exec"]) if arg not in FIELD_CODES]
+    except ValueError:
+        return None
+    if not argv:
+        return None
+    return Entry(values["Name"], argv, values.get("Terminal") == "true")
+
+def is_executable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+# }}}
+
+# =================================== Index ================================ {{{
+
+def application_dirs() -> List[str]:
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    return [os.path.join(d, "applications") for d in [data_home] + data_dirs.split(":") if d]
+
+def path_dirs() -> List[str]:
+    return [d for d in os.environ.get("PATH", "").split(":") if d]
+
+class DirectoryIndex:
+    # The entries of one directory by file name. A desktop file that is
+    # hidden is kept as None, it still hides files of the same name in later
+    # directories.
+
+    def __init__(self, path: str, kind: str, mtime: float = -1.0, entries: Optional[Dict[str, Optional[Entry]]] = None):
+        self.path    = path
+        # "applications" or "executables"
+        self.kind    = kind
+        self.mtime   = mtime
+        self.entries = entries if entries is not None else {}
+
+    def read(self, name: str) -> Optional[Entry]:
+        path = os.path.join(self.path, name)
+        if self.kind == "applications":
+            return parse_desktop(path) if name.endswith(".desktop") else None
+        return Entry(name, [path]) if is_executable(path) else None
+
+    def update(self, name: str) -> None:
+        if self.kind == "applications" and not name.endswith(".desktop"):
+            return
+        path = os.path.join(self.path, name)
+        if os.path.exists(path):
+            self.entries[name] = self.read(name)
+        else:
+            self.entries.pop(name, None)
+
+    def scan(self) -> None:
+        try:
+            self.mtime = os.stat(self.path).st_mtime
+            names      = os.listdir(self.path)
+        except OSError:
+            self.mtime = -1.0
+            self.entries.clear()
+            return
+        self.entries = {name: self.read(name) for name in names}
+        if self.kind == "executables":
+            # Only executables are worth keeping
+            self.entries = {name: entry for name, entry in self.entries.items() if entry is not None}
+
+    def to_json(self) -> dict:
+        return {
+            "kind":    self.kind,
+            "mtime":   self.mtime,
+            "entries": {name: None if entry is None else list(entry) for name, entry in self.entries.items()},
+        }
+
+    @classmethod
+    def from_json(cls, path: str, data: dict) -> "DirectoryIndex":
+        entries = {name: None if entry is None else Entry(*entry) for name, entry in data["entries"].items()}
+        return cls(path, data["kind"], data["mtime"], entries)
+
+# }}}
+
+# ================================= Launcher =============================== {{{
+
+CACHE_VERSION = 1
+
+class Launcher:
+    # Desktop applications and $PATH executables by label, for the launcher
+    # prompt. The index is loaded from a cache file, directories whose mtime
+    # changed since are read again, and inotify keeps it up to date
+    # afterwards, so opening the launcher never touches the disk. Launches are
+    # counted to rank what is used often and recently first.
+
+    def __init__(
+        self,
+        spawn: Callable[[List[str]], object],
+        # Prefix for entries with Terminal=true
+        terminal: Optional[List[str]] = None,
+        cache_path: Optional[str] = None,
+        half_life: float = 7 * 24 * 60 * 60,
+    ):
+        self.spawn      = spawn
+        self.terminal   = terminal or ["xterm", "-e"]
+        self.cache_path = cache_path or os.path.join(get_cache_dir(), "launcher.json")
+        self.half_life  = half_life
+
+        self.dirs: List[DirectoryIndex]            = []
+        self.entries: Dict[str, Entry]             = {}
+        # label -> (launch count, last launch)
+        self.history: Dict[str, List[float]]       = {}
+        self._listeners: List[Callable[[], None]]  = []
+        self._save_handle                          = None
+        self._inotify                              = inotify.Inotify(self._changed)
+        self._started                              = False
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+
+        cached: Dict[str, dict] = {}
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                cached       = data["dirs"]
+                self.history = data["history"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        self.dirs = []
+        stale     = False
+        seen      = set()
+        for kind, paths in (("applications", application_dirs()), ("executables", path_dirs())):
+            for path in paths:
+                if path in seen:
+                    continue
+                seen.add(path)
+                # Watched before it is read, so no change can fall in between
+                self._inotify.watch(path)
+                try:
+                    index = DirectoryIndex.from_json(path, cached[path])
+                    if index.kind != kind or index.mtime != os.stat(path).st_mtime:
+                        raise ValueError
+                except (KeyError, ValueError, TypeError, OSError):
+                    index = DirectoryIndex(path, kind)
+                    index.scan()
+                    stale = True
+                self.dirs.append(index)
+
+        self._merge()
+        if stale:
+            self._save_soon()
+
+    def _merge(self) -> None:
+        # The first directory wins: files in ~/.local/share/applications hide
+        # the system's, desktop entries hide executables of the same label
+        entries: Dict[str, Entry] = {}
+        hidden = set()
+        for index in self.dirs:
+            for name, entry in index.entries.items():
+                if index.kind == "applications":
+                    if name in hidden:
+                        continue
+                    hidden.add(name)
+                if entry is not None:
+                    entries.setdefault(entry.label, entry)
+        self.entries = entries
+        for listener in list(self._listeners):
+            listener()
+
+    def _changed(self, path: str, mask: int, name: str) -> None:
+        for index in self.dirs:
+            if index.path != path:
+                continue
+            if not name or mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+                index.scan()
+            else:
+                index.update(name)
+                try:
+                    index.mtime = os.stat(path).st_mtime
+                except OSError:
+                    index.mtime = -1.0
+        self._merge()
+        self._save_soon()
+
+    def subscribe(self, listener: Callable[[], None]) -> None:
+        """Called whenever the set of labels changed"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    # ------------------------------ Ranking ------------------------------ {{{{
+
+    def labels(self, qtile=None) -> List[str]:
+        return list(self.entries)
+
+    def scores(self) -> Dict[str, float]:
+        # Launch count, halved for every half_life since the last launch
+        now = time.time()
+        return {
+            label: count * 0.5 ** ((now - last) / self.half_life)
+            for label, (count, last) in self.history.items()
+            if label in self.entries
+        }
+
+    # }}}}
+
+    # ------------------------------ Launching ---------------------------- {{{{
+
+    def launch(self, text: str) -> None:
+        """Starts the entry called `text`, anything else is run as a command line"""
+        text  = text.strip()
+        entry = self.entries.get(text)
+        if entry is None:
+            # The prompt keeps its own history of command lines
+            try:
+                argv = shlex.split(text)
+            except ValueError as e:
+                logger.warning("launcher: %s: %s", text, e)
+                return
+            if argv:
+                self.spawn(argv)
+            return
+        self.spawn(self.terminal + entry.argv if entry.terminal else entry.argv)
+
+        count, _ = self.history.get(entry.label, (0, 0))
+        self.history[entry.label] = [count + 1, time.time()]
+        self._save_soon()
+
+    # }}}}
+
+    # ------------------------------- Cache ------------------------------- {{{{
+
+    def _save_soon(self) -> None:
+        # Package upgrades touch many files at once, write once they are done
+        if self._save_handle is None:
+            self._save_handle = eventloop.call_later(5, self.save)
+
+    def save(self) -> None:
+        self._save_handle = None
+        data = {
+            "version": CACHE_VERSION,
+            "dirs":    {index.path: index.to_json() for index in self.dirs},
+            "history": self.history,
+        }
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            logger.exception("Unable to write %s", self.cache_path)
+
+    def close(self) -> None:
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self.save()
+        self._inotify.close()
+        self._listeners.clear()
+        self._started = False
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,296 @@
+#  ================================== Imports ============================== {{{
+
+import array
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from libqtile.log_utils import logger
+from libqtile.widget import base
+from libqtile.widget.graph import _Graph
+
+import eventloop
+
+# }}}
+
+# ================================ Ring Buffers ============================ {{{
+
+class RingBuffer:
+    # Fixed size history backed by a flat array of doubles. Index 0 is the
+    # newest sample, which is the order qtile's graphs draw `values` in.
+
+    def __init__(self, size: int, typecode: str = "d"):
+        self.size = size
+        self.data = array.array(typecode, bytes(array.array(typecode).itemsize * size))
+        self.head = 0
+
+    def push(self, value: float, count: int = 1) -> None:
+        for _ in range(min(count, self.size)):
+            self.head = (self.head - 1) % self.size
+            self.data[self.head] = value
+
+    def fill(self, value: float) -> None:
+        for i in range(self.size):
+            self.data[i] = value
+
+    def max(self) -> float:
+        return max(self.data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> float:
+        return self.data[(self.head + index) % self.size]
+
+    def __iter__(self) -> Iterator[float]:
+        # Newest to oldest
+        yield from self.data[self.head:]
+        yield from self.data[:self.head]
+
+    def __reversed__(self) -> Iterator[float]:
+        # Oldest to newest
+        yield from reversed(self.data[:self.head])
+        yield from reversed(self.data[self.head:])
+
+# }}}
+
+# ================================== Sampler =============================== {{{
+
+MetricsListener = Callable[[], None]
+
+class Sampler:
+    # Reads /proc once per tick for every graph on every bar. The proc files
+    # stay open and are read with pread, so a tick costs three syscalls and no
+    # open/close, and the history lives in one ring buffer per metric no matter
+    # how many bars draw it.
+
+    def __init__(self, frequency: float = 1.0, samples: int = 100, interface: str = "auto", proc: str = "/proc"):
+        self.frequency = frequency
+        self.samples   = samples
+        self.interface = interface
+        self.proc      = proc
+
+        self.series: Dict[str, RingBuffer] = {
+            "cpu":      RingBuffer(samples),
+            "memory":   RingBuffer(samples),
+            "net_down": RingBuffer(samples),
+            "net_up":   RingBuffer(samples),
+        }
+        # Upper bound of each series, None when the graph scales to its maximum
+        self.bounds: Dict[str, Optional[float]] = {"cpu": 100.0, "memory": 0.0, "net_down": None, "net_up": None}
+
+        self._fds: Dict[str, int]              = {}
+        self._sizes: Dict[str, int]            = {}
+        self._cpu: Optional[tuple]             = None
+        self._net: Optional[tuple]             = None
+        self._last_tick                        = 0.0
+        self._handle                           = None
+        self._suspended                        = False
+        self._listeners: List[MetricsListener] = []
+
+        self._open()
+
+    # ------------------------------- Files ------------------------------- {{{{
+
+    def _open(self) -> None:
+        for name, path in (("stat", "stat"), ("meminfo", "meminfo"), ("net", "net/dev")):
+            try:
+                self._fds[name] = os.open(os.path.join(self.proc, path), os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                logger.exception("Unable to open %s", path)
+
+        if self.interface == "auto":
+            self.interface = self._main_interface()
+
+        # Prime the counters so the first tick has something to diff against
+        self._cpu = self._read_cpu()
+        self._net = self._read_net()
+        memory    = self._read_memory()
+        if memory is not None:
+            self.bounds["memory"] = memory[0]
+            self.series["memory"].fill(memory[1])
+
+    def _read(self, name: str) -> Optional[bytes]:
+        fd = self._fds.get(name)
+        if fd is None:
+            return None
+        # Proc files are regenerated on every read from offset 0, and a read
+        # that comes back short has reached the end. The buffer is twice what
+        # the file held last time, so a tick reads each file once.
+        size   = self._sizes.get(name, 65536)
+        chunks = [os.pread(fd, size, 0)]
+        offset = len(chunks[0])
+        while len(chunks[-1]) == size:
+            chunks.append(os.pread(fd, size, offset))
+            offset += len(chunks[-1])
+        self._sizes[name] = max(4096, 2 * offset)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        self.stop()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+    # }}}}
+
+    # ------------------------------ Parsing ------------------------------ {{{{
+
+    def _read_cpu(self) -> Optional[tuple]:
+        data = self._read("stat")
+        if data is None:
+            return None
+        # cpu  user nice system idle ...
+        fields = data[:data.index(b"\n")].split()
+        user, nice, system, idle = (int(v) for v in fields[1:5])
+        return user + nice + system, idle
+
+    def _read_memory(self) -> Optional[tuple]:
+        data = self._read("meminfo")
+        if data is None:
+            return None
+        values = {}
+        for line in data.splitlines():
+            key, _, rest = line.partition(b":")
+            if key in (b"MemTotal", b"MemFree", b"Buffers", b"Cached"):
+                values[key] = int(rest.split()[0]) / 1024
+                if len(values) == 4:
+                    break
+        # MiB, the same as qtile's MemoryGraph
+        used = values[b"MemTotal"] - values[b"MemFree"] - values[b"Buffers"] - values[b"Cached"]
+        return values[b"MemTotal"], used
+
+    def _interfaces(self) -> Dict[str, tuple]:
+        data = self._read("net")
+        if data is None:
+            return {}
+        interfaces = {}
+        # The first two lines are headers
+        for line in data.splitlines()[2:]:
+            name, _, rest = line.partition(b":")
+            fields = rest.split()
+            interfaces[name.strip().decode()] = (int(fields[0]), int(fields[8]))
+        return interfaces
+
+    def _main_interface(self) -> str:
+        # The interface that received the most traffic, the same guess as
+        # qtile's NetGraph but never the loopback
+        interfaces = {name: v for name, v in self._interfaces().items() if name != "lo"}
+        if not interfaces:
+            logger.warning("No network interface found, falling back to 'eth0'")
+            return "eth0"
+        return max(interfaces, key=lambda name: interfaces[name][0])
+
+    def _read_net(self) -> Optional[tuple]:
+        return self._interfaces().get(self.interface)
+
+    # }}}}
+
+    # ------------------------------ Sampling ----------------------------- {{{{
+
+    def sample(self, count: int = 1) -> None:
+        cpu = self._read_cpu()
+        if cpu is not None and self._cpu is not None:
+            busy  = cpu[0] - self._cpu[0]
+            total = busy + cpu[1] - self._cpu[1]
+            # A zero total tells nothing about the load, repeat the last value
+            self.series["cpu"].push(busy * 100.0 / total if total else self.series["cpu"][0], count)
+        self._cpu = cpu
+
+        memory = self._read_memory()
+        if memory is not None:
+            self.bounds["memory"] = memory[0]
+            self.series["memory"].push(memory[1], count)
+
+        net = self._read_net()
+        if net is not None and self._net is not None:
+            self.series["net_down"].push(net[0] - self._net[0], count)
+            self.series["net_up"].push(net[1] - self._net[1], count)
+        self._net = net
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        # When the loop was blocked for several ticks, fill the gap with the
+        # current value instead of squeezing it into one sample
+        count = max(1, int((now - self._last_tick) / self.frequency))
+        self._last_tick = now
+        self._handle    = eventloop.call_aligned(self.frequency, self._tick)
+
+        self.sample(count)
+        for listener in list(self._listeners):
+            listener()
+
+    def start(self) -> None:
+        if self._handle is None and not self._suspended:
+            self._last_tick = time.monotonic()
+            self._handle    = eventloop.call_aligned(self.frequency, self._tick)
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def suspend(self) -> None:
+        self._suspended = True
+        self.stop()
+
+    def resume(self) -> None:
+        """Samples right away, the one sample covers the whole suspension"""
+        if not self._suspended:
+            return
+        self._suspended = False
+        if self._listeners:
+            self._last_tick = time.monotonic() - self.frequency
+            self._tick()
+
+    def subscribe(self, listener: MetricsListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        self.start()
+
+    def unsubscribe(self, listener: MetricsListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+        if not self._listeners:
+            self.stop()
+
+    # }}}}
+
+# }}}
+
+# =================================== Widgets ============================== {{{
+
+class MetricGraph(_Graph):
+    """Draws one series of a shared Sampler, e.g. MetricGraph(sampler, "cpu")"""
+
+    orientations = base.ORIENTATION_HORIZONTAL
+
+    def __init__(self, sampler: Sampler, metric: str, **config):
+        config["samples"]   = sampler.samples
+        config["frequency"] = sampler.frequency
+        _Graph.__init__(self, **config)
+        self.sampler = sampler
+        self.metric  = metric
+        # Replaces the list _Graph keeps per widget
+        self.values  = sampler.series[metric]
+
+    def timer_setup(self):
+        self.sampler.subscribe(self._sampled)
+
+    def _sampled(self) -> None:
+        if self.configured:
+            self.draw()
+
+    def draw(self):
+        bound = self.sampler.bounds[self.metric]
+        self.maxvalue = bound if bound is not None else self.values.max()
+        _Graph.draw(self)
+
+    def update_graph(self):
+        pass
+
+    def finalize(self):
+        self.sampler.unsubscribe(self._sampled)
+        _Graph.finalize(self)
+
+# }}}
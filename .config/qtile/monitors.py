@@ -0,0 +1,291 @@
+#  ================================== Imports ============================== {{{
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import xcffib
+import xcffib.randr
+import libqtile
+from libqtile import hook
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ================================== Profiles ============================== {{{
+
+class Output(NamedTuple):
+    mode: str            = "1920x1080"
+    pos: Tuple[int, int] = (0, 0)
+    primary: bool        = False
+    rotation: int        = xcffib.randr.Rotation.Rotate_0
+
+class Profile(NamedTuple):
+    # Outputs not listed here are switched off
+    outputs: Dict[str, Output]
+    # Group name -> screen index, replaces group_to_screen_binds when applied
+    binds: Optional[Dict[str, int]] = None
+
+class Crtc(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+    mode: int
+    rotation: int
+    outputs: Tuple[int, ...]
+
+class Timing(NamedTuple):
+    profile: str
+    resources: float
+    apply: float
+    relayout: float
+
+# }}}
+
+# ================================== Monitors ============================== {{{
+
+class Monitors:
+    # Applies monitor profiles by talking RandR directly instead of running
+    # xrandr. Output and mode information is cached and only fetched again
+    # after an RRNotify tells us an output changed, a profile is applied with
+    # the server grabbed so clients never see a half configured screen, and
+    # qtile's screens are rebuilt once, together with the group bindings.
+    #
+    # Takes over from `reconfigure_screens`, leave that set to False.
+
+    def __init__(self, profiles: Dict[str, Profile], group_binds: Dict[str, int], auto: Optional[List[Tuple[frozenset, str]]] = None, dpi: float = 96.0):
+        self.profiles    = profiles
+        self.group_binds = group_binds
+        self.auto        = auto or []
+        self.dpi         = dpi
+        self.timings: List[Timing] = []
+
+        self._conn: Optional[xcffib.Connection]           = None
+        self._randr                                       = None
+        self._root                                        = 0
+        self._resources                                   = None
+        self._outputs: Dict[str, Tuple[int, object]]      = {}
+        self._mode_names: Dict[int, str]                  = {}
+        self._crtcs: Dict[int, Crtc]                      = {}
+        self._pending: Optional[Tuple[str, float, float]] = None
+        self._auto_handle                                 = None
+        self._screen_handle                               = None
+
+    # --------------------------- X connection ---------------------------- {{{{
+
+    def attach(self, conn: xcffib.Connection, root: int) -> None:
+        self._conn  = conn
+        self._randr = conn(xcffib.randr.key)
+        self._root  = root
+        self._randr.SelectInput(root, xcffib.randr.NotifyMask.ScreenChange | xcffib.randr.NotifyMask.OutputChange)
+        self.invalidate()
+
+    def attach_qtile(self, qtile=None) -> None:
+        qtile = qtile or libqtile.qtile
+        # Profiles are RandR ones, a wayland qtile manages its outputs itself
+        if qtile.core.name != "x11":
+            return
+        self.attach(qtile.core.conn.conn, qtile.core.conn.default_screen.root.wid)
+        # RRNotify events have no window, so qtile looks for a handler on
+        # the core and otherwise drops them
+        qtile.core.handle_Notify = self._randr_notify
+        hook.subscribe.screen_change(self._screen_change)
+
+    def _screen_change(self, event=None) -> None:
+        # Applying a profile produces several notifies in one go, rebuild the
+        # screens once after all of them have been handled
+        if self._screen_handle is None:
+            self._screen_handle = eventloop.call_soon(self.reconfigure)
+
+    def invalidate(self) -> None:
+        self._resources  = None
+        self._outputs    = {}
+        self._mode_names = {}
+        self._crtcs      = {}
+
+    def _load(self) -> None:
+        if self._resources is not None:
+            return
+        resources = self._randr.GetScreenResourcesCurrent(self._root).reply()
+
+        names  = bytes(resources.names)
+        offset = 0
+        for mode in resources.modes:
+            self._mode_names[mode.id] = names[offset:offset + mode.name_len].decode()
+            offset += mode.name_len
+
+        ts      = resources.config_timestamp
+        outputs = [(output, self._randr.GetOutputInfo(output, ts)) for output in resources.outputs]
+        crtcs   = [(crtc, self._randr.GetCrtcInfo(crtc, ts)) for crtc in resources.crtcs]
+        for output, cookie in outputs:
+            info = cookie.reply()
+            self._outputs[bytes(info.name).decode()] = (output, info)
+        for crtc, cookie in crtcs:
+            info = cookie.reply()
+            self._crtcs[crtc] = Crtc(info.x, info.y, info.width, info.height, info.mode, info.rotation, tuple(info.outputs))
+
+        self._resources = resources
+
+    def connected(self) -> frozenset:
+        self._load()
+        return frozenset(
+            name for name, (_, info) in self._outputs.items()
+            if info.connection == xcffib.randr.Connection.Connected
+        )
+
+    # }}}}
+
+    # ------------------------------- Apply ------------------------------- {{{{
+
+    def _find_mode(self, info, name: str) -> int:
+        for mode in info.modes:
+            if self._mode_names.get(mode) == name:
+                return mode
+        raise ValueError("Output does not support mode {}".format(name))
+
+    def _mode_size(self, mode: int) -> Tuple[int, int]:
+        for info in self._resources.modes:
+            if info.id == mode:
+                return info.width, info.height
+        return 0, 0
+
+    def apply(self, name: str) -> bool:
+        profile = self.profiles.get(name)
+        if profile is None:
+            logger.error("Unknown monitor profile '%s'", name)
+            return False
+
+        start = time.monotonic()
+        self._load()
+        loaded = time.monotonic()
+
+        # Work out the whole configuration before touching the server
+        wanted: Dict[int, Crtc] = {}
+        current = {output: crtc for crtc, state in self._crtcs.items() for output in state.outputs}
+        keep    = {current[self._outputs[o][0]] for o in profile.outputs if o in self._outputs and self._outputs[o][0] in current}
+        primary = 0
+        width = height = 0
+        try:
+            for output_name, output in profile.outputs.items():
+                output_id, info = self._outputs[output_name]
+                mode = self._find_mode(info, output.mode)
+                crtc = current.get(output_id)
+                if crtc is None or crtc in wanted:
+                    # Prefer idle CRTCs over ones of outputs being switched off
+                    candidates = sorted(info.crtcs, key=lambda c: c in current.values())
+                    crtc = next(c for c in candidates if c not in wanted and c not in keep)
+                x, y = output.pos
+                w, h = self._mode_size(mode)
+                if output.rotation & (xcffib.randr.Rotation.Rotate_90 | xcffib.randr.Rotation.Rotate_270):
+                    w, h = h, w
+                wanted[crtc] = Crtc(x, y, w, h, mode, output.rotation, (output_id,))
+                width  = max(width, x + w)
+                height = max(height, y + h)
+                if output.primary:
+                    primary = output_id
+        except (KeyError, ValueError, StopIteration) as e:
+            logger.error("Monitor profile '%s' does not fit the connected outputs: %s", name, e)
+            return False
+
+        ts       = self._resources.config_timestamp
+        disabled = Crtc(0, 0, 0, 0, 0, xcffib.randr.Rotation.Rotate_0, ())
+        core     = self._conn.core
+        core.GrabServer()
+        try:
+            # CRTCs that get switched off or move have to be disabled before
+            # the screen is resized, otherwise they may not fit the new size
+            for crtc, state in self._crtcs.items():
+                if state.mode and wanted.get(crtc) != state:
+                    self._randr.SetCrtcConfig(crtc, xcffib.CurrentTime, ts, 0, 0, 0, disabled.rotation, 0, []).reply()
+                    self._crtcs[crtc] = disabled
+            mm = 25.4 / self.dpi
+            self._randr.SetScreenSize(self._root, width, height, int(width * mm), int(height * mm))
+            for crtc, state in wanted.items():
+                if self._crtcs.get(crtc) == state:
+                    continue
+                self._randr.SetCrtcConfig(crtc, xcffib.CurrentTime, ts, state.x, state.y, state.mode, state.rotation, len(state.outputs), list(state.outputs)).reply()
+                self._crtcs[crtc] = state
+            if primary:
+                self._randr.SetOutputPrimary(self._root, primary)
+        finally:
+            core.UngrabServer()
+            self._conn.flush()
+        applied = time.monotonic()
+
+        # The screen change notify for this configuration does the relayout
+        self._pending = (name, loaded - start, applied - loaded)
+        return True
+
+    # }}}}
+
+    # ------------------------------ Events ------------------------------- {{{{
+
+    def _randr_notify(self, event) -> None:
+        if event.subCode == xcffib.randr.Notify.OutputChange:
+            self.hotplug()
+
+    def hotplug(self, event=None) -> None:
+        """A connector changed, from RandR or a drm uevent"""
+        if event is not None and event.properties.get("HOTPLUG") != "1":
+            return
+        self.invalidate()
+        if self._auto_handle is not None:
+            self._auto_handle.cancel()
+        # Hotplug produces a burst of events, wait until it settles
+        self._auto_handle = eventloop.call_later(0.5, self.apply_auto)
+
+    def apply_auto(self) -> Optional[str]:
+        self._auto_handle = None
+        connected = self.connected()
+        for outputs, name in self.auto:
+            if outputs == connected:
+                self.apply(name)
+                return name
+        return None
+
+    def reconfigure(self) -> None:
+        self._screen_handle = None
+        qtile = libqtile.qtile
+
+        start = time.monotonic()
+        pending, self._pending = self._pending, None
+        binds = None
+        if pending is not None:
+            binds = self.profiles[pending[0]].binds
+
+        if binds is not None:
+            self.group_binds.clear()
+            self.group_binds.update(binds)
+
+        qtile._process_screens()
+
+        # Put bound groups on their screens first so every group is laid out
+        # exactly once
+        placed = set()
+        for group_name, index in self.group_binds.items():
+            group = qtile.groups_map.get(group_name)
+            if group is not None and index < len(qtile.screens):
+                qtile.screens[index].set_group(group, warp=False)
+                placed.add(group)
+
+        for group in qtile.groups:
+            if group in placed or not group.screen:
+                continue
+            if group.screen in qtile.screens:
+                group.layout_all()
+            else:
+                group.hide()
+
+        hook.fire("screens_reconfigured")
+
+        if pending is not None:
+            timing = Timing(pending[0], pending[1], pending[2], time.monotonic() - start)
+            self.timings.append(timing)
+            logger.info("Monitor profile %s: resources %.1fms, randr %.1fms, relayout %.1fms",
+                timing.profile, timing.resources * 1000, timing.apply * 1000, timing.relayout * 1000)
+
+    # }}}}
+
+# }}}
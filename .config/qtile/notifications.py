@@ -0,0 +1,219 @@
+#  ================================== Imports ============================== {{{
+
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from libqtile.widget import base
+
+import eventloop
+
+# }}}
+
+# =============================== Notifications ============================ {{{
+
+class Urgency(Enum):
+    INFO  = 0
+    ERROR = 1
+    WARN  = 2
+
+class Notification:
+    def __init__(self, msg: str, urgency: Urgency, timeout: int):
+        self.msg     = msg
+        self.timeout = timeout
+        self.urgency = urgency
+        # Identical notifications are merged into one and counted
+        self.count   = 1
+
+    @property
+    def key(self) -> Tuple[str, Urgency]:
+        return self.msg, self.urgency
+
+    @property
+    def text(self) -> str:
+        if self.count > 1:
+            return "{} (x{})".format(self.msg, self.count)
+        return self.msg
+
+# }}}
+
+# =================================== Queue ================================ {{{
+
+NotificationListener = Callable[[Optional[Notification], int], None]
+
+class NotificationQueue:
+    # Shows notifications in the bar one after the other. A message that is
+    # already shown or waiting is merged into the existing entry, messages
+    # beyond the rate limit are only counted, and the backlog is bounded so a
+    # runaway caller can't grow it without limit. Whatever happens within one
+    # frame results in a single redraw.
+
+    def __init__(self, backlog: int = 32, rate: float = 10.0, burst: int = 20, frame: float = 1 / 60):
+        self.backlog = backlog
+        self.rate    = rate
+        self.burst   = burst
+        self.frame   = frame
+
+        self.notifications: Deque[Notification]              = deque()
+        self.current: Optional[Notification]                 = None
+        self._queued: Dict[Tuple[str, Urgency], Notification] = {}
+        self._tokens                                         = float(burst)
+        self._refilled                                       = time.monotonic()
+        self._timeout_handle                                 = None
+        self._render_handle                                  = None
+        self._listeners: List[NotificationListener]          = []
+
+        # Messages not shown because of the rate limit since the last one was
+        self.suppressed = 0
+
+        self.stats = {"received": 0, "merged": 0, "suppressed": 0, "dropped": 0, "renders": 0}
+
+    # ------------------------------ Posting ------------------------------ {{{{
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens   = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def push(self, msg: str, urgency: Urgency = Urgency.INFO, timeout: float = 2) -> None:
+        self.stats["received"] += 1
+
+        key = (msg, urgency)
+        if self.current is not None and self.current.key == key:
+            # Shown right now, count it and show it for longer
+            self.current.count += 1
+            self.stats["merged"] += 1
+            self._show_for(max(self.current.timeout, timeout))
+            self._changed()
+            return
+        queued = self._queued.get(key)
+        if queued is not None:
+            queued.count += 1
+            self.stats["merged"] += 1
+            return
+
+        # Errors always get through, they are the reason for having this
+        if urgency != Urgency.ERROR and not self._take_token():
+            self.suppressed += 1
+            self.stats["suppressed"] += 1
+            if self.current is not None:
+                self._changed()
+            return
+
+        if len(self.notifications) >= self.backlog:
+            dropped = self.notifications.popleft()
+            del self._queued[dropped.key]
+            self.stats["dropped"] += 1
+
+        notification = Notification(msg, urgency, timeout)
+        self.notifications.append(notification)
+        self._queued[key] = notification
+        if self.current is None:
+            self._next()
+
+    def clear(self) -> None:
+        self.notifications.clear()
+        self._queued.clear()
+        self.suppressed = 0
+        self._next()
+
+    # }}}}
+
+    # ------------------------------ Showing ------------------------------ {{{{
+
+    def _show_for(self, timeout: float) -> None:
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+        self._timeout_handle = eventloop.call_later(timeout, self._next)
+
+    def _next(self) -> None:
+        self._timeout_handle = None
+        if self.notifications:
+            self.current = self.notifications.popleft()
+            del self._queued[self.current.key]
+            self._show_for(self.current.timeout)
+        else:
+            self.current    = None
+            self.suppressed = 0
+        self._changed()
+
+    def _changed(self) -> None:
+        if self._render_handle is None:
+            self._render_handle = eventloop.call_later(self.frame, self._render)
+
+    def _render(self) -> None:
+        self._render_handle = None
+        self.stats["renders"] += 1
+        for listener in list(self._listeners):
+            listener(self.current, self.suppressed)
+
+    def subscribe(self, listener: NotificationListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: NotificationListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def close(self) -> None:
+        for handle in (self._timeout_handle, self._render_handle):
+            if handle is not None:
+                handle.cancel()
+        self._timeout_handle = self._render_handle = None
+        self._listeners.clear()
+
+    # }}}}
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class NotificationBox(base._TextBox):
+    """Shows the current notification of a NotificationQueue.
+
+    Put the same instance in every bar, qtile mirrors it so all bars show the
+    same text and colours after one draw.
+    """
+
+    defaults = [
+        ("colours",           {},       "Urgency -> (background, foreground)"),
+        ("suppressed_format", " [+{}]", "Appended when messages were dropped by the rate limit"),
+    ]
+
+    def __init__(self, queue: NotificationQueue, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(NotificationBox.defaults)
+        self.queue = queue
+        self.add_callbacks({"Button1": self.queue.clear})
+
+    def timer_setup(self):
+        self.queue.subscribe(self._changed)
+
+    def _changed(self, notification: Optional[Notification], suppressed: int) -> None:
+        if not self.configured:
+            return
+        text = ""
+        self.background = None
+        if notification is not None:
+            colours = self.colours.get(notification.urgency)
+            if colours is not None:
+                self.background, self.foreground = colours
+            text = notification.text
+            if suppressed:
+                text += self.suppressed_format.format(suppressed)
+        if text == self.text:
+            # Only the colours changed, update() would not draw at all
+            self.draw()
+        else:
+            self.update(text)
+
+    def finalize(self):
+        self.queue.unsubscribe(self._changed)
+        base._TextBox.finalize(self)
+
+# }}}
@@ -0,0 +1,284 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+
+import eventloop
+
+# }}}
+
+# ================================== Children ============================== {{{
+
+class Child:
+    # A process started by this config. Its exit is noticed through a pidfd
+    # registered on the event loop, so there is no thread blocked in waitpid
+    # per child and no SIGCHLD handler. Until it is reaped its pid can't be
+    # reused, so signalling a running child never hits another process.
+
+    def __init__(self, popen: Optional[subprocess.Popen], pid: Optional[int] = None):
+        self.popen   = popen
+        self.pid     = popen.pid if popen is not None else pid
+        self.started = time.monotonic()
+        self.exited: asyncio.Future = eventloop.get_loop().create_future()
+
+        self._returncode: Optional[int] = None
+        self._pidfd: Optional[int]      = None
+        try:
+            self._pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            if popen is None:
+                # Without a pidfd there is nothing to wait on for a process
+                # that was not started through Popen
+                raise
+            # Kernels before 5.3 or non-Linux
+            eventloop.run_in_executor(self.popen.wait).add_done_callback(lambda _: self._reap())
+        else:
+            eventloop.add_reader(self._pidfd, self._reap)
+
+    @classmethod
+    def adopt(cls, pid: int) -> "Child":
+        """Tracks a process that was started before a qtile restart. qtile
+        restarts by exec, so those are still its children."""
+        return cls(None, pid)
+
+    @property
+    def returncode(self) -> Optional[int]:
+        if self.popen is not None:
+            return self.popen.returncode
+        return self._returncode
+
+    @property
+    def running(self) -> bool:
+        return not self.exited.done()
+
+    def _poll(self) -> bool:
+        if self.popen is not None:
+            return self.popen.poll() is not None
+        try:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+        except ChildProcessError:
+            # Not our child after all, the readable pidfd says it is gone
+            return True
+        if pid == 0:
+            return False
+        self._returncode = os.waitstatus_to_exitcode(status)
+        return True
+
+    def _reap(self) -> None:
+        if not self._poll():
+            return
+        if self._pidfd is not None:
+            eventloop.remove_reader(self._pidfd)
+            os.close(self._pidfd)
+            self._pidfd = None
+        if not self.exited.done():
+            self.exited.set_result(self.returncode)
+
+    def send_signal(self, sig: int, group: bool = False) -> bool:
+        """Signals the child, or with `group` its whole process group (spawn
+        starts a new session, so that is everything it started)"""
+        if not self.running:
+            return False
+        try:
+            if group:
+                os.killpg(self.pid, sig)
+            else:
+                os.kill(self.pid, sig)
+        except ProcessLookupError:
+            return False
+        return True
+
+def start_time(pid: int) -> Optional[int]:
+    # Field 22 of /proc/<pid>/stat, together with the pid it tells a process
+    # apart from a later one that got the same pid
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name can contain spaces and parentheses
+    return int(stat[stat.rindex(")") + 2:].split()[19])
+
+def spawn(argv: List[str], **kwargs) -> Child:
+    env = kwargs.pop("env", None) or dict(os.environ)
+    # If qtile runs from a virtualenv, don't leak it into applications
+    env.pop("VIRTUAL_ENV", None)
+
+    popen = subprocess.Popen(
+        [os.path.expanduser(arg) for arg in argv],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        env=env,
+        **kwargs,
+    )
+    logger.debug("Spawned %s as %d", argv, popen.pid)
+    return Child(popen)
+
+def running_process_names() -> set:
+    # One pass over /proc for callers that need to check several names at once
+    names = set()
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(os.path.join(entry.path, "comm")) as f:
+                names.add(f.read().strip())
+        except OSError:
+            continue
+    return names
+
+def descendants(pid: int) -> List[int]:
+    """pid and every process below it"""
+    found = [pid]
+    for parent in found:
+        try:
+            tasks = os.listdir("/proc/{}/task".format(parent))
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open("/proc/{}/task/{}/children".format(parent, task)) as f:
+                    found.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+    return found
+
+def cpu_seconds(pid: int) -> float:
+    # utime + stime of /proc/<pid>/stat
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+# }}}
+
+# ================================= Supervisor ============================= {{{
+
+class Supervisor:
+    # Long running helpers (recorder, unclutter, redshift, ...) by name. Each
+    # name has at most one child, so starting a helper that is already
+    # running does nothing, and signals go to the tracked pid instead of every
+    # process with a matching name. The pids are written to a state file, so
+    # the helpers are picked up again after a qtile restart.
+
+    def __init__(self, state_path: Optional[str] = None):
+        self.state_path = state_path or os.path.join(get_cache_dir(), "helpers.json")
+
+        self.children: Dict[str, Child] = {}
+        # Suspended helpers, True for the ones that were stopped
+        self.suspended: Dict[str, bool] = {}
+
+        self._restore()
+
+    def _restore(self) -> None:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, (pid, started) in state.items():
+            if started is None or start_time(pid) != started:
+                continue
+            try:
+                self._track(name, Child.adopt(pid))
+            except OSError:
+                continue
+            logger.debug("Adopted helper %s (%d)", name, pid)
+
+    def _save(self) -> None:
+        state = {name: (child.pid, start_time(child.pid)) for name, child in self.children.items()}
+        try:
+            with open(self.state_path, "w") as f:
+                json.dump(state, f)
+        except OSError:
+            logger.exception("Unable to write %s", self.state_path)
+
+    def _track(self, name: str, child: Child) -> None:
+        self.children[name] = child
+        child.exited.add_done_callback(lambda _: self._exited(name, child))
+
+    def _exited(self, name: str, child: Child) -> None:
+        if self.children.get(name) is child:
+            del self.children[name]
+            self._save()
+        logger.debug("Helper %s (%d) exited with %s", name, child.pid, child.returncode)
+
+    # ------------------------------ Control ------------------------------ {{{{
+
+    def child(self, name: str) -> Optional[Child]:
+        return self.children.get(name)
+
+    def running(self, name: str) -> bool:
+        return name in self.children
+
+    def adopt(self, name: str, child: Child) -> None:
+        """Tracks a child that was spawned elsewhere (e.g. by autostart)"""
+        if child.running:
+            self._track(name, child)
+            self._save()
+
+    def start(self, name: str, argv: List[str], **kwargs) -> Child:
+        child = self.children.get(name)
+        if child is not None:
+            return child
+        child = spawn(argv, **kwargs)
+        self.adopt(name, child)
+        return child
+
+    def send(self, name: str, sig: int) -> bool:
+        child = self.children.get(name)
+        return child is not None and child.send_signal(sig, group=True)
+
+    def stop(self, name: str, sig: int = signal.SIGTERM) -> Optional[asyncio.Future]:
+        """Signals the helper and returns the future that is done once it has
+        been reaped, or None when it wasn't running"""
+        child = self.children.get(name)
+        if child is None or not child.send_signal(sig, group=True):
+            return None
+        return child.exited
+
+    def toggle(self, name: str, argv: List[str], **kwargs) -> bool:
+        """Starts or stops the helper, returns whether it runs now"""
+        if self.stop(name) is not None:
+            return False
+        self.start(name, argv, **kwargs)
+        return True
+
+    def suspend(self, name: str, stop: bool = False) -> Optional[asyncio.Future]:
+        """Pauses the helper with SIGSTOP, or stops it when it mustn't be
+        around at all (e.g. because it grabs the pointer). Returns the exited
+        future of a stopped helper."""
+        child = self.children.get(name)
+        if child is None or name in self.suspended:
+            return None
+        self.suspended[name] = stop
+        if stop:
+            return self.stop(name)
+        self.send(name, signal.SIGSTOP)
+        return None
+
+    def resume(self, name: str, argv: Optional[List[str]] = None, **kwargs) -> None:
+        """Continues a paused helper, a stopped one is started again with argv"""
+        stopped = self.suspended.pop(name, None)
+        if stopped is None:
+            return
+        if not stopped:
+            self.send(name, signal.SIGCONT)
+        elif argv is not None:
+            self.start(name, argv, **kwargs)
+
+    # }}}}
+
+# }}}
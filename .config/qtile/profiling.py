@@ -0,0 +1,324 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from libqtile import hook
+from libqtile.command.base import CommandObject
+from libqtile.group import _Group
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+
+import eventloop
+
+# }}}
+
+# ================================= Profiler =============================== {{{
+
+class Profiler:
+    # cProfile and tracemalloc inside the running qtile. Both only cost while
+    # they are started; dump() writes the pstats file (for snakeviz and
+    # friends) and a text summary next to it.
+
+    def __init__(self, directory: Optional[str] = None, frames: int = 16):
+        self.directory = directory or os.path.join(get_cache_dir(), "profiles")
+        # Stack depth tracemalloc records for every allocation
+        self.frames    = frames
+
+        self.profile: Optional[cProfile.Profile]          = None
+        self.snapshot: Optional[tracemalloc.Snapshot]     = None
+        self.started: Optional[float]                     = None
+        self.stopped: Optional[float]                     = None
+        self._tracing                                     = False
+
+    @property
+    def running(self) -> bool:
+        return self.started is not None and self.stopped is None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.profile  = cProfile.Profile()
+        self.started  = time.time()
+        self.stopped  = None
+        # Someone else (python -X tracemalloc) may be tracing already
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start(self.frames)
+        self.snapshot = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.profile.disable()
+        self.stopped = time.time()
+
+    def close(self) -> None:
+        self.stop()
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def dump(self) -> List[str]:
+        """Writes what was collected so far and returns the paths written.
+        Stops tracemalloc when it was started by start() and the profiler is
+        stopped."""
+        if self.profile is None:
+            return []
+        running = self.running
+        if running:
+            self.profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime("qtile-%Y%m%d-%H%M%S", time.localtime(self.started)))
+
+        # create_stats() in dump_stats() needs the profile disabled
+        self.profile.dump_stats(base + ".prof")
+        summary = io.StringIO()
+        summary.write("Profiled for {:.1f}s\n\n".format((self.stopped or time.time()) - self.started))
+        stats = pstats.Stats(self.profile, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(40)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(20)
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ])
+            summary.write("\nAllocated since start:\n")
+            for stat in snapshot.compare_to(self.snapshot, "lineno")[:30]:
+                summary.write("  {}\n".format(stat))
+            current, peak = tracemalloc.get_traced_memory()
+            summary.write("\nTraced memory: {:.1f} MiB, peak {:.1f} MiB\n".format(current / 2 ** 20, peak / 2 ** 20))
+            if not running and self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+
+        with open(base + ".txt", "w") as f:
+            f.write(summary.getvalue())
+        if running:
+            self.profile.enable()
+        return [base + ".prof", base + ".txt"]
+
+# }}}
+
+# =============================== Lag Monitor ============================== {{{
+
+# Upper bounds of the histogram buckets in milliseconds, the last one is open
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+def describe(callback: Callable, args: Tuple = ()) -> str:
+    """A readable name for an event loop callback, looking through the
+    closures qtile and this config wrap callbacks in"""
+    for _ in range(4):
+        if isinstance(callback, asyncio.Task):
+            break
+        closure = getattr(callback, "__closure__", None)
+        code    = getattr(callback, "__code__", None)
+        if closure and code is not None:
+            cells = {}
+            for name, cell in zip(code.co_freevars, closure):
+                try:
+                    cells[name] = cell.cell_contents
+                except ValueError:
+                    pass
+            # qtile.call_soon/call_later (func), eventloop.add_reader (func),
+            # the frame scheduler's widget timers (method)
+            inner = cells.get("func", cells.get("method"))
+            if callable(inner):
+                callback = inner
+                args     = cells.get("args", ())
+                continue
+        # Widget timers run through _Widget._wrapper(method, *args)
+        if getattr(callback, "__name__", "") == "_wrapper" and args and callable(args[0]):
+            callback, args = args[0], args[1:]
+            continue
+        break
+
+    owner = getattr(callback, "__self__", None)
+    name  = getattr(callback, "__qualname__", None) or repr(callback)
+    if owner is not None and isinstance(getattr(owner, "name", None), str):
+        # Widgets and layouts have names, "clock: Clock.tick" says more than
+        # the method alone
+        return "{}: {}".format(owner.name, name)
+    module = getattr(callback, "__module__", None)
+    return "{}.{}".format(module, name) if module else name
+
+class LagMonitor:
+    # A heartbeat on the event loop: every beat measures how late it ran,
+    # which is how long something else kept the loop busy. The beats are
+    # aligned to eventloop.TICK, they wake qtile together with the bar.
+    #
+    # While running, event loop callbacks, hook subscribers, lazy functions
+    # and layout runs that take longer than `slow` seconds are recorded under
+    # their name.
+
+    def __init__(self, interval: float = eventloop.TICK, slow: float = 0.02):
+        self.interval = interval
+        self.slow     = slow
+
+        self.histogram: List[int]                   = [0] * (len(BUCKETS) + 1)
+        self.beats                                  = 0
+        self.worst                                  = 0.0
+        # name -> [count, total seconds, worst seconds]
+        self.offenders: Dict[str, List[float]]      = {}
+        self._handle                                = None
+        self._expected                              = 0.0
+        self._patches: List[Tuple[Any, str, Any]]   = []
+
+    @property
+    def running(self) -> bool:
+        return self._handle is not None
+
+    # ------------------------------ Heartbeat ---------------------------- {{{{
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._patch()
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._unpatch()
+
+    def close(self) -> None:
+        # The patches wrap qtile's own functions, a new monitor must not wrap
+        # this one's
+        self.stop()
+
+    def reset(self) -> None:
+        self.histogram = [0] * (len(BUCKETS) + 1)
+        self.beats     = 0
+        self.worst     = 0.0
+        self.offenders.clear()
+
+    def _schedule(self) -> None:
+        delay          = eventloop.aligned_delay(self.interval)
+        self._expected = eventloop.get_loop().time() + delay
+        self._handle   = eventloop.call_later(delay, self._beat)
+
+    def _beat(self) -> None:
+        lag = max(0.0, eventloop.get_loop().time() - self._expected)
+        self.beats += 1
+        self.worst  = max(self.worst, lag)
+        self.histogram[bisect.bisect_left(BUCKETS, lag * 1000)] += 1
+        self._schedule()
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket the given fraction of beats falls into,
+        in milliseconds, None for the open bucket"""
+        needed = fraction * self.beats
+        seen   = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= needed and seen:
+                return BUCKETS[index] if index < len(BUCKETS) else None
+        return None
+
+    # }}}}
+
+    # ----------------------------- Attribution --------------------------- {{{{
+
+    def record(self, name: str, duration: float) -> None:
+        if duration < self.slow:
+            return
+        entry = self.offenders.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2]  = max(entry[2], duration)
+
+    def _replace(self, owner: Any, attribute: str, replacement: Any) -> None:
+        self._patches.append((owner, attribute, owner.__dict__[attribute]))
+        setattr(owner, attribute, replacement)
+
+    def _patch(self) -> None:
+        monitor = self
+
+        run = asyncio.Handle._run
+        def timed_run(handle):
+            start = time.perf_counter()
+            try:
+                return run(handle)
+            finally:
+                duration = time.perf_counter() - start
+                if duration >= monitor.slow and handle._callback is not None:
+                    monitor.record("callback " + describe(handle._callback, handle._args or ()), duration)
+        self._replace(asyncio.Handle, "_run", timed_run)
+
+        # The same loop as hook.fire, timing every subscriber on its own
+        original_fire = hook.fire
+        def fire(event, *args, **kwargs):
+            if event not in hook.subscribe.hooks:
+                return original_fire(event, *args, **kwargs)
+            for subscriber in hook.subscriptions.get(event, []):
+                start = time.perf_counter()
+                try:
+                    if asyncio.iscoroutinefunction(subscriber):
+                        hook._fire_async_event(subscriber(*args, **kwargs))
+                    elif asyncio.iscoroutine(subscriber):
+                        hook._fire_async_event(subscriber)
+                    else:
+                        subscriber(*args, **kwargs)
+                except Exception:
+                    logger.exception("Error in hook %s", event)
+                monitor.record("hook {}: {}".format(event, describe(subscriber)), time.perf_counter() - start)
+        self._replace(hook, "fire", fire)
+
+        cmd_function = CommandObject.cmd_function
+        def timed_function(obj, function, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return cmd_function(obj, function, *args, **kwargs)
+            finally:
+                monitor.record("function " + describe(function), time.perf_counter() - start)
+        timed_function.__doc__ = cmd_function.__doc__
+        self._replace(CommandObject, "cmd_function", timed_function)
+
+        layout_all = _Group.layout_all
+        def timed_layout_all(group, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return layout_all(group, *args, **kwargs)
+            finally:
+                monitor.record("layout {}: {}".format(group.name, group.layout.name), time.perf_counter() - start)
+        self._replace(_Group, "layout_all", timed_layout_all)
+
+    def _unpatch(self) -> None:
+        while self._patches:
+            owner, attribute, original = self._patches.pop()
+            setattr(owner, attribute, original)
+
+    # }}}}
+
+    # ------------------------------ Reporting ---------------------------- {{{{
+
+    def report(self, offenders: int = 5) -> str:
+        if not self.beats:
+            return "lag: no heartbeats yet" if self.running else "lag: not running"
+        p50, p99 = self.percentile(0.5), self.percentile(0.99)
+        lines = ["lag: {} beats, p50 <={}, p99 <={}, worst {:.1f}ms".format(
+            self.beats,
+            "{}ms".format(p50) if p50 is not None else "inf",
+            "{}ms".format(p99) if p99 is not None else "inf",
+            self.worst * 1000,
+        )]
+        bounds = ["<={}ms".format(bound) for bound in BUCKETS] + [">{}ms".format(BUCKETS[-1])]
+        lines.append(" ".join("{}:{}".format(bound, count) for bound, count in zip(bounds, self.histogram) if count))
+        worst = sorted(self.offenders.items(), key=lambda item: item[1][1], reverse=True)[:offenders]
+        for name, (count, total, peak) in worst:
+            lines.append("{}x {:.0f}ms (max {:.0f}ms) {}".format(count, total * 1000, peak * 1000, name))
+        return "\n".join(lines)
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,99 @@
+#  ================================== Imports ============================== {{{
+
+from typing import Dict, Optional
+
+import libqtile
+from libqtile import hook
+
+# }}}
+
+# ================================== Registry ============================== {{{
+
+class Registry:
+    # Name -> group, group -> layout and window -> group lookups for the
+    # helpers in config.py, kept up to date by hooks instead of scanning
+    # qtile.groups on every key press. Attached on startup, so it works before
+    # any prompt or command has run.
+
+    def __init__(self):
+        self.qtile = None
+
+        self.groups: Dict[str, object]                    = {}
+        self.current_layouts: Dict[str, object]           = {}
+        self.group_layouts: Dict[str, Dict[str, object]]  = {}
+        self.windows: Dict[int, str]                      = {}
+
+    def attach(self, qtile=None) -> None:
+        self.qtile = qtile or libqtile.qtile
+        hook.subscribe.addgroup(self._group_added)
+        hook.subscribe.delgroup(self._group_removed)
+        hook.subscribe.layout_change(self._layout_changed)
+        hook.subscribe.group_window_add(self._window_added)
+        hook.subscribe.client_killed(self._window_killed)
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        self.groups.clear()
+        self.current_layouts.clear()
+        self.group_layouts.clear()
+        self.windows.clear()
+        for group in self.qtile.groups:
+            self._add(group)
+
+    # ------------------------------- Hooks ------------------------------- {{{{
+
+    def _add(self, group) -> None:
+        self.groups[group.name]          = group
+        self.current_layouts[group.name] = group.layout
+        # A group's layouts are cloned once when the group is created
+        self.group_layouts[group.name]   = {layout.name: layout for layout in group.layouts}
+        for window in group.windows:
+            self.windows[window.wid] = group.name
+
+    def _group_added(self, name: str) -> None:
+        group = self.qtile.groups_map.get(name)
+        if group is not None:
+            self._add(group)
+
+    def _group_removed(self, name: str) -> None:
+        self.groups.pop(name, None)
+        self.current_layouts.pop(name, None)
+        self.group_layouts.pop(name, None)
+        # The group's windows were moved and re-registered already
+        for wid in [wid for wid, group in self.windows.items() if group == name]:
+            del self.windows[wid]
+
+    def _layout_changed(self, layout, group) -> None:
+        self.current_layouts[group.name] = layout
+
+    def _window_added(self, group, window) -> None:
+        self.windows[window.wid] = group.name
+
+    def _window_killed(self, window) -> None:
+        self.windows.pop(window.wid, None)
+
+    # }}}}
+
+    # ------------------------------ Lookups ------------------------------ {{{{
+
+    def group(self, name: str):
+        return self.groups.get(name)
+
+    def layout(self, group_name: str, layout_name: Optional[str] = None):
+        """The group's current layout, or its layout called `layout_name`
+        (e.g. "treetab") whether or not it is the current one"""
+        if layout_name is None:
+            return self.current_layouts.get(group_name)
+        return self.group_layouts.get(group_name, {}).get(layout_name)
+
+    def group_of(self, window):
+        name = self.windows.get(window.wid)
+        return None if name is None else self.groups.get(name)
+
+    @property
+    def current_group(self):
+        return self.qtile.current_group
+
+    # }}}}
+
+# }}}
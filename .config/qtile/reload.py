@@ -0,0 +1,678 @@
+#  ================================== Imports ============================== {{{
+
+import contextlib
+import enum
+import functools
+import json
+import os
+import re
+import sys
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from libqtile import hook
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+from libqtile.widget.base import _Widget
+
+import eventloop
+
+# }}}
+
+# =================================== Store ================================ {{{
+
+class Store:
+    # Runtime state that should outlive a reload and a restart (screen
+    # bindings, web sections), written to one JSON file in the cache
+    # directory a moment after it changes.
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_cache_dir(), "state.json")
+
+        self.data: Dict[str, Any]               = {}
+        self._dicts: Dict[str, "PersistentDict"] = {}
+        self._save_handle                       = None
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+        if self._save_handle is None:
+            self._save_handle = eventloop.call_later(1, self.save)
+
+    def dict(self, key: str) -> "PersistentDict":
+        """A dict that is written back whenever it changes, the same object
+        every time it is asked for"""
+        if key not in self._dicts:
+            self._dicts[key] = PersistentDict(self, key)
+        return self._dicts[key]
+
+    def save(self) -> None:
+        self._save_handle = None
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError):
+            logger.exception("Unable to write %s", self.path)
+
+    def close(self) -> None:
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self.save()
+
+class PersistentDict(dict):
+    def __init__(self, store: Store, key: str):
+        dict.__init__(self, store.get(key, {}))
+        self.store = store
+        self.key   = key
+
+    def _changed(self) -> None:
+        self.store.set(self.key, dict(self))
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._changed()
+        return value
+
+    def clear(self):
+        dict.clear(self)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        value = dict.setdefault(self, key, default)
+        self._changed()
+        return value
+
+# }}}
+
+# ================================= Signatures ============================= {{{
+
+# Objects that are kept across reloads: name -> (signature, object). qtile
+# re-imports every module of the config directory when it reloads the config,
+# importlib.reload runs the module again in the same namespace, so this
+# survives it.
+_kept: Dict[str, Tuple[Any, Any]] = globals().get("_kept", {})
+# Whether config.py is being run by Reloader.reload, and the objects that run
+# created
+_generation: Dict[str, Any] = globals().get("_generation", {"incremental": False, "created": [], "used": set(), "fresh": set()})
+
+# Hook subscriptions made while a reload made or configured an object:
+# id(owner) -> (owner, [(event, subscriber)]). Whatever the object subscribed
+# is dropped with it, not only its own methods.
+_registered: Dict[int, Tuple[Any, List[Tuple[str, Any]]]] = globals().get("_registered", {})
+
+# What decides whether reloading keeps the running groups
+STRUCTURE = ("groups", "layouts", "floating_layout", "widget_defaults", "extension_defaults", "dgroups_key_binder", "dgroups_app_rules")
+POSITIONS = ("top", "bottom", "left", "right")
+
+def _code(code: types.CodeType) -> tuple:
+    consts = tuple(_code(const) if isinstance(const, types.CodeType) else const for const in code.co_consts)
+    return (code.co_code, consts, code.co_names)
+
+def _filled(cell) -> bool:
+    try:
+        cell.cell_contents
+        return True
+    except ValueError:
+        return False
+
+def signature(value: Any, shallow: bool = False) -> Any:
+    """Something that compares equal for two objects built by two runs of
+    the same config: functions compare by their code, kept objects by their
+    name and everything else by its attributes. Shallow signatures only look
+    at values, containers and functions, the other objects an object made
+    for itself only compare by their type."""
+    kept = {id(kept_value): name for name, (_, kept_value) in _kept.items()}
+    return _signature(value, shallow, kept, set(), 0)
+
+def _signature(value: Any, shallow: bool, kept: Dict[int, str], path: set, depth: int) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool, bytes)):
+        return value
+    if id(value) in kept:
+        # A kept object that was made anew is a different one
+        return ("kept", kept[id(value)], id(value))
+    if id(value) in path or depth > 12:
+        return ("cycle",)
+
+    def inner(item: Any) -> Any:
+        return _signature(item, shallow, kept, path, depth + 1)
+
+    path.add(id(value))
+    try:
+        if isinstance(value, PersistentDict):
+            return ("stored", value.key)
+        if isinstance(value, (list, tuple)):
+            return (type(value).__name__, tuple(inner(item) for item in value))
+        if isinstance(value, (set, frozenset)):
+            return (type(value).__name__, tuple(sorted(repr(inner(item)) for item in value)))
+        if isinstance(value, dict):
+            return ("dict", tuple(sorted((repr(key), inner(item)) for key, item in value.items())))
+        if isinstance(value, type):
+            return ("type", value.__module__, value.__qualname__)
+        if isinstance(value, types.ModuleType):
+            return ("module", value.__name__)
+        if isinstance(value, enum.Enum):
+            return ("enum", type(value).__qualname__, value.name)
+        if isinstance(value, re.Pattern):
+            return ("pattern", value.pattern, value.flags)
+        if isinstance(value, types.MethodType):
+            return ("method", inner(value.__self__), value.__func__.__qualname__)
+        if isinstance(value, types.FunctionType):
+            closure = tuple(inner(cell.cell_contents) for cell in value.__closure__ or () if _filled(cell))
+            return ("function", value.__module__, value.__qualname__, _code(value.__code__), inner(value.__defaults__), closure)
+        attributes = getattr(value, "__dict__", None)
+        if shallow and depth > 0:
+            return ("object", type(value).__module__, type(value).__qualname__)
+        if attributes is None:
+            return ("id", type(value).__qualname__, id(value))
+        return ("object", type(value).__module__, type(value).__qualname__, inner(attributes))
+    finally:
+        path.discard(id(value))
+
+def _recording_new(cls, *args, **kwargs):
+    widget = object.__new__(cls)
+    # What the widget was built from. Its attributes aren't comparable:
+    # defaults are filled in when first read, with the widget_defaults of
+    # that moment, and some widgets note the time they were made.
+    widget._reload_args = (args, kwargs)
+    return widget
+
+if "__new__" not in vars(_Widget):
+    _Widget.__new__ = staticmethod(_recording_new)
+
+def widget_signature(widget: Any) -> Any:
+    """A widget as it was built, looking at its arguments and not at the
+    state it made for itself"""
+    built = vars(widget).get("_reload_args")
+    if built is None:
+        return ("widget", type(widget).__module__, type(widget).__qualname__, signature(vars(widget), shallow=True))
+    return ("widget", type(widget).__module__, type(widget).__qualname__, signature(built))
+
+# }}}
+
+# ================================== Reloader ============================== {{{
+
+class Phases:
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self._last                           = time.perf_counter()
+        self._start                          = self._last
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        return "{:.0f}ms ({})".format(
+            (self._last - self._start) * 1000,
+            ", ".join("{} {:.1f}ms".format(name, duration * 1000) for name, duration in self.phases),
+        )
+
+ReloadListener = Callable[[Any], None]
+
+class Reloader:
+    # Reloads config.py without throwing qtile's state away.
+    #
+    # The config runs again in its namespace and what it built is compared
+    # with what the last run built. Only the keys that changed are grabbed
+    # again, only the widgets and bars that changed are rebuilt, and the
+    # subsystems made with keep() are the ones that already run. No startup
+    # hook fires, so autostart_always doesn't start anything twice.
+    #
+    # When a group, a layout, the mouse or one of the modules next to
+    # config.py changed, it falls back to qtile's reload_config. Running the
+    # config for that closes everything keep() made before.
+
+    def __init__(self, module: str = "config", report: Optional[Callable[[str], None]] = None):
+        self.module = module
+        self.report = report
+
+        self.keys: List[Tuple[Any, Any]]        = []
+        self.mouse: Any                         = None
+        self.structure: Any                     = None
+        # (screen index, position) -> (bar, signature, widgets, widget signatures)
+        self.bars: Dict[Tuple[int, str], tuple] = {}
+        self.mtimes: Dict[str, float]           = {}
+        self._grabbed                           = 0
+        self._listeners: List[ReloadListener]   = []
+
+        if not _generation["incremental"]:
+            # qtile runs the config anew, nothing of the last run is used.
+            # It runs it twice per load, the second time right after the
+            # first (as a module next to config.py, then as the config), so
+            # the hooks weren't cleared in between.
+            module = sys.modules.get(self.module)
+            if module is not None:
+                _drop_subscribers(vars(module))
+            for name in list(_kept):
+                value = _kept.pop(name)[1]
+                _unsubscribe_owner(value)
+                _close(value)
+            _registered.clear()
+        _generation["created"] = []
+        _generation["used"]    = set()
+
+    # ------------------------------- Keeping ----------------------------- {{{{
+
+    def keep(self, name: str, factory: Callable, *args, **kwargs) -> Any:
+        """factory(*args, **kwargs), or what the last run got from it when
+        the arguments didn't change"""
+        _generation["used"].add(name)
+        sig   = signature((factory, args, kwargs))
+        entry = _kept.get(name)
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+        with _recording() as added:
+            value = factory(*args, **kwargs)
+        _register(value, added)
+        # The one it replaces is closed once the run finished
+        _generation["created"].append(entry)
+        _kept[name] = (sig, value)
+        return value
+
+    def subscribe(self, listener: ReloadListener) -> None:
+        """Called with every bar that was rebuilt or had widgets replaced"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    # }}}}
+
+    # ------------------------------ Snapshot ----------------------------- {{{{
+
+    def loaded(self, namespace: Dict[str, Any]) -> None:
+        """Records what the config built, called at its end before qtile
+        configures any of it"""
+        self.keys      = [(signature(key), key) for key in namespace.get("keys", [])]
+        self.mouse     = signature(namespace.get("mouse", []))
+        self.structure = signature([namespace.get(name) for name in STRUCTURE])
+        self.bars      = {}
+        for index, screen in enumerate(namespace.get("screens", [])):
+            for position in POSITIONS:
+                gap = getattr(screen, position, None)
+                if gap is None:
+                    continue
+                widgets = list(getattr(gap, "widgets", ()))
+                self.bars[(index, position)] = (
+                    gap,
+                    signature((type(gap), getattr(gap, "initial_size", None), getattr(gap, "_user_config", None))),
+                    widgets,
+                    [widget_signature(widget) for widget in widgets],
+                )
+        self.mtimes = _module_mtimes(os.path.dirname(os.path.abspath(namespace["__file__"])), self.module)
+
+        for entry in _generation["created"]:
+            if entry is not None:
+                _unsubscribe_owner(entry[1])
+                _close(entry[1])
+        for name in [name for name in _kept if name not in _generation["used"]]:
+            _unsubscribe_owner(_kept[name][1])
+            _close(_kept.pop(name)[1])
+        _generation["created"] = []
+
+    # }}}}
+
+    # ------------------------------ Reloading ---------------------------- {{{{
+
+    def reload(self, qtile, full: bool = False) -> None:
+        phases = Phases()
+        module = sys.modules.get(self.module)
+        if full or module is None:
+            return self._full(qtile, "asked for" if full else "{} is not loaded".format(self.module))
+        changed = [
+            name for name, mtime in _module_mtimes(os.path.dirname(os.path.abspath(module.__file__)), self.module).items()
+            if self.mtimes.get(name) != mtime
+        ]
+        if changed:
+            return self._full(qtile, "{} changed".format(", ".join(sorted(changed))))
+        try:
+            with open(module.__file__) as f:
+                code = compile(f.read(), module.__file__, "exec")
+        except (OSError, SyntaxError) as e:
+            self._report("reload: {}".format(e))
+            return
+        phases.mark("check")
+
+        new = self._run(module, code)
+        if new is None:
+            return
+        phases.mark("run")
+        if new.structure != self.structure or new.mouse != self.mouse:
+            # Groups and layouts hold the windows, rebuilding them is up to qtile
+            return self._full(qtile, "groups, layouts or the mouse changed")
+
+        # Objects of the new run -> (the object, the running one it is the
+        # same as). Holds on to the new ones, their ids are looked up later.
+        running: Dict[int, Tuple[Any, Any]] = {}
+
+        def swap(value: Any) -> Any:
+            entry = running.get(id(value))
+            return entry[1] if entry is not None else value
+
+        keys = self._keys(qtile, new, running)
+        phases.mark("keys")
+        changed_bars = self._bars(qtile, new, running)
+        phases.mark("bars")
+
+        namespace = module.__dict__
+        for name, value in list(namespace.items()):
+            namespace[name] = swap(value)
+        # e.g. the frame scheduler's unmanaged widgets
+        for _, value in _kept.values():
+            for attribute in getattr(value, "__dict__", {}).values():
+                if isinstance(attribute, list):
+                    attribute[:] = [swap(item) for item in attribute]
+        namespace["keys"] = keys
+        # Screens past the ones the config has are qtile's own
+        namespace["screens"] = qtile.screens[:len(namespace.get("screens", []))] or namespace.get("screens", [])
+        qtile.config.update(**{name: value for name, value in namespace.items() if not name.startswith("_")})
+        _Widget.global_defaults = qtile.config.widget_defaults
+
+        # Kept objects that were made anew are attached as on startup
+        created = [value for _, value in _kept.values() if id(value) in _generation["fresh"]]
+        for subscriber in list(hook.subscriptions.get("startup", [])):
+            for value in created:
+                if getattr(subscriber, "__self__", None) is value:
+                    with _recording() as added:
+                        subscriber()
+                    _register(value, added)
+        for bar in changed_bars:
+            for listener in list(new._listeners):
+                listener(bar)
+
+        # The next reload compares with what runs now
+        new.keys = [(sig, key) for (sig, _), key in zip(new.keys, keys)]
+        for position, (bar, sig, widgets, sigs) in list(new.bars.items()):
+            new.bars[position] = (swap(bar), sig, [swap(widget) for widget in widgets], sigs)
+        phases.mark("apply")
+
+        self._report("reload: {}, {} keys and {} bars changed".format(phases.report(), self._grabbed, len(changed_bars)))
+
+    def _run(self, module, code) -> Optional["Reloader"]:
+        """Runs the config in its module again. The functions it defined
+        before see what the new run defines, the same as with
+        importlib.reload. Everything is put back when it fails."""
+        namespace = module.__dict__
+        saved     = dict(namespace)
+        hooks     = {event: list(subscribers) for event, subscribers in hook.subscriptions.items()}
+        kept      = dict(_kept)
+        listeners = _drop_subscribers(namespace)
+        _generation["incremental"] = True
+        try:
+            exec(code, namespace)
+            new = namespace.get("reloader")
+            if not isinstance(new, Reloader):
+                raise RuntimeError("the config has no reloader")
+        except Exception as e:
+            logger.exception("reload: running the config failed")
+            namespace.clear()
+            namespace.update(saved)
+            hook.subscriptions.clear()
+            hook.subscriptions.update(hooks)
+            for attribute, items in listeners:
+                attribute[:] = items
+            for name, (_, value) in _kept.items():
+                if kept.get(name, (None, None))[1] is not value:
+                    _close(value)
+            _kept.clear()
+            _kept.update(kept)
+            self._report("reload: {}".format(e))
+            return None
+        finally:
+            _generation["incremental"] = False
+        _generation["fresh"] = {id(value) for name, (_, value) in _kept.items() if kept.get(name, (None, None))[1] is not value}
+        return new
+
+    def _full(self, qtile, reason: str) -> None:
+        logger.info("reload: %s, reloading everything", reason)
+        qtile.cmd_reload_config()
+
+    def _report(self, text: str) -> None:
+        logger.info(text)
+        if self.report is not None:
+            self.report(text)
+
+    # }}}}
+
+    # ------------------------------- Keys -------------------------------- {{{{
+
+    def _keys(self, qtile, new: "Reloader", running: Dict[int, Tuple[Any, Any]]) -> List[Any]:
+        if qtile.chord_stack:
+            qtile.cmd_ungrab_all_chords()
+        unused: Dict[str, List[Any]] = {}
+        for sig, key in self.keys:
+            unused.setdefault(repr(sig), []).append(key)
+
+        keys, added = [], []
+        for sig, key in new.keys:
+            same = unused.get(repr(sig))
+            if same:
+                old = same.pop(0)
+                running[id(key)] = (key, old)
+                keys.append(old)
+            else:
+                keys.append(key)
+                added.append(key)
+        removed = [key for same in unused.values() for key in same]
+        for key in removed:
+            try:
+                qtile.ungrab_key(key)
+            except KeyError:
+                # Part of a chord that wasn't entered
+                pass
+        for key in added:
+            qtile.grab_key(key)
+        self._grabbed = len(added) + len(removed)
+        return keys
+
+    # }}}}
+
+    # ------------------------------- Bars -------------------------------- {{{{
+
+    def _bars(self, qtile, new: "Reloader", running: Dict[int, Tuple[Any, Any]]) -> List[Any]:
+        positions = [position for position in sorted(set(self.bars) | set(new.bars)) if position[0] < len(qtile.screens)]
+
+        def same_layout(position) -> bool:
+            old, fresh = self.bars.get(position), new.bars.get(position)
+            return (
+                old is not None and fresh is not None and old[1] == fresh[1]
+                and [type(widget) for widget in old[2]] == [type(widget) for widget in fresh[2]]
+            )
+
+        # A widget on several bars is drawn by the first and mirrored by the
+        # others, bars that share a widget are rebuilt together
+        rebuild = {position for position in positions if not same_layout(position)}
+        grown   = True
+        while grown:
+            grown  = False
+            shared = {id(widget) for position in rebuild if position in self.bars for widget in self.bars[position][2]}
+            for position in positions:
+                if position not in rebuild and position in self.bars and shared.intersection(id(widget) for widget in self.bars[position][2]):
+                    rebuild.add(position)
+                    grown = True
+
+        changed = []
+        for position in positions:
+            if position in rebuild:
+                continue
+            old, fresh = self.bars[position], new.bars[position]
+            bar        = old[0]
+            running[id(fresh[0])] = (fresh[0], bar)
+            replaced = False
+            for slot, (old_sig, new_sig) in enumerate(zip(old[3], fresh[3])):
+                if old_sig == new_sig:
+                    running[id(fresh[2][slot])] = (fresh[2][slot], old[2][slot])
+                    continue
+                widget = fresh[2][slot]
+                if widget.configured:
+                    # Already drawn on another bar
+                    widget = widget.create_mirror()
+                _finalize_widget(qtile, bar.widgets[slot])
+                bar.widgets[slot] = widget
+                with _recording() as added:
+                    configured = bar._configure_widget(widget)
+                _register(widget, added)
+                if configured:
+                    qtile.register_widget(widget)
+                replaced = True
+            if replaced:
+                bar._resize(bar.length, bar.widgets)
+                bar.draw()
+                changed.append(bar)
+
+        for position in positions:
+            if position not in rebuild:
+                continue
+            screen     = qtile.screens[position[0]]
+            old, fresh = self.bars.get(position), new.bars.get(position)
+            size       = old[0].size if old is not None else 0
+            if old is not None:
+                for widget in list(old[0].widgets):
+                    _finalize_widget(qtile, widget)
+                _finalize_bar(old[0])
+            bar = fresh[0] if fresh is not None else None
+            if bar is not None:
+                # Widgets that stay on a bar that isn't rebuilt are mirrored
+                bar.widgets[:] = [running[id(widget)][1] if id(widget) in running else widget for widget in bar.widgets]
+            setattr(screen, position[1], bar)
+            # What the widgets subscribe is dropped when the bar is, ones
+            # that are replaced on their own drop what closes over them
+            with _recording() as added:
+                if (bar.initial_size if bar is not None else 0) != size:
+                    # The windows get the space the bar had, or make room for it
+                    screen._configure(qtile, screen.index, screen.x, screen.y, screen.width, screen.height, screen.group, reconfigure_gaps=True)
+                    screen.group.layout_all()
+                elif bar is not None:
+                    bar._configure(qtile, screen)
+            if bar is not None:
+                _register(bar, added)
+                changed.append(bar)
+        return changed
+
+    # }}}}
+
+# }}}
+
+# ================================== Helpers =============================== {{{
+
+def _module_mtimes(directory: str, config: str) -> Dict[str, float]:
+    mtimes = {}
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name == config or not path or os.path.dirname(os.path.abspath(path)) != directory:
+            continue
+        try:
+            mtimes[name] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    return mtimes
+
+def _close(value: Any) -> None:
+    close = getattr(value, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            logger.exception("reload: closing %s failed", type(value).__name__)
+
+def _finalize_widget(qtile, widget) -> None:
+    for name, registered in list(qtile.widgets_map.items()):
+        if registered is widget:
+            del qtile.widgets_map[name]
+    try:
+        widget.finalize()
+    except Exception:
+        logger.exception("reload: finalizing %s failed", widget.name)
+    _unsubscribe_owner(widget)
+
+@contextlib.contextmanager
+def _recording():
+    """Collects the hook subscriptions made inside the block"""
+    before = {event: list(subscribers) for event, subscribers in hook.subscriptions.items()}
+    added: List[Tuple[str, Any]] = []
+    try:
+        yield added
+    finally:
+        for event, subscribers in hook.subscriptions.items():
+            added.extend((event, s) for s in subscribers if s not in before.get(event, ()))
+
+def _register(owner: Any, added: List[Tuple[str, Any]]) -> None:
+    if added:
+        _registered.setdefault(id(owner), (owner, []))[1].extend(added)
+
+def _owned(subscriber: Any, owner: Any, depth: int = 0) -> bool:
+    """Whether a subscriber belongs to owner: one of its methods, or a
+    function that closes over it or one of its methods, the way qtile's
+    widgets subscribe (GroupBox, Prompt, CurrentLayout, ...)"""
+    if getattr(subscriber, "__self__", None) is owner:
+        return True
+    if isinstance(subscriber, functools.partial):
+        return any(value is owner for value in subscriber.args) or _owned(subscriber.func, owner, depth)
+    function = getattr(subscriber, "__func__", subscriber)
+    if any(value is owner for value in getattr(function, "__defaults__", None) or ()):
+        return True
+    for cell in getattr(function, "__closure__", None) or ():
+        if not _filled(cell):
+            continue
+        value = cell.cell_contents
+        if value is owner or (depth < 2 and callable(value) and _owned(value, owner, depth + 1)):
+            return True
+    return False
+
+def _unsubscribe_owner(owner: Any) -> None:
+    _, registered = _registered.pop(id(owner), (None, []))
+    for event, subscribers in hook.subscriptions.items():
+        subscribers[:] = [s for s in subscribers if not _owned(s, owner) and (event, s) not in registered]
+
+def _finalize_bar(bar) -> None:
+    # Bar.finalize, except that the frame scheduler may have kept the bar
+    # from ever scheduling a draw of its own
+    if bar.future is not None:
+        bar.future.cancel()
+    if bar.window is not None:
+        bar.drawer.finalize()
+        bar.window.kill()
+        bar.window = None
+    bar.widgets.clear()
+    _unsubscribe_owner(bar)
+
+def _drop_subscribers(namespace: Dict[str, Any]) -> List[Tuple[list, list]]:
+    """Unsubscribes the functions the config defined from the hooks and from
+    the listeners of kept objects, the new run subscribes them again. Returns
+    the listener lists as they were."""
+    def own(subscriber) -> bool:
+        return getattr(subscriber, "__globals__", None) is namespace
+
+    for subscribers in hook.subscriptions.values():
+        subscribers[:] = [s for s in subscribers if not own(s)]
+    saved = []
+    for _, value in _kept.values():
+        for attribute in getattr(value, "__dict__", {}).values():
+            if isinstance(attribute, list) and any(own(item) for item in attribute):
+                saved.append((attribute, list(attribute)))
+                attribute[:] = [item for item in attribute if not own(item)]
+    return saved
+
+# }}}
@@ -0,0 +1,239 @@
+#  ================================== Imports ============================== {{{
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from libqtile import layout
+from libqtile.config import Match
+
+import eventloop
+
+# }}}
+
+# ================================= Properties ============================= {{{
+
+def fetch(window, needed: Set[str]) -> Dict[str, Any]:
+    # Every getter is a round trip to the X server, so each property is read
+    # at most once per window however many rules look at it
+    props: Dict[str, Any] = {}
+    if "title" in needed:
+        props["title"] = window.name
+    if "wm_class" in needed or "wm_instance_class" in needed:
+        wm_class = window.get_wm_class()
+        props["wm_class"] = tuple(wm_class) if wm_class else None
+        props["wm_instance_class"] = wm_class[0] if wm_class else None
+    if "role" in needed:
+        props["role"] = window.get_wm_role()
+    if "wm_type" in needed:
+        props["wm_type"] = window.get_wm_type()
+    if "net_wm_pid" in needed:
+        props["net_wm_pid"] = window.get_pid()
+    if "wid" in needed:
+        props["wid"] = window.wid
+    return props
+
+# Group rules and float rules ask about the same new window within one map
+# request, the properties are shared until the event loop comes around again
+_properties: Dict[int, Dict[str, Any]] = {}
+_clear_handle                          = None
+
+def _clear() -> None:
+    global _clear_handle
+    _properties.clear()
+    _clear_handle = None
+
+def _clear_soon() -> None:
+    global _clear_handle
+    if _clear_handle is None:
+        _clear_handle = eventloop.call_soon(_clear)
+
+# }}}
+
+# ================================== Compiler ============================== {{{
+
+# Longer include-match strings are compared directly instead of expanding all
+# of their substrings
+MAX_EXPANDED = 64
+
+def substrings(value: str) -> Set[str]:
+    return {value[i:j] for i in range(len(value) + 1) for j in range(i, len(value) + 1)}
+
+class Check(NamedTuple):
+    prop: str
+    # "set": the window value must be in `data`, "contains": the window value
+    # must be a substring of `data`, "regex": data.match(value), "func": data(window)
+    kind: str
+    data: Any
+
+    def test(self, props: Dict[str, Any], window) -> bool:
+        if self.kind == "func":
+            return bool(self.data(window))
+        value = props.get(self.prop)
+        if value is None:
+            return False
+        # wm_class matches when any of the window's classes does
+        values = value if self.prop == "wm_class" else (value,)
+        if self.kind == "set":
+            return any(v in self.data for v in values)
+        if self.kind == "contains":
+            return any(v in self.data for v in values if isinstance(v, str))
+        return any(self.data.match(v) for v in values)
+
+def compile_check(prop: str, rule: Any) -> Check:
+    # Mirrors Match.compare: strings are include-matches (the window value is
+    # a substring of the rule), other containers are exact, pids and window
+    # ids are exact, anything with a match method is a regex
+    if prop == "func":
+        return Check(prop, "func", rule)
+    if prop in ("net_wm_pid", "wid"):
+        return Check(prop, "set", frozenset([rule]))
+    if hasattr(rule, "match"):
+        return Check(prop, "regex", rule)
+    if isinstance(rule, str):
+        if len(rule) <= MAX_EXPANDED:
+            return Check(prop, "set", frozenset(substrings(rule)))
+        return Check(prop, "contains", rule)
+    try:
+        return Check(prop, "set", frozenset(rule))
+    except TypeError:
+        return Check(prop, "contains", rule)
+
+class CompiledRule(NamedTuple):
+    index: int
+    target: str
+    match: Match
+    checks: Tuple[Check, ...]
+
+class RuleHit(NamedTuple):
+    target: str
+    index: int
+    match: Match
+
+class RuleEngine:
+    # Compiles lists of Match objects into a dispatch table. Every rule with a
+    # hashable check is indexed under that check's values, so a window only
+    # looks at the rules one of its property values points to; the regexes of
+    # the remaining rules are merged into one alternation per property that
+    # rejects most windows in a single match call. Candidates are verified in
+    # rule order, so the result is the same as checking the rules one by one.
+
+    def __init__(self, rules: Sequence[Tuple[str, Sequence[Match]]]):
+        self.rules                                     = [(target, list(matches)) for target, matches in rules]
+        self.compiled: List[CompiledRule]              = []
+        self.table: Dict[str, Dict[Any, List[int]]]    = {}
+        self.regexes: List[Tuple[str, Any, List[int]]] = []
+        self.scan: List[int]                           = []
+        self.needed: Set[str]                          = set()
+
+        self._compile()
+
+    def _compile(self) -> None:
+        patterns: Dict[Tuple[str, int], List[Tuple[int, Any]]] = {}
+        for target, matches in self.rules:
+            for match in matches:
+                index  = len(self.compiled)
+                checks = []
+                for prop, rule in match._rules.items():
+                    checks.append(compile_check(prop, rule))
+                    # Match.compare returns the result of func right away,
+                    # rules after it are never looked at
+                    if prop == "func":
+                        break
+                self.compiled.append(CompiledRule(index, target, match, tuple(checks)))
+                self.needed.update(check.prop for check in checks if check.kind != "func")
+                if not checks:
+                    # Match() without rules never matches
+                    continue
+
+                key = next((check for check in checks if check.kind == "set"), None)
+                if key is not None:
+                    table = self.table.setdefault(key.prop, {})
+                    for value in key.data:
+                        table.setdefault(value, []).append(index)
+                    continue
+                key = next((check for check in checks if check.kind == "regex"), None)
+                if key is not None:
+                    patterns.setdefault((key.prop, key.data.flags), []).append((index, key.data))
+                else:
+                    self.scan.append(index)
+
+        for (prop, flags), entries in patterns.items():
+            try:
+                merged = re.compile("|".join("(?:{})".format(regex.pattern) for _, regex in entries), flags)
+            except (re.error, TypeError):
+                # Inline flags or bytes patterns can't be merged
+                self.scan.extend(index for index, _ in entries)
+                continue
+            self.regexes.append((prop, merged, [index for index, _ in entries]))
+
+    # ------------------------------ Matching ----------------------------- {{{{
+
+    def properties(self, window) -> Dict[str, Any]:
+        props   = _properties.setdefault(window.wid, {})
+        missing = self.needed - props.keys()
+        if missing:
+            props.update(fetch(window, missing))
+            _clear_soon()
+        return props
+
+    def candidates(self, props: Dict[str, Any]) -> List[int]:
+        found = list(self.scan)
+        for prop, table in self.table.items():
+            value = props.get(prop)
+            if value is None:
+                continue
+            for v in (value if prop == "wm_class" else (value,)):
+                found.extend(table.get(v, ()))
+        for prop, merged, indexes in self.regexes:
+            value = props.get(prop)
+            if value is None:
+                continue
+            if any(isinstance(v, str) and merged.match(v) for v in (value if prop == "wm_class" else (value,))):
+                found.extend(indexes)
+        return sorted(set(found))
+
+    def explain(self, window, props: Optional[Dict[str, Any]] = None) -> Optional[RuleHit]:
+        """Dry run: the first rule matching the window, without acting on it"""
+        if props is None:
+            props = self.properties(window)
+        for index in self.candidates(props):
+            rule = self.compiled[index]
+            if all(check.test(props, window) for check in rule.checks):
+                return RuleHit(rule.target, index, rule.match)
+        return None
+
+    def target(self, window) -> Optional[str]:
+        hit = self.explain(window)
+        return None if hit is None else hit.target
+
+    def matcher(self, target: str) -> Match:
+        """A Match that is true for windows whose first matching rule belongs to `target`"""
+        return Match(func=lambda window: self.target(window) == target)
+
+    # }}}}
+
+# }}}
+
+# =================================== Config =============================== {{{
+
+def compile_group_matches(groups: Sequence) -> RuleEngine:
+    # Replaces the matches of every group with a single Match backed by one
+    # engine, qtile then asks that engine once per group instead of walking
+    # all Match objects of all groups
+    engine = RuleEngine([(group.name, group.matches) for group in groups if group.matches])
+    for group in groups:
+        if group.matches:
+            group.matches = [engine.matcher(group.name)]
+    return engine
+
+class CompiledFloating(layout.Floating):
+    """Floating layout that checks its float_rules through a RuleEngine"""
+
+    def __init__(self, float_rules: Optional[List[Match]] = None, no_reposition_rules=None, **config):
+        layout.Floating.__init__(self, float_rules, no_reposition_rules, **config)
+        self.engine = RuleEngine([("float", self.float_rules)])
+
+    def match(self, win):
+        return self.engine.explain(win) is not None
+
+# }}}
@@ -0,0 +1,88 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import inspect
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
+
+from libqtile.log_utils import logger
+
+import eventloop
+import processes
+
+# }}}
+
+# ================================== Session =============================== {{{
+
+# Called when the session is locked or unlocked, may return an awaitable that
+# has to finish before the next step, e.g. a helper that has to exit first
+SessionHook = Callable[[], Union[None, Awaitable]]
+
+class Session:
+    # Locks the screen. Everything that keeps polling or drawing while nobody
+    # can see it (bar timers, samplers, update checks, helpers) is registered
+    # with add() and suspended, in order, before the lockers run. Once the
+    # last locker exits they are resumed in reverse order, each catching up
+    # once.
+
+    def __init__(self, lockers: List[List[str]]):
+        # Commands run one after the other, the session is unlocked when the
+        # last one exits
+        self.lockers = lockers
+
+        self.parts: List[Tuple[str, SessionHook, SessionHook]] = []
+        self.locked_at: Optional[float]                        = None
+        self._task: Optional[asyncio.Task]                     = None
+
+    @property
+    def locked(self) -> bool:
+        return self.locked_at is not None
+
+    def add(self, name: str, suspend: SessionHook, resume: SessionHook) -> None:
+        # The config adds its parts again every time it is reloaded
+        self.parts = [part for part in self.parts if part[0] != name]
+        self.parts.append((name, suspend, resume))
+
+    async def _call(self, name: str, func: SessionHook) -> None:
+        try:
+            result = func()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            # One broken part must not keep the screen from locking or unlocking
+            logger.exception("session: %s failed", name)
+
+    async def suspend(self) -> None:
+        for name, suspend, _ in self.parts:
+            await self._call(name, suspend)
+
+    async def resume(self) -> None:
+        for name, _, resume in reversed(self.parts):
+            await self._call(name, resume)
+
+    async def lock(self) -> None:
+        if self.locked:
+            return
+        self.locked_at = time.monotonic()
+        try:
+            await self.suspend()
+            for argv in self.lockers:
+                try:
+                    child = processes.spawn(argv)
+                except OSError as e:
+                    logger.warning("session: unable to run %s: %s", argv[0], e)
+                    continue
+                await child.exited
+                if child.returncode:
+                    logger.warning("session: %s exited with %s", argv[0], child.returncode)
+        finally:
+            await self.resume()
+            logger.info("session: locked for %.0fs", time.monotonic() - self.locked_at)
+            self.locked_at = None
+
+    def lock_soon(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = eventloop.get_loop().create_task(self.lock())
+        return self._task
+
+# }}}
@@ -0,0 +1,95 @@
+#!/bin/env python3
+
+# Spawn helper for the qtile config, see spawner.py. Runs as a separate, small
+# interpreter so that starting a program never has to copy qtile's page
+# tables. Only the standard library is imported here.
+#
+#     spawn_server.py <fd>
+#
+# <fd> is a SOCK_SEQPACKET socket. Every packet is a JSON request
+# {"id": n, "argv": [...], "env": {...} | null, "cwd": "..." | null}, every
+# reply {"id": n, "pid": pid} or {"id": n, "error": "..."}. The server exits
+# when the other end of the socket is closed.
+
+#  ================================== Imports ============================== {{{
+
+import json
+import os
+import signal
+import socket
+import sys
+
+# }}}
+
+# =================================== Server =============================== {{{
+
+MAX_REQUEST = 1 << 20
+
+def spawn(request: dict, base_env: dict, base_cwd: str) -> int:
+    argv = [os.path.expanduser(arg) for arg in request["argv"]]
+    env  = base_env
+    if request.get("env"):
+        env = dict(base_env)
+        env.update(request["env"])
+
+    cwd = request.get("cwd")
+    if cwd:
+        # posix_spawn has no chdir action before Python 3.13, the server is
+        # single threaded so changing its own directory is safe
+        os.chdir(os.path.expanduser(cwd))
+    try:
+        return os.posix_spawnp(
+            argv[0],
+            argv,
+            env,
+            setsid=True,
+            # Ignored signals stay ignored across exec
+            setsigdef=(signal.SIGCHLD, signal.SIGPIPE),
+        )
+    finally:
+        if cwd:
+            # Programs started without a cwd get qtile's, usually $HOME
+            os.chdir(base_cwd)
+
+def serve(sock: socket.socket) -> None:
+    base_env = dict(os.environ)
+    # If qtile runs from a virtualenv, don't leak it into applications
+    base_env.pop("VIRTUAL_ENV", None)
+    base_cwd = os.getcwd()
+
+    while True:
+        try:
+            data = sock.recv(MAX_REQUEST)
+        except InterruptedError:
+            continue
+        if not data:
+            return
+
+        reply = {}
+        try:
+            request      = json.loads(data)
+            reply["id"]  = request.get("id")
+            reply["pid"] = spawn(request, base_env, base_cwd)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            reply["error"] = str(e)
+        try:
+            sock.send(json.dumps(reply).encode())
+        except OSError:
+            return
+
+def main() -> None:
+    # The kernel reaps the children, qtile never waits on programs it starts
+    # from key bindings
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    try:
+        serve(sock)
+    finally:
+        sock.close()
+
+if __name__ == "__main__":
+    main()
+
+# }}}
@@ -0,0 +1,148 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+from typing import Dict, List, Optional, Union
+
+from libqtile.log_utils import logger
+
+import eventloop
+import processes
+
+# }}}
+
+# ================================ Spawn Server ============================ {{{
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spawn_server.py")
+
+class SpawnServer:
+    # Starts programs for key bindings through spawn_server.py. Forking qtile
+    # copies the page tables of everything it has grown into (widgets,
+    # layouts, graph histories), the server is a fresh interpreter of a few
+    # megabytes that uses posix_spawn. Requests are written to a socket and
+    # answered asynchronously, so a key press never waits for the exec. When
+    # the server is gone, programs are started directly instead.
+
+    def __init__(self):
+        self.child: Optional[processes.Child]    = None
+        self.sock: Optional[socket.socket]       = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._requests: Dict[int, dict]          = {}
+        self._next_id                            = 0
+
+    @property
+    def running(self) -> bool:
+        return self.sock is not None and self.child is not None and self.child.running
+
+    def start(self) -> None:
+        if self.running:
+            return
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            # -I -S: no site packages and no user paths, the server only
+            # needs the standard library
+            self.child = processes.spawn(
+                [sys.executable, "-I", "-S", SERVER, str(theirs.fileno())],
+                pass_fds=[theirs.fileno()],
+            )
+        except OSError:
+            logger.exception("Unable to start the spawn server")
+            ours.close()
+            return
+        finally:
+            theirs.close()
+        ours.setblocking(False)
+        self.sock = ours
+        eventloop.add_reader(self.sock.fileno(), self._read)
+        child = self.child
+        child.exited.add_done_callback(lambda _: self._lost(child))
+        logger.debug("Spawn server started as %d", self.child.pid)
+
+    # ------------------------------ Requests ----------------------------- {{{{
+
+    def spawn(self, cmd: Union[str, List[str]], shell: bool = False, env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None) -> asyncio.Future:
+        """Like qtile's spawn command; the future resolves to the pid, or to -1
+        when the program couldn't be started"""
+        if isinstance(cmd, str):
+            argv = ["/bin/sh", "-c", cmd] if shell else shlex.split(cmd)
+        else:
+            argv = ["/bin/sh", "-c", subprocess.list2cmdline(cmd)] if shell else list(cmd)
+        request = {"argv": argv, "env": env, "cwd": cwd}
+
+        future = eventloop.get_loop().create_future()
+        if not self.running:
+            self.start()
+        if self.running:
+            self._next_id += 1
+            request["id"] = self._next_id
+            try:
+                self.sock.send(json.dumps(request).encode())
+            except OSError as e:
+                logger.warning("Spawn server unreachable: %s", e)
+            else:
+                self._pending[request["id"]]  = future
+                self._requests[request["id"]] = request
+                return future
+        future.set_result(self._direct(request))
+        return future
+
+    def _direct(self, request: dict) -> int:
+        kwargs = {}
+        if request.get("env"):
+            kwargs["env"] = dict(os.environ, **request["env"])
+        if request.get("cwd"):
+            kwargs["cwd"] = os.path.expanduser(request["cwd"])
+        try:
+            return processes.spawn(request["argv"], **kwargs).pid
+        except OSError as e:
+            logger.error("Unable to start %s: %s", request["argv"], e)
+            return -1
+
+    def _read(self) -> None:
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                self._lost(self.child)
+                return
+            reply   = json.loads(data)
+            future  = self._pending.pop(reply.get("id"), None)
+            request = self._requests.pop(reply.get("id"), None)
+            if "error" in reply:
+                logger.error("Unable to start %s: %s", request and request["argv"], reply["error"])
+            if future is not None and not future.done():
+                future.set_result(reply.get("pid", -1))
+
+    def _lost(self, child: Optional[processes.Child]) -> None:
+        if self.sock is None or child is not self.child:
+            return
+        logger.warning("Spawn server exited, starting programs directly")
+        self.close()
+
+    def close(self) -> None:
+        if self.sock is not None:
+            eventloop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        # Requests that were not answered are started directly, a key press
+        # must not get lost
+        pending, self._pending = self._pending, {}
+        requests, self._requests = self._requests, {}
+        for request_id, future in pending.items():
+            if not future.done():
+                future.set_result(self._direct(requests[request_id]))
+        # The server exits once its end of the socket reads EOF
+        self.child = None
+
+    # }}}}
+
+# }}}
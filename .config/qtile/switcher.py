@@ -0,0 +1,145 @@
+#  ================================== Imports ============================== {{{
+
+import itertools
+from typing import Callable, Dict
+
+import libqtile
+from libqtile import hook
+
+from completion import Completions
+
+# }}}
+
+# ================================== Windows =============================== {{{
+
+class WindowEntry:
+    def __init__(self, window, wm_class: str):
+        self.window   = window
+        # Fetched once when the window is mapped, it doesn't change
+        self.wm_class = wm_class
+        self.label    = ""
+        # Bumped on focus, the most recently used windows rank first
+        self.focused  = 0
+
+class WindowSwitcher:
+    # Jumps to windows by title, class and group from the prompt. The labels
+    # are kept up to date by window hooks, so opening the switcher reads
+    # nothing from the X server and only has to index the labels again when
+    # a title changed since the last time.
+
+    def __init__(self, registry, show_group: Callable[[str], None], source: str = "windows"):
+        self.registry   = registry
+        self.show_group = show_group
+        self.source     = source
+
+        self.entries: Dict[int, WindowEntry] = {}
+        self.labels: Dict[str, int]          = {}
+        self.completions                     = Completions(command_source=source, whole_line=True)
+        self._focus_counter                  = itertools.count(1)
+
+        self.completions.add_source(source, lambda qtile: list(self.labels), boost=self._boost)
+
+    def attach(self, qtile=None) -> None:
+        qtile = qtile or libqtile.qtile
+        hook.subscribe.client_new(self._window_new)
+        hook.subscribe.client_killed(self._window_killed)
+        hook.subscribe.client_name_updated(self._window_changed)
+        hook.subscribe.client_focus(self._window_focused)
+        hook.subscribe.group_window_add(self._window_moved)
+
+        self.entries.clear()
+        self.labels.clear()
+        for window in qtile.windows_map.values():
+            if getattr(window, "group", None) is not None:
+                self._window_new(window)
+
+    # ------------------------------- Hooks ------------------------------- {{{{
+
+    def _window_new(self, window) -> None:
+        try:
+            wm_class = (window.get_wm_class() or [""])[-1]
+        except Exception:
+            wm_class = ""
+        entry = self.entries[window.wid] = WindowEntry(window, wm_class)
+        self._relabel(entry)
+
+    def _window_killed(self, window) -> None:
+        entry = self.entries.pop(window.wid, None)
+        if entry is not None:
+            self._unlabel(entry)
+
+    def _window_changed(self, window) -> None:
+        entry = self.entries.get(window.wid)
+        if entry is not None:
+            self._relabel(entry)
+
+    def _window_moved(self, group, window) -> None:
+        entry = self.entries.get(window.wid)
+        if entry is not None:
+            self._relabel(entry)
+
+    def _window_focused(self, window) -> None:
+        entry = self.entries.get(window.wid)
+        if entry is not None:
+            entry.focused = next(self._focus_counter)
+
+    # }}}}
+
+    # ------------------------------ Labels ------------------------------- {{{{
+
+    def _label(self, entry: WindowEntry) -> str:
+        group = self.registry.group_of(entry.window)
+        return "{}: {} - {}".format(group.name if group else "-", entry.wm_class, entry.window.name or "")
+
+    def _unlabel(self, entry: WindowEntry) -> None:
+        if self.labels.get(entry.label) == entry.window.wid:
+            del self.labels[entry.label]
+            self.completions.invalidate(self.source)
+
+    def _relabel(self, entry: WindowEntry) -> None:
+        label = self._label(entry)
+        if label in self.labels and self.labels[label] != entry.window.wid:
+            # Two browser windows on the same page
+            label = "{} #{}".format(label, entry.window.wid)
+        if label == entry.label:
+            return
+        self._unlabel(entry)
+        entry.label        = label
+        self.labels[label] = entry.window.wid
+        self.completions.invalidate(self.source)
+
+    def _boost(self) -> Dict[str, float]:
+        return {entry.label: entry.focused for entry in self.entries.values() if entry.focused}
+
+    # }}}}
+
+    # ------------------------------ Jumping ------------------------------ {{{{
+
+    def find(self, text: str):
+        wid = self.labels.get(text)
+        if wid is None:
+            # Enter without completing: the best match of what was typed
+            _, matches = self.completions.complete(text)
+            if not matches:
+                return None
+            wid = self.labels[matches[0]]
+        return self.entries[wid].window
+
+    def switch(self, text: str) -> bool:
+        window = self.find(text)
+        if window is None:
+            return False
+        group = self.registry.group_of(window) or window.group
+        if group is None:
+            return False
+        qtile = self.registry.qtile
+        if group.screen is None:
+            self.show_group(group.name)
+        elif group.screen is not qtile.current_screen:
+            qtile.focus_screen(group.screen.index)
+        group.focus(window, warp=True)
+        return True
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules of the config import each other by name, the way qtile puts the
+# config directory on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("libqtile")
+
+from backlight import Backlight
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+@pytest.fixture
+def sysfs(tmp_path, monkeypatch):
+    # sysfs replaces the value on every write, where a plain file keeps
+    # what a shorter value didn't overwrite
+    pwrite = os.pwrite
+
+    def replace(fd, data, offset):
+        os.ftruncate(fd, 0)
+        return pwrite(fd, data, offset)
+
+    monkeypatch.setattr(os, "pwrite", replace)
+
+    # A backlight device as /sys/class/backlight lists it
+    device = tmp_path / "intel_backlight"
+    device.mkdir()
+    (device / "type").write_text("raw\n")
+    (device / "max_brightness").write_text("255\n")
+    (device / "brightness").write_text("100\n")
+    (device / "actual_brightness").write_text("100\n")
+    return tmp_path, device
+
+@pytest.fixture
+def backlight(loop, sysfs):
+    root, _ = sysfs
+    backlight = Backlight(root=str(root))
+    yield backlight
+    backlight.close()
+
+def brightness(device) -> int:
+    return int((device / "brightness").read_text())
+
+def test_found(backlight, sysfs):
+    _, device = sysfs
+    assert backlight.device == str(device)
+    assert (backlight.max_brightness, backlight.brightness) == (255, 100)
+
+@pytest.mark.parametrize("percent, expected", [(150, 255), (100, 255), (50, 128), (0, 1), (-20, 1)])
+def test_set_clamps(backlight, sysfs, percent, expected):
+    _, device = sysfs
+    backlight.set(percent)
+    backlight.flush()
+    assert brightness(device) == expected
+    assert backlight.brightness == expected
+
+def test_steps_round_and_add_up(backlight, sysfs):
+    _, device = sysfs
+    # 100 of 255 is 39.2%, plus 5% is 112.7
+    backlight.step(5)
+    backlight.flush()
+    assert brightness(device) == 113
+
+    # Steps queued within one frame are one write
+    backlight.step(3)
+    backlight.step(-1)
+    backlight.flush()
+    assert brightness(device) == round(255 * (100 * 113 / 255 + 2) / 100)
+
+def test_steps_clamp(backlight, sysfs):
+    _, device = sysfs
+    backlight.step(-100)
+    backlight.flush()
+    assert brightness(device) == 1
+    backlight.step(500)
+    backlight.flush()
+    assert brightness(device) == 255
+
+def test_write_failure(backlight, sysfs, caplog):
+    _, device = sysfs
+    # A descriptor that can't be written to, as when the driver rejects
+    # the value
+    os.close(backlight._fd)
+    backlight._fd = os.open(device / "brightness", os.O_RDONLY)
+    (device / "actual_brightness").write_text("90\n")
+
+    with caplog.at_level(logging.ERROR, logger="libqtile"):
+        backlight.set(80)
+        backlight.flush()
+
+    assert "Unable to set backlight" in caplog.text
+    assert brightness(device) == 100
+    # What the panel shows is what the next step starts from
+    assert (backlight.brightness, backlight.target) == (90, 90)
+
+def test_write_failure_ends_ramp(loop, sysfs):
+    root, device = sysfs
+    backlight = Backlight(root=str(root), ramp=1.0)
+    os.close(backlight._fd)
+    backlight._fd = os.open(device / "brightness", os.O_RDONLY)
+
+    backlight.set(80)
+    backlight.flush()
+    loop.run_until_complete(asyncio.sleep(0.1))
+    assert backlight._ramp_handle is None
+    assert backlight.brightness == 100
+    backlight.close()
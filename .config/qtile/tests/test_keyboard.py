@@ -0,0 +1,128 @@
+import asyncio
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("libqtile")
+pytest.importorskip("dbus_next")
+
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, method, signal
+
+import keyboard
+from keyboard import FCITX_INTERFACE, FCITX_PATH, FCITX_SERVICE, KeyboardLayouts
+
+class Controller(ServiceInterface):
+    # Stands in for fcitx5's controller, only what the service uses
+
+    def __init__(self):
+        super().__init__(FCITX_INTERFACE)
+        self.group    = "us"
+        self.switches = []
+
+    @method()
+    def CurrentInputMethodGroup(self) -> "s":
+        return self.group
+
+    @method()
+    def SwitchInputMethodGroup(self, group: "s"):
+        self.group = group
+        self.switches.append(group)
+        self.InputMethodGroupsChanged()
+
+    @signal()
+    def InputMethodGroupsChanged(self):
+        pass
+
+    def switch_outside(self, group: str) -> None:
+        # fcitx5's own hotkey
+        self.group = group
+        self.InputMethodGroupsChanged()
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+@pytest.fixture
+def bus_address():
+    daemon = shutil.which("dbus-daemon")
+    if daemon is None:
+        pytest.skip("dbus-daemon is not installed")
+    process = subprocess.Popen([daemon, "--session", "--nofork", "--nopidfile", "--print-address=1"],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding="utf-8")
+    address = process.stdout.readline().strip()
+    if not address:
+        process.kill()
+        pytest.skip("dbus-daemon did not start")
+    yield address
+    process.terminate()
+    process.wait()
+
+@pytest.fixture
+def controller(loop, bus_address):
+    bus        = loop.run_until_complete(MessageBus(bus_address=bus_address).connect())
+    controller = Controller()
+    bus.export(FCITX_PATH, controller)
+    loop.run_until_complete(bus.request_name(FCITX_SERVICE))
+    yield controller
+    bus.disconnect()
+
+@pytest.fixture
+def service(loop, bus_address, monkeypatch):
+    monkeypatch.setattr(keyboard, "XMODMAP_SETTLE", 0.05)
+    service = KeyboardLayouts(["us", "latin", "greek"], bus_address=bus_address)
+    service.seen    = []
+    service.applied = []
+    service.subscribe(service.seen.append)
+    # Stands in for applying ~/.Xmodmap to the X server
+    service._apply_xmodmap = lambda: service.applied.append(service.current)
+    yield service
+    service.close()
+
+def run(loop, seconds: float = 0.2) -> None:
+    loop.run_until_complete(asyncio.sleep(seconds))
+
+def test_refresh(loop, controller, service):
+    assert loop.run_until_complete(service.refresh()) == "us"
+    assert service.seen == ["us"]
+
+def test_switch(loop, controller, service):
+    assert loop.run_until_complete(service.switch("latin"))
+    assert controller.switches == ["latin"]
+    assert service.current == "latin"
+    run(loop)
+    assert service.seen == ["latin"]
+    # Once, after the change signal of the switch
+    assert service.applied == ["latin"]
+
+def test_switch_outside(loop, controller, service):
+    loop.run_until_complete(service.refresh())
+    controller.switch_outside("greek")
+    run(loop)
+    assert service.current == "greek"
+    assert service.seen == ["us", "greek"]
+    assert service.applied == ["greek"]
+
+def test_xmodmap_debounced(loop, controller, service):
+    loop.run_until_complete(service.refresh())
+    for group in ("latin", "greek", "us"):
+        controller.switch_outside(group)
+        run(loop, 0.01)
+    assert service.applied == []
+    run(loop)
+    assert service.applied == ["us"]
+
+def test_unknown_layout(loop, controller, service, monkeypatch):
+    monkeypatch.setattr(keyboard, "send_notification", lambda *args, **kwargs: None)
+    assert not loop.run_until_complete(service.switch("korean"))
+    assert controller.switches == []
+
+def test_without_fcitx(loop, bus_address, service):
+    assert not loop.run_until_complete(service.switch("latin"))
+    assert service.current is None
+    assert service.seen == []
@@ -0,0 +1,141 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("libqtile")
+pytest.importorskip("wlroots")
+
+from bench import HeadlessQtile
+
+CONFIG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG = """
+from libqtile import bar, hook, widget
+from libqtile.config import Key, Screen
+from libqtile.lazy import lazy
+
+from reload import Reloader
+
+reloader = Reloader()
+
+keys = [
+    Key(["mod4"], "a", lazy.spawn("true")),
+    Key(["mod4"], "{key}", lazy.spawn("true")),
+]
+
+screens = [
+    Screen(bottom=bar.Bar([
+        widget.TextBox("left", name="left"),
+        widget.CurrentLayout(name="middle", fmt="{fmt}"),
+        widget.TextBox("right", name="right"),
+    ], 20)),
+]
+
+@hook.subscribe.client_focus
+def focused(window):
+    pass
+
+{extra}
+
+reloader.loaded(globals())
+"""
+
+# The state a reload has to get right, read inside qtile. A lambda, so the
+# comprehensions see qtile.
+STATE = """(lambda qtile: __import__("json").dumps({
+    "keys":    sorted(key.key for key in qtile.keys_map.values()),
+    "key_ids": {key.key: id(key) for key in qtile.keys_map.values()},
+    "bar":     id(qtile.screens[0].bottom),
+    "widgets": [[w.name, id(w), w.fmt] for w in qtile.screens[0].bottom.widgets],
+    "mapped":  {name: id(w) for name, w in qtile.widgets_map.items()},
+    "hooks":   {event: len(subscribers) for event, subscribers in __import__("libqtile").hook.subscriptions.items()},
+}))(self)"""
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    # qtile finds the modules of the config directory through PYTHONPATH,
+    # the config itself is a temporary one that the tests rewrite
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [CONFIG_DIR, os.environ.get("PYTHONPATH")])))
+    path = tmp_path / "config.py"
+
+    def write(key: str = "b", fmt: str = "{}", extra: str = "") -> None:
+        path.write_text(CONFIG.format(key=key, fmt=fmt, extra=extra))
+
+    write()
+    return path, write
+
+@pytest.fixture
+def qtile(config):
+    path, _ = config
+    try:
+        qtile = HeadlessQtile(str(path), "wayland")
+    except RuntimeError as e:
+        pytest.skip(str(e))
+    yield qtile
+    qtile.close()
+
+def state(qtile) -> dict:
+    return json.loads(qtile.eval(STATE))
+
+def reload(qtile) -> None:
+    qtile.eval("__import__('sys').modules['config'].reloader.reload(self)")
+
+def test_changed_key(qtile, config):
+    before = state(qtile)
+    config[1](key="c")
+    reload(qtile)
+    after = state(qtile)
+
+    assert after["keys"] == ["a", "c"]
+    # The key that stayed is the one that was grabbed before
+    assert after["key_ids"]["a"] == before["key_ids"]["a"]
+    assert after["bar"] == before["bar"]
+    assert after["widgets"] == before["widgets"]
+    assert after["hooks"] == before["hooks"]
+
+def test_changed_widget(qtile, config):
+    before = state(qtile)
+    config[1](fmt="[{}]")
+    reload(qtile)
+    after = state(qtile)
+
+    assert after["bar"] == before["bar"]
+    assert after["widgets"][0] == before["widgets"][0]
+    assert after["widgets"][2] == before["widgets"][2]
+    name, widget, fmt = after["widgets"][1]
+    assert (name, fmt) == ("middle", "[{}]")
+    assert widget != before["widgets"][1][1]
+    assert after["mapped"]["middle"] == widget
+    # The config's own hook is subscribed again in place of the old one,
+    # nothing of the replaced widget stays subscribed
+    assert after["hooks"] == before["hooks"]
+    assert after["keys"] == before["keys"]
+
+def test_changed_widget_twice(qtile, config):
+    before = state(qtile)
+    for fmt in ("<{}>", "[{}]"):
+        config[1](fmt=fmt)
+        reload(qtile)
+    after = state(qtile)
+
+    assert after["widgets"][1][2] == "[{}]"
+    assert after["hooks"] == before["hooks"]
+
+def test_raising_config(qtile, config):
+    before = state(qtile)
+    config[1](key="c", fmt="[{}]", extra="raise RuntimeError('broken')")
+    reload(qtile)
+    after = state(qtile)
+
+    # Nothing of the failed run is left behind
+    assert after == before
+    assert qtile.eval("__import__('sys').modules['config'].keys[1].key") == "b"
+
+    # and the next reload starts from the running config
+    config[1](key="c")
+    reload(qtile)
+    after = state(qtile)
+    assert after["keys"] == ["a", "c"]
+    assert after["widgets"] == before["widgets"]
+    assert after["hooks"] == before["hooks"]
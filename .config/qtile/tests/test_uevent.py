@@ -0,0 +1,119 @@
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("libqtile")
+
+from uevent import UeventBattery, UeventListener, parse
+
+def uevent(action: str, devpath: str, subsystem: str, **properties) -> bytes:
+    """A datagram as the kernel sends it on NETLINK_KOBJECT_UEVENT"""
+    fields = ["{}@{}".format(action, devpath), "ACTION=" + action, "DEVPATH=" + devpath, "SUBSYSTEM=" + subsystem]
+    fields += ["{}={}".format(key, value) for key, value in properties.items()]
+    return "\0".join(fields).encode() + b"\0"
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+@pytest.fixture
+def kernel(loop):
+    # A datagram socketpair stands in for the netlink socket, one end is the
+    # kernel and the other the listener's
+    kernel, sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    listener = UeventListener(sock)
+    assert listener.start()
+    yield kernel, listener
+    listener.close()
+    kernel.close()
+
+def run(loop, seconds: float = 0.05) -> None:
+    loop.run_until_complete(asyncio.sleep(seconds))
+
+@pytest.mark.parametrize("action", ["add", "change", "remove"])
+def test_parse(action):
+    devpath = "/devices/LNXSYSTM:00/LNXSYBUS:00/PNP0C0A:00/power_supply/BAT0"
+    event   = parse(uevent(action, devpath, "power_supply", POWER_SUPPLY_CAPACITY="42"))
+    assert event.action == action
+    assert event.devpath == devpath
+    assert event.subsystem == "power_supply"
+    assert event.properties["POWER_SUPPLY_CAPACITY"] == "42"
+
+def test_parse_header_only():
+    # Without properties the header still has the action and the devpath
+    event = parse(b"change@/devices/virtual/backlight/intel_backlight\0")
+    assert event.action == "change"
+    assert event.devpath == "/devices/virtual/backlight/intel_backlight"
+    assert event.subsystem == ""
+
+@pytest.mark.parametrize("data", [b"", b"\0", b"libudev\0\xfe\xed\xca\xfe", b"change\0SUBSYSTEM=drm\0"])
+def test_parse_malformed(data):
+    assert parse(data) is None
+
+def test_parse_ignores_fields_without_value():
+    event = parse(b"add@/devices/x\0SUBSYSTEM=input\0garbage\0")
+    assert event.properties == {"SUBSYSTEM": "input"}
+
+def test_dispatch_by_subsystem(loop, kernel):
+    sock, listener = kernel
+    power, drm = [], []
+    listener.subscribe("power_supply", power.append)
+    listener.subscribe("drm", drm.append)
+
+    sock.send(uevent("change", "/devices/BAT0", "power_supply"))
+    sock.send(uevent("change", "/devices/card0", "drm", HOTPLUG="1"))
+    sock.send(uevent("add", "/devices/input/input7", "input"))
+    sock.send(b"not a uevent")
+    run(loop)
+
+    assert [event.devpath for event in power] == ["/devices/BAT0"]
+    assert [event.properties.get("HOTPLUG") for event in drm] == ["1"]
+    assert listener.events == 3
+
+def test_unsubscribe(loop, kernel):
+    sock, listener = kernel
+    seen = []
+    listener.subscribe("power_supply", seen.append)
+    listener.unsubscribe("power_supply", seen.append)
+    sock.send(uevent("change", "/devices/BAT0", "power_supply"))
+    run(loop)
+    assert seen == []
+
+def test_failing_subscriber_doesnt_stop_others(loop, kernel):
+    sock, listener = kernel
+    seen = []
+
+    def broken(event):
+        raise RuntimeError("broken")
+
+    listener.subscribe("power_supply", broken)
+    listener.subscribe("power_supply", seen.append)
+    sock.send(uevent("change", "/devices/BAT0", "power_supply"))
+    run(loop)
+    assert len(seen) == 1
+
+def test_battery_coalesces_events(loop, kernel):
+    sock, listener = kernel
+    battery = UeventBattery(listener)
+    polls, texts = [], []
+    battery.configured = True
+    battery.poll       = lambda: polls.append(None) or "42%"
+    battery.update     = texts.append
+    listener.subscribe("power_supply", battery._changed)
+
+    # Plugging the charger in reports the adapter and the battery at once
+    sock.send(uevent("change", "/devices/AC", "power_supply", POWER_SUPPLY_ONLINE="1"))
+    sock.send(uevent("change", "/devices/BAT0", "power_supply", POWER_SUPPLY_STATUS="Charging"))
+    sock.send(uevent("change", "/devices/BAT0", "power_supply", POWER_SUPPLY_CAPACITY="42"))
+    run(loop)
+    assert len(polls) == 1
+    assert texts == ["42%"]
+
+    sock.send(uevent("change", "/devices/BAT0", "power_supply", POWER_SUPPLY_CAPACITY="41"))
+    run(loop)
+    assert len(polls) == 2
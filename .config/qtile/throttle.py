@@ -0,0 +1,326 @@
+#  ================================== Imports ============================== {{{
+
+import os
+import signal
+import time
+from typing import Dict, NamedTuple, Optional, Set
+
+import libqtile
+from libqtile import hook
+from libqtile.log_utils import logger
+
+import eventloop
+from processes import cpu_seconds, descendants
+
+# }}}
+
+# =================================== Slices =============================== {{{
+
+class CgroupSlice:
+    # A cgroup v2 directory for the processes of one group. Freezing uses
+    # cgroup.freeze, limiting cpu.max when the cpu controller is delegated.
+
+    PERIOD = 100000
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _write(self, name: str, value: str) -> bool:
+        try:
+            with open(os.path.join(self.path, name), "w") as f:
+                f.write(value)
+            return True
+        except OSError as e:
+            logger.debug("throttle: writing %s to %s/%s: %s", value, self.path, name, e)
+            return False
+
+    def add(self, pid: int) -> None:
+        # Children forked later start in the same cgroup
+        for child in descendants(pid):
+            self._write("cgroup.procs", str(child))
+
+    @property
+    def can_limit(self) -> bool:
+        return os.path.exists(os.path.join(self.path, "cpu.max"))
+
+    def freeze(self, frozen: bool) -> None:
+        self._write("cgroup.freeze", "1" if frozen else "0")
+
+    def limit(self, share: Optional[float]) -> None:
+        quota = "max" if share is None else str(max(1000, int(share * self.PERIOD)))
+        self._write("cpu.max", "{} {}".format(quota, self.PERIOD))
+
+    def usage(self) -> float:
+        try:
+            with open(os.path.join(self.path, "cpu.stat")) as f:
+                for line in f:
+                    if line.startswith("usage_usec"):
+                        return int(line.split()[1]) / 1e6
+        except OSError:
+            pass
+        return 0.0
+
+class SignalSlice:
+    # Fallback without a delegated cgroup: the process trees are stopped with
+    # SIGSTOP. There is no way to limit them, limited groups keep running.
+
+    can_limit = False
+
+    def __init__(self):
+        self.pids: Set[int] = set()
+        self.frozen         = False
+
+    def add(self, pid: int) -> None:
+        self.pids.add(pid)
+        if self.frozen:
+            self._signal(pid, signal.SIGSTOP)
+
+    def remove(self, pid: int) -> None:
+        if pid in self.pids:
+            self.pids.discard(pid)
+            if self.frozen:
+                self._signal(pid, signal.SIGCONT)
+
+    def _signal(self, pid: int, sig: int) -> None:
+        for child in descendants(pid):
+            try:
+                os.kill(child, sig)
+            except ProcessLookupError:
+                pass
+
+    def freeze(self, frozen: bool) -> None:
+        self.frozen = frozen
+        for pid in list(self.pids):
+            self._signal(pid, signal.SIGSTOP if frozen else signal.SIGCONT)
+
+    def limit(self, share: Optional[float]) -> None:
+        pass
+
+    def usage(self) -> float:
+        return sum(cpu_seconds(child) for pid in self.pids for child in descendants(pid))
+
+def delegated_cgroup() -> Optional[str]:
+    """The highest cgroup v2 directory above our own that we may move
+    processes into, e.g. user@1000.service when qtile runs as a user unit"""
+    try:
+        with open("/proc/self/cgroup") as f:
+            own = next(line[3:].strip() for line in f if line.startswith("0::"))
+    except (OSError, StopIteration):
+        return None
+    path  = os.path.join("/sys/fs/cgroup", own.lstrip("/"))
+    found = None
+    while path != "/sys/fs/cgroup":
+        if not os.access(os.path.join(path, "cgroup.procs"), os.W_OK) or not os.access(path, os.W_OK):
+            break
+        found = path
+        path  = os.path.dirname(path)
+    return found
+
+# }}}
+
+# ================================== Throttle ============================== {{{
+
+class Policy(NamedTuple):
+    # "freeze" or "limit"
+    mode: str = "freeze"
+    # Share of one CPU a limited group may use
+    share: float = 0.1
+    # Seconds a group has to stay hidden before it is throttled, switching
+    # back and forth shouldn't stop and start the applications every time
+    delay: float = 5.0
+
+class Throttle:
+    # Moves the processes of opted-in groups into one slice per group and
+    # freezes or limits the slice while the group isn't shown on any screen.
+    # A process is only moved when all of its windows belong to the same
+    # group, a browser with windows on several groups is never touched.
+
+    def __init__(self, policies: Dict[str, Policy], base: Optional[str] = None):
+        self.policies = policies
+        self.base     = base if base is not None else delegated_cgroup()
+
+        self.slices: Dict[str, object]           = {}
+        self.throttled: Dict[str, float]         = {}
+        self.saved                               = 0.0
+        self._rates: Dict[str, float]            = {}
+        self._shown: Dict[str, float]            = {}
+        self._shown_usage: Dict[str, float]      = {}
+        self._hidden_usage: Dict[str, float]     = {}
+        self._pending: Dict[str, object]         = {}
+        self._pid_windows: Dict[int, Set[int]]   = {}
+        self._window_pids: Dict[int, int]        = {}
+        self._window_groups: Dict[int, str]      = {}
+        self._pid_slices: Dict[int, str]         = {}
+        self._release: Optional[CgroupSlice]     = None
+        # Limited groups whose slice can't be limited, reported once
+        self._unlimited: Set[str]                = set()
+        self.qtile                               = None
+
+    def attach(self, qtile=None) -> None:
+        self.qtile = qtile or libqtile.qtile
+        self._make_slices()
+        hook.subscribe.setgroup(self.update)
+        hook.subscribe.focus_change(self.update)
+        hook.subscribe.group_window_add(self._window_added)
+        hook.subscribe.client_killed(self._window_killed)
+        hook.subscribe.shutdown(self.close)
+
+        for group in self.qtile.groups:
+            for window in group.windows:
+                self._window_added(group, window)
+        self.update()
+
+    def _make_slices(self) -> None:
+        if self.slices:
+            return
+        root = None
+        if self.base is not None:
+            root = os.path.join(self.base, "qtile-throttle")
+            try:
+                self._release = CgroupSlice(os.path.join(root, "released"))
+                # Limits need the cpu controller in the slices
+                with open(os.path.join(root, "cgroup.subtree_control"), "w") as f:
+                    f.write("+cpu")
+            except OSError as e:
+                logger.info("throttle: cpu limits unavailable in %s: %s", root, e)
+            if self._release is None:
+                root = None
+        if root is None:
+            logger.info("throttle: no delegated cgroup, stopping processes with signals")
+        for index, name in enumerate(self.policies):
+            if root is not None:
+                # Group names are often icons, the index is a better directory name
+                self.slices[name] = CgroupSlice(os.path.join(root, "group-{}".format(index)))
+            else:
+                self.slices[name] = SignalSlice()
+
+    # ------------------------------ Windows ------------------------------ {{{{
+
+    def _window_added(self, group, window) -> None:
+        try:
+            pid = window.get_pid()
+        except Exception:
+            pid = None
+        if not pid:
+            return
+        self._window_pids[window.wid]   = pid
+        self._window_groups[window.wid] = group.name
+        self._pid_windows.setdefault(pid, set()).add(window.wid)
+        self._place(pid)
+
+    def _window_killed(self, window) -> None:
+        pid = self._window_pids.pop(window.wid, None)
+        self._window_groups.pop(window.wid, None)
+        if pid is None:
+            return
+        windows = self._pid_windows.get(pid, set())
+        windows.discard(window.wid)
+        if windows:
+            self._place(pid)
+        else:
+            del self._pid_windows[pid]
+            group_slice = self.slices.get(self._pid_slices.pop(pid, None))
+            if isinstance(group_slice, SignalSlice):
+                group_slice.remove(pid)
+
+    def _place(self, pid: int) -> None:
+        groups  = {self._window_groups[wid] for wid in self._pid_windows.get(pid, ())}
+        target  = groups.pop() if len(groups) == 1 else None
+        target  = target if target in self.slices else None
+        current = self._pid_slices.get(pid)
+        if target == current:
+            return
+
+        if current is not None:
+            group_slice = self.slices[current]
+            if isinstance(group_slice, SignalSlice):
+                group_slice.remove(pid)
+            elif self._release is not None:
+                self._release.add(pid)
+            del self._pid_slices[pid]
+        if target is not None:
+            self.slices[target].add(pid)
+            self._pid_slices[pid] = target
+
+    # }}}}
+
+    # ------------------------------ Policies ----------------------------- {{{{
+
+    def _visible(self, name: str) -> bool:
+        group = self.qtile.groups_map.get(name)
+        return group is not None and group.screen is not None
+
+    def _applies(self, name: str) -> bool:
+        # A group that has to keep running (chats, music) must never be
+        # frozen because its limit can't be set
+        if self.policies[name].mode != "limit" or self.slices[name].can_limit:
+            return True
+        if name not in self._unlimited:
+            self._unlimited.add(name)
+            logger.warning("throttle: cpu.max unavailable, leaving %s unlimited", name)
+        return False
+
+    def update(self, *args) -> None:
+        for name in self.policies:
+            if self._visible(name):
+                handle = self._pending.pop(name, None)
+                if handle is not None:
+                    handle.cancel()
+                if name in self.throttled:
+                    self._release_group(name)
+                if name not in self._shown:
+                    self._shown[name]       = time.monotonic()
+                    self._shown_usage[name] = self.slices[name].usage()
+            elif name not in self.throttled and name not in self._pending and self._applies(name):
+                self._pending[name] = eventloop.call_later(self.policies[name].delay, self._throttle, name)
+
+    def _throttle(self, name: str) -> None:
+        self._pending.pop(name, None)
+        if self._visible(name) or name in self.throttled or not self._applies(name):
+            return
+        group_slice = self.slices[name]
+        policy      = self.policies[name]
+
+        # What the group used while it was shown is what it would have used
+        # while hidden
+        now   = time.monotonic()
+        usage = group_slice.usage()
+        shown = self._shown.pop(name, None)
+        if shown is not None and now > shown:
+            self._rates[name] = max(0.0, usage - self._shown_usage.pop(name, usage)) / (now - shown)
+        self._hidden_usage[name] = usage
+        self.throttled[name]     = now
+
+        if policy.mode == "limit":
+            group_slice.limit(policy.share)
+        else:
+            group_slice.freeze(True)
+        logger.debug("throttle: %s %s", policy.mode, name)
+
+    def _release_group(self, name: str) -> None:
+        group_slice = self.slices[name]
+        policy      = self.policies[name]
+        if policy.mode == "limit":
+            group_slice.limit(None)
+        else:
+            group_slice.freeze(False)
+
+        hidden   = time.monotonic() - self.throttled.pop(name)
+        usage    = group_slice.usage()
+        expected = self._rates.get(name, 0.0) * hidden
+        saved    = max(0.0, expected - (usage - self._hidden_usage.get(name, usage)))
+        self.saved += saved
+        self._hidden_usage[name] = usage
+        logger.info("throttle: %s was throttled for %.0fs, saved ~%.1fs of CPU time (%.1fs in total)", name, hidden, saved, self.saved)
+
+    def close(self) -> None:
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        for name in list(self.throttled):
+            self._release_group(name)
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,198 @@
+#  ================================== Imports ============================== {{{
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from libqtile import hook, layout
+from libqtile.layout.base import Layout
+from libqtile.utils import QtileError
+
+import eventloop
+
+# }}}
+
+# ================================== TreeTab =============================== {{{
+
+Operation = Tuple[str, Optional[str]]
+
+class TreeTab(layout.TreeTab):
+    """TreeTab with batched section changes and a panel that can be hidden.
+
+    Every change to the tree asks for a panel redraw, the redraws of one event
+    loop iteration are merged into one, so renaming, adding or removing any
+    number of sections (or a browser updating the titles of all of its tabs)
+    draws the panel once. While hidden, the panel window, its drawer and text
+    layout are released and the windows get the full width of the screen.
+    """
+
+    def __init__(self, **config):
+        layout.TreeTab.__init__(self, **config)
+        self._hidden      = False
+        self._draw_handle = None
+
+    def clone(self, group):
+        c = layout.TreeTab.clone(self, group)
+        c._drawer      = None
+        c._layout      = None
+        c._draw_handle = None
+        return c
+
+    # ------------------------------ Drawing ------------------------------ {{{{
+
+    def draw_panel(self, *args):
+        if self._panel is None or self._draw_handle is not None:
+            return
+        self._draw_handle = eventloop.call_soon(self._draw)
+
+    def _draw(self) -> None:
+        self._draw_handle = None
+        layout.TreeTab.draw_panel(self)
+
+    # }}}}
+
+    # ------------------------------ Sections ----------------------------- {{{{
+
+    def section_titles(self) -> List[str]:
+        """Titles of the sections, top to bottom"""
+        return [section.title for section in self._tree.children]
+
+    def section_tabs(self) -> Dict[str, int]:
+        """Section title -> number of tabs in it, nested ones included"""
+        def count(node) -> int:
+            return sum(1 + count(child) for child in node.children)
+        return {section.title: count(section) for section in self._tree.children}
+
+    def _del_section(self, name: str) -> None:
+        # Root.del_section removes the wrong section when it is asked for the
+        # first one
+        tree    = self._tree
+        section = tree.sections.get(name)
+        if section is None:
+            raise ValueError("Section name not found")
+        if len(tree.children) == 1:
+            raise ValueError("Can't delete last section")
+        index  = tree.children.index(section)
+        target = tree.children[index - 1] if index > 0 else tree.children[1]
+        tree.children.remove(section)
+        del tree.sections[name]
+        # Windows of the removed section move to the previous one
+        target.children.extend(section.children)
+        for node in section.children:
+            node.parent = target
+        if tree.def_section is section:
+            tree.def_section = tree.children[0]
+
+    def apply(self, operations: Iterable[Operation]) -> List[str]:
+        """Applies ("add" | "del" | "collapse" | "expand", name) operations in
+        order and redraws once. Collapse and expand without a name act on the
+        focused window's branch. Returns a message per failed operation."""
+        errors = []
+        for operation, name in operations:
+            try:
+                if operation == "add":
+                    self._tree.add_section(name)
+                elif operation == "del":
+                    self._del_section(name)
+                elif operation in ("collapse", "expand"):
+                    node = self._tree.sections.get(name) if name else self._nodes.get(self._focused)
+                    if node is None:
+                        raise ValueError("No such section" if name else "No focused window")
+                    node.expanded = operation == "expand"
+                else:
+                    raise ValueError("Unknown operation")
+            except ValueError as e:
+                errors.append("{} {}: {}".format(operation, name or "", e))
+        self.draw_panel()
+        return errors
+
+    def cmd_apply_sections(self, operations: List[Operation]) -> List[str]:
+        return self.apply(operations)
+
+    def cmd_add_section(self, name):
+        """Add named section to tree"""
+        self.apply([("add", name)])
+
+    def cmd_del_section(self, name):
+        """Remove named section from tree"""
+        self.apply([("del", name)])
+
+    # }}}}
+
+    # ------------------------------- Panel ------------------------------- {{{{
+
+    @property
+    def hidden(self) -> bool:
+        return self._hidden
+
+    def hide_panel(self) -> None:
+        if self._hidden:
+            return
+        self._hidden = True
+        self._release_panel()
+        if self.group is not None:
+            self.group.layout_all()
+
+    def show_panel(self) -> None:
+        if not self._hidden:
+            return
+        self._hidden = False
+        if self.group is not None and self.group.screen is not None:
+            self.show(self.group.screen.get_rect())
+            self.group.layout_all()
+
+    def cmd_hide_panel(self):
+        self.hide_panel()
+
+    def cmd_show_panel(self):
+        self.show_panel()
+
+    def cmd_toggle_panel(self):
+        if self._hidden:
+            self.show_panel()
+        else:
+            self.hide_panel()
+
+    def _create_drawer(self, screen_rect):
+        # Called on every resize, the text layout of the last one is dropped
+        if self._layout is not None:
+            self._layout.finalize()
+            self._layout = None
+        layout.TreeTab._create_drawer(self, screen_rect)
+
+    def _release_panel(self) -> None:
+        if self._draw_handle is not None:
+            self._draw_handle.cancel()
+            self._draw_handle = None
+        if self._panel is not None:
+            for unsubscribe in (hook.unsubscribe.client_name_updated, hook.unsubscribe.focus_change):
+                try:
+                    unsubscribe(self.draw_panel)
+                except QtileError:
+                    pass
+            self._panel.kill()
+            self._panel = None
+        if self._layout is not None:
+            self._layout.finalize()
+            self._layout = None
+        if self._drawer is not None:
+            self._drawer.finalize()
+            self._drawer = None
+
+    def show(self, screen_rect):
+        if not self._hidden:
+            layout.TreeTab.show(self, screen_rect)
+
+    def layout(self, windows, screen_rect):
+        if self._hidden:
+            Layout.layout(self, windows, screen_rect)
+        else:
+            layout.TreeTab.layout(self, windows, screen_rect)
+
+    def finalize(self):
+        if self._draw_handle is not None:
+            self._draw_handle.cancel()
+            self._draw_handle = None
+        layout.TreeTab.finalize(self)
+
+    # }}}}
+
+# }}}
@@ -0,0 +1,157 @@
+#  ================================== Imports ============================== {{{
+
+import socket
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from libqtile import widget
+from libqtile.log_utils import logger
+
+import eventloop
+
+# }}}
+
+# ================================== Uevents =============================== {{{
+
+NETLINK_KOBJECT_UEVENT = 15
+# Multicast group of the kernel's own messages, udev rebroadcasts them on
+# group 2 with a binary header of its own
+KERNEL_GROUP = 1
+
+class Uevent(NamedTuple):
+    # "add", "remove", "change", ...
+    action: str
+    devpath: str
+    subsystem: str
+    properties: Dict[str, str]
+
+def parse(data: bytes) -> Optional[Uevent]:
+    """A kernel uevent: "action@devpath" followed by KEY=VALUE lines, all of
+    them NUL terminated"""
+    fields = data.split(b"\0")
+    action, _, devpath = fields[0].decode(errors="replace").partition("@")
+    if not devpath:
+        return None
+    properties = {}
+    for field in fields[1:]:
+        key, sep, value = field.decode(errors="replace").partition("=")
+        if sep:
+            properties[key] = value
+    return Uevent(properties.get("ACTION", action), devpath, properties.get("SUBSYSTEM", ""), properties)
+
+UeventCallback = Callable[[Uevent], None]
+
+class UeventListener:
+    # The kernel's device events (power supplies, backlights, monitors,
+    # keyboards) on qtile's event loop. Subscribers wait for the kernel to
+    # tell them about a change instead of reading sysfs on a timer.
+    #
+    # Any datagram socket that delivers uevent formatted messages works, a
+    # socketpair stands in for the netlink socket when trying things out.
+
+    def __init__(self, sock: Optional[socket.socket] = None):
+        self.sock = sock
+
+        self.events                                       = 0
+        self._subscribers: Dict[str, List[UeventCallback]] = {}
+        self._reading                                     = False
+
+    def start(self) -> bool:
+        if self._reading:
+            return True
+        if self.sock is None:
+            try:
+                self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC, NETLINK_KOBJECT_UEVENT)
+                self.sock.bind((0, KERNEL_GROUP))
+            except OSError as e:
+                logger.warning("uevents unavailable: %s", e)
+                self.sock = None
+                return False
+            # A burst of hotplug events must not be dropped while qtile is
+            # busy drawing
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+            except OSError:
+                pass
+        self.sock.setblocking(False)
+        eventloop.add_reader(self.sock.fileno(), self._read)
+        self._reading = True
+        return True
+
+    def subscribe(self, subsystem: str, callback: UeventCallback) -> None:
+        callbacks = self._subscribers.setdefault(subsystem, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self, subsystem: str, callback: UeventCallback) -> None:
+        callbacks = self._subscribers.get(subsystem, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def _read(self) -> None:
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(64 * 1024)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # ENOBUFS: events were lost, the next ones bring the state up
+                # to date again
+                logger.warning("uevent: %s", e)
+                return
+            event = parse(data)
+            if event is None:
+                continue
+            self.events += 1
+            for callback in list(self._subscribers.get(event.subsystem, ())):
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception("uevent callback failed for %s", event.devpath)
+
+    def close(self) -> None:
+        if self.sock is not None:
+            if self._reading:
+                eventloop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        self._reading = False
+        self._subscribers.clear()
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class UeventBattery(widget.Battery):
+    """Battery that reads the power supply when the kernel reports a change
+    to it. update_interval is only a fallback for firmware that doesn't
+    report every percent, it defaults to ten minutes."""
+
+    def __init__(self, listener: UeventListener, **config):
+        config.setdefault("update_interval", 600)
+        widget.Battery.__init__(self, **config)
+        self.listener     = listener
+        self._read_handle = None
+
+    def timer_setup(self):
+        self.listener.subscribe("power_supply", self._changed)
+        widget.Battery.timer_setup(self)
+
+    def _changed(self, event: Uevent) -> None:
+        # Plugging the charger in reports the adapter and the battery at once
+        if self._read_handle is None:
+            self._read_handle = eventloop.call_soon(self._read)
+
+    def _read(self) -> None:
+        self._read_handle = None
+        if self.configured:
+            # Only draws when the text changed
+            self.update(self.poll())
+
+    def finalize(self):
+        self.listener.unsubscribe("power_supply", self._changed)
+        if self._read_handle is not None:
+            self._read_handle.cancel()
+            self._read_handle = None
+        widget.Battery.finalize(self)
+
+# }}}
@@ -0,0 +1,225 @@
+#  ================================== Imports ============================== {{{
+
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from libqtile.log_utils import logger
+from libqtile.utils import get_cache_dir
+from libqtile.widget import base
+
+import eventloop
+import processes
+
+# }}}
+
+# ================================== Service =============================== {{{
+
+PACMAN_DATABASES = ("/var/lib/pacman/local", "/var/lib/pacman/sync")
+
+UpdatesListener = Callable[[Optional[int]], None]
+
+class UpdateCheck:
+    # Runs one update command for every widget that shows it. The command runs
+    # in a worker thread, never more than one at a time, and is skipped while
+    # the package databases are unchanged since the last run. The last count is
+    # kept on disk so a restart shows it right away.
+    #
+    # checkupdates compares against a private copy of the sync databases that
+    # it refreshes itself, so an unchanged local database does not prove
+    # nothing new is out. `max_age` bounds how long a cached result is trusted.
+
+    def __init__(self, name: str, command: str, interval: float = 60 * 5, max_age: float = 60 * 60 * 6, watch: Sequence[str] = PACMAN_DATABASES, cache_path: Optional[str] = None):
+        self.name       = name
+        self.command    = command
+        self.interval   = interval
+        self.max_age    = max_age
+        self.watch      = watch
+        self.cache_path = cache_path or os.path.join(get_cache_dir(), "updates-{}.json".format(name))
+
+        self.count: Optional[int]                = None
+        self.checked                             = 0.0
+        self.runs                                = 0
+        self._fingerprint: Optional[List[int]]   = None
+        self._task: Optional[asyncio.Task]       = None
+        self._handle                             = None
+        self._suspended                          = False
+        self._listeners: List[UpdatesListener]   = []
+
+        self._load()
+
+    # ------------------------------- Cache ------------------------------- {{{{
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+            self.count        = cache["count"]
+            self.checked      = cache["checked"]
+            self._fingerprint = cache["fingerprint"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self) -> None:
+        try:
+            with open(self.cache_path + ".tmp", "w") as f:
+                json.dump({"count": self.count, "checked": self.checked, "fingerprint": self._fingerprint}, f)
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError:
+            logger.exception("Unable to write %s", self.cache_path)
+
+    def fingerprint(self) -> List[int]:
+        # mtimes of the watched directories and of the files directly in them,
+        # pacman rewrites the sync databases and touches local on every change
+        stamps = []
+        for path in self.watch:
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+                if os.path.isdir(path):
+                    with os.scandir(path) as entries:
+                        stamps.extend(sorted(e.stat().st_mtime_ns for e in entries if e.is_file()))
+            except OSError:
+                stamps.append(0)
+        return stamps
+
+    def fresh(self) -> bool:
+        if self.count is None or time.time() - self.checked > self.max_age:
+            return False
+        return self.fingerprint() == self._fingerprint
+
+    # }}}}
+
+    # ------------------------------ Checking ----------------------------- {{{{
+
+    def _run(self) -> Tuple[Optional[int], List[int]]:
+        # The fingerprint is taken before the command runs, a change made
+        # while it runs is picked up by the next check
+        fingerprint = self.fingerprint()
+        result = subprocess.run(
+            shlex.split(self.command),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        # checkupdates exits with 2 when there is nothing to update
+        if result.returncode not in (0, 2):
+            logger.warning("%s exited with %d", self.command, result.returncode)
+            return None, fingerprint
+        return len(result.stdout.splitlines()), fingerprint
+
+    async def check(self, force: bool = False) -> Optional[int]:
+        if not force and self.fresh():
+            return self.count
+        self.runs += 1
+        count, fingerprint = await eventloop.run_in_executor(self._run)
+        if count is not None:
+            self.count        = count
+            self.checked      = time.time()
+            self._fingerprint = fingerprint
+            self._save()
+        self._notify()
+        return self.count
+
+    def check_soon(self, force: bool = False) -> asyncio.Task:
+        # Widgets on several bars share the one check that is in flight
+        if self._task is None or self._task.done():
+            self._task = eventloop.get_loop().create_task(self.check(force))
+        return self._task
+
+    def _tick(self) -> None:
+        self._handle = eventloop.call_aligned(self.interval, self._tick)
+        self.check_soon()
+
+    def _notify(self) -> None:
+        for listener in list(self._listeners):
+            listener(self.count)
+
+    # }}}}
+
+    # ---------------------------- Subscribers ---------------------------- {{{{
+
+    def subscribe(self, listener: UpdatesListener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        if self._handle is None and not self._suspended:
+            self._tick()
+
+    def unsubscribe(self, listener: UpdatesListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+        if not self._listeners:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def suspend(self) -> None:
+        self._suspended = True
+        self.stop()
+
+    def resume(self) -> None:
+        # Cheap when the databases didn't change in the meantime
+        if self._suspended:
+            self._suspended = False
+            if self._listeners:
+                self._tick()
+
+    # }}}}
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class PackageUpdates(base._TextBox):
+    """Shows the count of an UpdateCheck, the same way CheckUpdates does"""
+
+    defaults = [
+        ("display_format",      "Updates: {updates}", "Display format if updates available"),
+        ("colour_no_updates",   "ffffff",             "Colour when there's no updates."),
+        ("colour_have_updates", "ffffff",             "Colour when there are updates."),
+        ("no_update_string",    "",                   "String to display if no updates available"),
+        ("execute",             None,                 "Command to execute on click, checks again once it exits"),
+    ]
+
+    def __init__(self, service: UpdateCheck, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(PackageUpdates.defaults)
+        self.service = service
+        if self.execute:
+            self.add_callbacks({"Button1": self.do_execute})
+
+    def _configure(self, qtile, bar):
+        base._TextBox._configure(self, qtile, bar)
+        # The cached count, before any check has run
+        if self.service.count is not None:
+            self.foreground, self.text = self._format(self.service.count)
+
+    def timer_setup(self):
+        self.service.subscribe(self._changed)
+
+    def _format(self, count: int) -> Tuple[str, str]:
+        if count == 0:
+            return self.colour_no_updates, self.no_update_string
+        return self.colour_have_updates, self.display_format.format(updates=count)
+
+    def _changed(self, count: Optional[int]) -> None:
+        if not self.configured or count is None:
+            return
+        self.foreground, text = self._format(count)
+        self.update(text)
+
+    def do_execute(self):
+        child = processes.spawn(shlex.split(self.execute))
+        child.exited.add_done_callback(lambda _: self.service.check_soon(force=True))
+
+    def finalize(self):
+        self.service.unsubscribe(self._changed)
+        base._TextBox.finalize(self)
+
+# }}}
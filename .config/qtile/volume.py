@@ -0,0 +1,263 @@
+#  ================================== Imports ============================== {{{
+
+import re
+import subprocess
+import time
+from typing import Callable, List, Optional
+
+from libqtile.log_utils import logger
+from libqtile.widget import base
+
+import eventloop
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+# }}}
+
+# ================================= Controller ============================= {{{
+
+VolumeListener = Callable[[int, bool], None]
+
+class VolumeController:
+    # Keeps a single mixer handle open for the lifetime of the config. Key
+    # presses only record what should happen; the queued events are folded into
+    # one set-volume call once per frame, so holding a volume key never queues
+    # up more work than the mixer can keep up with.
+
+    def __init__(self, control: str = "Master", frame: float = 1 / 60):
+        self.control = control
+        self.frame   = frame
+        self.level   = 0
+        self.muted   = False
+
+        self._mixer: Optional["alsaaudio.Mixer"] = None
+        self._pending_delta                      = 0
+        self._pending_level: Optional[int]       = None
+        self._pending_mute: Optional[bool]       = None
+        self._pending_toggle                     = False
+        self._pending_since: Optional[float]     = None
+        self._flush_handle                       = None
+        self._listeners: List[VolumeListener]    = []
+        self._watched_fds: List[int]             = []
+
+        # Time between the first queued event of a frame and the mixer write
+        self.last_latency = 0.0
+
+        self._open()
+
+    # ------------------------------- Mixer ------------------------------- {{{{
+
+    def _open(self) -> None:
+        if alsaaudio is not None:
+            try:
+                self._mixer = alsaaudio.Mixer(self.control)
+            except alsaaudio.ALSAAudioError:
+                logger.exception("Unable to open mixer control '%s'", self.control)
+                self._mixer = None
+        else:
+            logger.warning("pyalsaaudio is not installed, falling back to amixer")
+        self._read()
+
+    def _read(self) -> None:
+        if self._mixer is not None:
+            self.level = self._mixer.getvolume()[0]
+            try:
+                self.muted = bool(self._mixer.getmute()[0])
+            except alsaaudio.ALSAAudioError:
+                # Control has no playback switch
+                self.muted = False
+            return
+
+        try:
+            out = subprocess.check_output(["amixer", "get", self.control], encoding="utf-8")
+        except (OSError, subprocess.CalledProcessError):
+            logger.exception("Unable to read volume of '%s'", self.control)
+            return
+        match = re.search(r"\[(\d+)%\](?:.*\[(on|off)\])?", out)
+        if match is not None:
+            self.level = int(match.group(1))
+            self.muted = match.group(2) == "off"
+
+    def _write(self, level: int, muted: bool) -> None:
+        if self._mixer is not None:
+            try:
+                if level != self.level:
+                    self._mixer.setvolume(level)
+                    self.level = level
+                if muted != self.muted:
+                    self._mixer.setmute(int(muted))
+                    self.muted = muted
+            except alsaaudio.ALSAAudioError:
+                # e.g. a control without a playback switch, show what the
+                # mixer has instead of what was asked for
+                self._read()
+            return
+
+        # Without pyalsaaudio there is still at most one amixer per frame
+        subprocess.Popen(
+            ["amixer", "-q", "set", self.control, "{}%".format(level), "mute" if muted else "unmute"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.level = level
+        self.muted = muted
+
+    # }}}}
+
+    # ------------------------------- Events ------------------------------ {{{{
+
+    def _queue(self) -> None:
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if self._flush_handle is None:
+            self._flush_handle = eventloop.call_later(self.frame, self.flush)
+
+    def step(self, delta: int) -> None:
+        self._pending_delta += delta
+        self._queue()
+
+    def set(self, level: int) -> None:
+        self._pending_level = level
+        self._pending_delta = 0
+        self._queue()
+
+    def mute(self) -> None:
+        self._pending_mute   = True
+        self._pending_toggle = False
+        self._queue()
+
+    def unmute(self) -> None:
+        self._pending_mute   = False
+        self._pending_toggle = False
+        self._queue()
+
+    def toggle_mute(self) -> None:
+        self._pending_toggle = not self._pending_toggle
+        self._queue()
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        level = self.level if self._pending_level is None else self._pending_level
+        level = max(0, min(100, level + self._pending_delta))
+
+        muted = self.muted if self._pending_mute is None else self._pending_mute
+        if self._pending_toggle:
+            muted = not muted
+
+        before = (self.level, self.muted)
+        if (level, muted) != before:
+            self._write(level, muted)
+        changed = (self.level, self.muted) != before
+
+        if self._pending_since is not None:
+            self.last_latency = time.monotonic() - self._pending_since
+
+        self._pending_delta  = 0
+        self._pending_level  = None
+        self._pending_mute   = None
+        self._pending_toggle = False
+        self._pending_since  = None
+
+        if changed:
+            self._notify()
+
+    # }}}}
+
+    # ----------------------------- Listeners ----------------------------- {{{{
+
+    def subscribe(self, listener: VolumeListener) -> None:
+        self._listeners.append(listener)
+        self._watch()
+        listener(self.level, self.muted)
+
+    def unsubscribe(self, listener: VolumeListener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+        if not self._listeners:
+            self._unwatch()
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener(self.level, self.muted)
+
+    # Changes made outside of qtile (pavucontrol, media keys on a headset) are
+    # picked up from the mixer's poll descriptors instead of a timer.
+    def _watch(self) -> None:
+        if self._watched_fds or self._mixer is None or not hasattr(self._mixer, "handleevents"):
+            return
+        for fd, _ in self._mixer.polldescriptors():
+            eventloop.add_reader(fd, self._mixer_event)
+            self._watched_fds.append(fd)
+
+    def _unwatch(self) -> None:
+        for fd in self._watched_fds:
+            eventloop.remove_reader(fd)
+        self._watched_fds = []
+
+    def _mixer_event(self) -> None:
+        self._mixer.handleevents()
+        level, muted = self.level, self.muted
+        self._read()
+        if (level, muted) != (self.level, self.muted):
+            self._notify()
+
+    def close(self) -> None:
+        self._unwatch()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._mixer is not None:
+            self._mixer.close()
+            self._mixer = None
+
+    # }}}}
+
+# }}}
+
+# =================================== Widget =============================== {{{
+
+class MixerVolume(base._TextBox):
+    """Displays the volume of a VolumeController, redrawn only when it changes"""
+
+    defaults = [
+        ("format",       "vol: {volume}%", "Format of the text when not muted"),
+        ("muted_format", "vol: muted",     "Format of the text when muted"),
+        ("step",         5,                "Volume step for scrolling on the widget"),
+    ]
+
+    def __init__(self, controller: VolumeController, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(MixerVolume.defaults)
+        self.controller = controller
+        self.add_callbacks({
+            "Button1": self.controller.toggle_mute,
+            "Button4": lambda: self.controller.step(self.step),
+            "Button5": lambda: self.controller.step(-self.step),
+        })
+
+    def _configure(self, qtile, bar):
+        base._TextBox._configure(self, qtile, bar)
+        self.text = self._format(self.controller.level, self.controller.muted)
+
+    def timer_setup(self):
+        self.controller.subscribe(self._changed)
+
+    def _format(self, level: int, muted: bool) -> str:
+        fmt = self.muted_format if muted else self.format
+        return fmt.format(volume=level)
+
+    def _changed(self, level: int, muted: bool) -> None:
+        if self.configured:
+            self.update(self._format(level, muted))
+
+    def finalize(self):
+        self.controller.unsubscribe(self._changed)
+        base._TextBox.finalize(self)
+
+# }}}